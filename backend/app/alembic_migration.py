@@ -3,7 +3,7 @@
 Для продакшена рекомендуется использовать Alembic.
 """
 from database import Base, engine
-from models import User, GameSession, UserPokemon, Leaderboard
+from models import User, GameSession, UserPokemon, Leaderboard, UserStats, GameRollup, RollupCheckpoint
 import sqlalchemy as sa
 
 
@@ -18,7 +18,10 @@ def check_and_update_tables():
         User.__tablename__,
         GameSession.__tablename__,
         UserPokemon.__tablename__,
-        Leaderboard.__tablename__
+        Leaderboard.__tablename__,
+        UserStats.__tablename__,
+        GameRollup.__tablename__,
+        RollupCheckpoint.__tablename__
     ]
 
     print("Checking database tables...")
@@ -30,6 +33,16 @@ def check_and_update_tables():
     # Создаем отсутствующие таблицы
     Base.metadata.create_all(bind=engine)
 
+    # create_all не добавляет новые индексы в уже существующие таблицы
+    for table in required_tables:
+        if table not in existing_tables:
+            continue
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table)}
+        for index in Base.metadata.tables[table].indexes:
+            if index.name not in existing_indexes:
+                print(f"  Creating missing index: {index.name}")
+                index.create(bind=engine)
+
     print("✓ Database is up to date")
 
 
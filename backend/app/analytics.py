@@ -0,0 +1,236 @@
+"""
+Агрегаты game_sessions по часам и суткам для аналитики (таблица game_rollups).
+
+Дашборды читают только готовые агрегаты - без GROUP BY по game_sessions на рабочей БД.
+Фоновая задача раз в ANALYTICS_ROLLUP_INTERVAL секунд забирает новые игры после
+отметки (rollup_checkpoints.last_session_id) пачками по ANALYTICS_ROLLUP_CHUNK и
+прибавляет их к интервалам. Агрегаты и новая отметка пишутся одной транзакцией,
+поэтому каждая игра учитывается ровно один раз, даже если задача запущена в
+нескольких воркерах: отметка сдвигается только с того значения, с которого читали.
+
+Игры моложе ANALYTICS_ROLLUP_LAG секунд откладываются до следующего прохода:
+транзакция с меньшим id может завершиться позже транзакции с большим.
+
+Пересборка с нуля (пачками по id, без загрузки всей истории в память):
+
+    python -m app.analytics --rebuild
+"""
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, select, update
+
+from . import models
+from .archive import list_archives
+from .config import settings
+from .crud import upsert_insert
+from .database import AsyncSessionLocal
+
+BUCKETS = ("hour", "day")
+CHECKPOINT = "game_rollups"
+COUNTERS = ("games", "wins", "total_score", "total_waves", "coins_minted", "total_duration")
+
+
+def as_utc(value: datetime) -> datetime:
+    """SQLite возвращает время без зоны (CURRENT_TIMESTAMP - UTC), PostgreSQL - с зоной"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def bucket_start(value: datetime, bucket: str) -> datetime:
+    value = as_utc(value).replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0) if bucket == "day" else value
+
+
+def bucket_step(bucket: str) -> timedelta:
+    return timedelta(days=1) if bucket == "day" else timedelta(hours=1)
+
+
+def rollup_upsert(dialect: str):
+    """Прибавляет счетчики пачки к существующим интервалам"""
+    rollups = models.GameRollup.__table__
+    statement = upsert_insert(dialect, rollups)
+    return statement.on_conflict_do_update(
+        index_elements=[rollups.c.bucket, rollups.c.bucket_start],
+        set_={name: rollups.c[name] + statement.excluded[name] for name in COUNTERS}
+    )
+
+
+def aggregate(rows) -> List[Dict]:
+    """Счетчики пачки игр по всем интервалам"""
+    buckets: Dict = {}
+    for row in rows:
+        for bucket in BUCKETS:
+            key = (bucket, bucket_start(row.created_at, bucket))
+            total = buckets.get(key)
+            if total is None:
+                total = buckets[key] = {"bucket": key[0], "bucket_start": key[1], **dict.fromkeys(COUNTERS, 0)}
+            total["games"] += 1
+            total["wins"] += row.victory
+            total["total_score"] += row.score
+            total["total_waves"] += row.waves_completed
+            total["coins_minted"] += row.poke_coins_earned
+            total["total_duration"] += row.game_duration
+    return list(buckets.values())
+
+
+class RollupWorker:
+    def __init__(self, interval: float, chunk_size: int, lag: float):
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.lag = lag
+        self._task: Optional[asyncio.Task] = None
+
+        # Метрики
+        self.processed = 0
+        self.chunks = 0
+        self.conflicts = 0
+        self.failures = 0
+        self.last_session_id = 0
+        self.last_run_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                self.failures += 1
+                print(f"❌ Analytics rollup failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> int:
+        """Обрабатывает все накопившиеся игры; возвращает их количество"""
+        started = time.perf_counter()
+        total = 0
+        while True:
+            async with AsyncSessionLocal() as db:
+                count = await self.consume_chunk(db)
+            total += count
+            if count < self.chunk_size:
+                break
+        self.last_run_ms = (time.perf_counter() - started) * 1000
+        return total
+
+    async def consume_chunk(self, db) -> int:
+        """Одна пачка игр после отметки: агрегаты и сдвиг отметки в одной транзакции"""
+        checkpoint = models.RollupCheckpoint
+        mark = await db.scalar(select(checkpoint.last_session_id).where(checkpoint.name == CHECKPOINT))
+        if mark is None:
+            await db.execute(
+                upsert_insert(db.bind.dialect.name, checkpoint.__table__)
+                .values(name=CHECKPOINT, last_session_id=0)
+                .on_conflict_do_nothing(index_elements=["name"])
+            )
+            mark = 0
+
+        games = models.GameSession
+        rows = (await db.execute(
+            select(games.id, games.created_at, games.victory, games.score, games.waves_completed,
+                   games.poke_coins_earned, games.game_duration)
+            .where(games.id > mark)
+            .order_by(games.id)
+            .limit(self.chunk_size)
+        )).all()
+
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.lag)
+        ready = []
+        for row in rows:
+            if as_utc(row.created_at) > cutoff:
+                break
+            ready.append(row)
+        if not ready:
+            await db.commit()
+            return 0
+
+        await db.execute(rollup_upsert(db.bind.dialect.name), aggregate(ready))
+        moved = await db.execute(
+            update(checkpoint)
+            .where(checkpoint.name == CHECKPOINT, checkpoint.last_session_id == mark)
+            .values(last_session_id=ready[-1].id)
+        )
+        if moved.rowcount != 1:
+            # Эту пачку уже обработал другой воркер
+            await db.rollback()
+            self.conflicts += 1
+            return 0
+        await db.commit()
+
+        self.processed += len(ready)
+        self.chunks += 1
+        self.last_session_id = ready[-1].id
+        return len(ready)
+
+    async def rebuild(self) -> int:
+        """Удаляет агрегаты и заново проходит всю историю game_sessions"""
+        if list_archives():
+            print("⚠️ Archived game sessions are not in the database, their games will be missing from rollups")
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(models.GameRollup))
+            await db.execute(delete(models.RollupCheckpoint).where(models.RollupCheckpoint.name == CHECKPOINT))
+            await db.commit()
+
+        total = 0
+        while True:
+            async with AsyncSessionLocal() as db:
+                count = await self.consume_chunk(db)
+            total += count
+            if count:
+                print(f"  ... {total} games (last id {self.last_session_id})")
+            if count < self.chunk_size:
+                return total
+
+    @property
+    def metrics(self) -> Dict:
+        return {
+            "running": self.running,
+            "processed": self.processed,
+            "chunks": self.chunks,
+            "conflicts": self.conflicts,
+            "failures": self.failures,
+            "last_session_id": self.last_session_id,
+            "last_run_ms": round(self.last_run_ms, 3),
+        }
+
+
+# Глобальная задача агрегации воркера
+rollup_worker = RollupWorker(
+    settings.ANALYTICS_ROLLUP_INTERVAL,
+    settings.ANALYTICS_ROLLUP_CHUNK,
+    settings.ANALYTICS_ROLLUP_LAG,
+)
+
+
+async def main():
+    from .database import Base, engine
+    Base.metadata.create_all(bind=engine, tables=[models.GameRollup.__table__, models.RollupCheckpoint.__table__])
+    if "--rebuild" in sys.argv:
+        count = await rollup_worker.rebuild()
+        print(f"✓ game_rollups rebuilt from game_sessions: {count} games")
+    else:
+        count = await rollup_worker.run_once()
+        print(f"✓ game_rollups updated: {count} new games")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
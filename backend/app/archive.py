@@ -0,0 +1,381 @@
+"""
+Архив старых игр: game_sessions старше GAME_ARCHIVE_AFTER_DAYS переносятся из БД
+в сжатые файлы по месяцам (GAME_ARCHIVE_DIR/game_sessions_YYYY-MM.col.gz).
+
+Горячая таблица остается маленькой: она и ее индексы помещаются в кэш БД, а все, что
+читает приложение (последние игры, лидерборд, user_stats, аналитика), либо берет
+свежие строки, либо хранит уже посчитанные агрегаты.
+
+Формат файла - колоночный: строка JSON-заголовка (число строк и типы колонок), затем
+значения каждой колонки подряд (array, little-endian); все вместе сжато gzip.
+Одинаковые значения в колонке сжимаются намного лучше, чем строки целиком.
+
+В PostgreSQL game_sessions можно разбить на месячные секции (PARTITION BY RANGE
+(created_at)) - тогда архивирование месяца удаляет секцию целиком (DROP TABLE)
+вместо DELETE по строкам, а запросы по свежим датам читают только свежие секции.
+Секции создаются на PARTITIONS_AHEAD месяцев вперед при каждом запуске команд и при
+старте приложения. Строки, успевшие попасть в секцию DEFAULT, при создании секции их
+месяца переносятся в нее.
+
+    python -m app.archive partition          # PostgreSQL: перевести таблицу на секции / создать новые
+    python -m app.archive run                # перенести старые месяцы в архив
+    python -m app.archive list               # файлы архива
+    python -m app.archive read FILE [--user ID]   # строки архива в JSON Lines
+"""
+import array
+import gzip
+import json
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select, text
+
+from . import models
+from .config import settings
+from .database import engine
+
+ARCHIVE_FORMAT = "poketd-game-sessions"
+ARCHIVE_VERSION = 1
+DELETE_CHUNK = 5000
+READ_CHUNK = 10000
+PARTITIONS_AHEAD = 3  # месяцев, для которых секции создаются заранее
+PARTITION_LOCK = 7_302_001  # ключ advisory-блокировки: секции создает один процесс за раз
+
+# Колонки архива и их тип в array: q - int64, d - float64, b - int8
+COLUMNS: List[Tuple[str, str]] = [
+    ("id", "q"),
+    ("user_id", "q"),
+    ("score", "q"),
+    ("poke_coins_earned", "q"),
+    ("waves_completed", "q"),
+    ("pokemons_caught", "q"),
+    ("enemies_defeated", "q"),
+    ("game_duration", "d"),
+    ("victory", "b"),
+    ("created_at", "d"),  # unix time, UTC
+]
+
+
+def month_start(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(value: datetime) -> datetime:
+    return (value.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def archive_path(month: datetime) -> str:
+    return os.path.join(settings.GAME_ARCHIVE_DIR, f"game_sessions_{month:%Y-%m}.col.gz")
+
+
+def list_archives() -> List[str]:
+    if not os.path.isdir(settings.GAME_ARCHIVE_DIR):
+        return []
+    return sorted(
+        os.path.join(settings.GAME_ARCHIVE_DIR, name)
+        for name in os.listdir(settings.GAME_ARCHIVE_DIR)
+        if name.startswith("game_sessions_") and name.endswith(".col.gz")
+    )
+
+
+# Формат файла
+def write_archive(path: str, columns: Dict[str, array.array]):
+    """Записывает колонки атомарно: во временный файл, затем rename"""
+    rows = len(columns["id"])
+    header = {
+        "format": ARCHIVE_FORMAT,
+        "version": ARCHIVE_VERSION,
+        "rows": rows,
+        "columns": COLUMNS,
+    }
+    temporary = f"{path}.tmp"
+    with gzip.open(temporary, "wb") as file:
+        file.write(json.dumps(header).encode() + b"\n")
+        for name, _ in COLUMNS:
+            values = columns[name]
+            if sys.byteorder == "big":
+                values = array.array(values.typecode, values)
+                values.byteswap()
+            file.write(values.tobytes())
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+def read_columns(path: str) -> Dict[str, array.array]:
+    with gzip.open(path, "rb") as file:
+        header = json.loads(file.readline())
+        if header.get("format") != ARCHIVE_FORMAT or header.get("version") != ARCHIVE_VERSION:
+            raise ValueError(f"{path}: unsupported archive format")
+        rows = header["rows"]
+        columns = {}
+        for name, typecode in header["columns"]:
+            values = array.array(typecode)
+            values.frombytes(file.read(rows * values.itemsize))
+            if sys.byteorder == "big":
+                values.byteswap()
+            columns[name] = values
+    return columns
+
+
+def read_archive(path: str, user_id: Optional[int] = None) -> Iterator[Dict]:
+    """Строки архива в виде словарей (как колонки game_sessions)"""
+    columns = read_columns(path)
+    for index in range(len(columns["id"])):
+        if user_id is not None and columns["user_id"][index] != user_id:
+            continue
+        row = {name: columns[name][index] for name, _ in COLUMNS}
+        row["victory"] = bool(row["victory"])
+        row["created_at"] = datetime.fromtimestamp(row["created_at"], timezone.utc).isoformat()
+        yield row
+
+
+# Секции PostgreSQL
+def partition_name(month: datetime) -> str:
+    return f"game_sessions_y{month:%Y}m{month:%m}"
+
+
+def is_partitioned(connection) -> bool:
+    return bool(connection.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('game_sessions')"
+    )).scalar())
+
+
+def default_partition(table: str) -> str:
+    return f"{table}_default"
+
+
+def relation_exists(connection, name: str) -> bool:
+    return connection.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None
+
+
+def create_partition(connection, table: str, month: datetime):
+    name = partition_name(month)
+    if relation_exists(connection, name):
+        return
+    bounds = f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+    default = default_partition(table)
+    if not relation_exists(connection, default):
+        connection.execute(text(f"CREATE TABLE {name} PARTITION OF {table} {bounds}"))
+        return
+
+    # Строки месяца могли попасть в DEFAULT - тогда PARTITION OF не пройдет проверку DEFAULT.
+    # Переносим их в отдельную таблицу и присоединяем ее секцией
+    connection.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    moved = connection.execute(text(
+        f"WITH moved AS (DELETE FROM {default} WHERE created_at >= :start AND created_at < :end RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), {"start": month, "end": next_month(month)}).rowcount
+    connection.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {name} {bounds}"))
+    if moved:
+        print(f"✓ {month:%Y-%m}: {moved} games moved from {default} to {name}")
+
+
+def ensure_partitions(connection, table: str = "game_sessions", since: Optional[datetime] = None):
+    """
+    Месячные секции от since (по умолчанию - текущий месяц или самая старая строка в DEFAULT)
+    на PARTITIONS_AHEAD месяцев вперед
+    """
+    connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK})
+    now = month_start(datetime.now(timezone.utc))
+    if since is None and relation_exists(connection, default_partition(table)):
+        since = connection.execute(text(f"SELECT min(created_at) FROM {default_partition(table)}")).scalar()
+    month = min(month_start(since), now) if since else now
+    last = now
+    for _ in range(PARTITIONS_AHEAD):
+        last = next_month(last)
+    while month <= last:
+        create_partition(connection, table, month)
+        month = next_month(month)
+
+
+def extend_partitions():
+    """Секции на следующие месяцы при старте приложения (если game_sessions секционирована)"""
+    if engine.dialect.name != "postgresql":
+        return
+    try:
+        with engine.begin() as connection:
+            if is_partitioned(connection):
+                ensure_partitions(connection)
+    except Exception as e:
+        print(f"⚠️ Failed to create game_sessions partitions: {e}")
+
+
+def partition_table():
+    """
+    Переводит game_sessions на месячные секции (PostgreSQL) одной транзакцией:
+    новая секционированная таблица, копия строк, замена старой таблицы.
+    Первичный ключ секционированной таблицы обязан включать ключ секций - (id, created_at).
+    Строки вне созданных секций попадают в секцию DEFAULT.
+    """
+    if engine.dialect.name != "postgresql":
+        print("⚠️ Partitioning is only supported on PostgreSQL, skipping")
+        return
+
+    with engine.begin() as connection:
+        if is_partitioned(connection):
+            ensure_partitions(connection)
+            print("✓ game_sessions is already partitioned, future partitions are in place")
+            return
+
+        first = connection.execute(select(func.min(models.GameSession.created_at))).scalar()
+        connection.execute(text(
+            "CREATE TABLE game_sessions_partitioned "
+            "(LIKE game_sessions INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            "PARTITION BY RANGE (created_at)"
+        ))
+        connection.execute(text("ALTER TABLE game_sessions_partitioned ADD PRIMARY KEY (id, created_at)"))
+        connection.execute(text(
+            "ALTER TABLE game_sessions_partitioned ADD FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE"
+        ))
+        ensure_partitions(connection, "game_sessions_partitioned", first)
+        connection.execute(text(
+            f"CREATE TABLE {default_partition('game_sessions')} PARTITION OF game_sessions_partitioned DEFAULT"
+        ))
+        connection.execute(text("INSERT INTO game_sessions_partitioned SELECT * FROM game_sessions"))
+
+        # Последовательность id переходит к новой таблице, иначе DROP удалит ее вместе со старой
+        sequence = connection.execute(text("SELECT pg_get_serial_sequence('game_sessions', 'id')")).scalar()
+        connection.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY game_sessions_partitioned.id"))
+        connection.execute(text("DROP TABLE game_sessions"))
+        connection.execute(text("ALTER TABLE game_sessions_partitioned RENAME TO game_sessions"))
+        for index in models.GameSession.__table__.indexes:
+            index.create(bind=connection)
+    print("✓ game_sessions converted to monthly partitions")
+
+
+# Архивирование
+def archivable_months(connection, cutoff: datetime) -> List[datetime]:
+    """Месяцы, целиком старше cutoff, в которых есть игры"""
+    first = connection.execute(select(func.min(models.GameSession.created_at))).scalar()
+    if first is None:
+        return []
+    months = []
+    month = month_start(first)
+    while next_month(month) <= cutoff:
+        months.append(month)
+        month = next_month(month)
+    return months
+
+
+def rollup_mark(connection) -> Optional[int]:
+    """Отметка агрегатов аналитики: архивировать можно только уже учтенные игры (None - аналитика выключена)"""
+    if settings.ANALYTICS_ROLLUP_INTERVAL <= 0:
+        return None
+    mark = connection.execute(
+        select(models.RollupCheckpoint.last_session_id).where(models.RollupCheckpoint.name == "game_rollups")
+    ).scalar()
+    return mark or 0
+
+
+def export_month(connection, month: datetime) -> Tuple[int, Optional[int]]:
+    """Дописывает игры месяца в файл архива; возвращает (число строк в файле, max id месяца)"""
+    games = models.GameSession
+    in_month = (games.created_at >= month, games.created_at < next_month(month))
+
+    path = archive_path(month)
+    columns = read_columns(path) if os.path.exists(path) else {name: array.array(code) for name, code in COLUMNS}
+    # Повторный запуск после сбоя между записью файла и удалением строк: id уже в файле
+    archived_ids = set(columns["id"])
+
+    last_id = 0
+    max_id = None
+    while True:
+        rows = connection.execute(
+            select(*(getattr(games, name) for name, _ in COLUMNS))
+            .where(*in_month, games.id > last_id)
+            .order_by(games.id)
+            .limit(READ_CHUNK)
+        ).all()
+        if not rows:
+            break
+        for row in rows:
+            if row.id in archived_ids:
+                continue
+            for name, _ in COLUMNS:
+                value = getattr(row, name)
+                if name == "created_at":
+                    value = (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp()
+                columns[name].append(value)
+        last_id = max_id = rows[-1].id
+
+    if max_id is not None:
+        write_archive(path, columns)
+    return len(columns["id"]), max_id
+
+
+def drop_month(connection, month: datetime, partitioned: bool):
+    """Удаляет архивированный месяц из горячей таблицы"""
+    if partitioned:
+        name = partition_name(month)
+        if relation_exists(connection, name):
+            connection.execute(text(f"ALTER TABLE game_sessions DETACH PARTITION {name}"))
+            connection.execute(text(f"DROP TABLE {name}"))
+            return
+
+    games = models.GameSession
+    while True:
+        ids = select(games.id) \
+            .where(games.created_at >= month, games.created_at < next_month(month)) \
+            .limit(DELETE_CHUNK) \
+            .scalar_subquery()
+        deleted = connection.execute(delete(games).where(games.id.in_(ids))).rowcount
+        connection.commit()
+        if deleted < DELETE_CHUNK:
+            return
+
+
+def archive_old_games(after_days: Optional[int] = None) -> int:
+    """Переносит месяцы старше after_days дней в архив; возвращает число перенесенных месяцев"""
+    after_days = settings.GAME_ARCHIVE_AFTER_DAYS if after_days is None else after_days
+    cutoff = datetime.now(timezone.utc) - timedelta(days=after_days)
+    os.makedirs(settings.GAME_ARCHIVE_DIR, exist_ok=True)
+
+    archived = 0
+    with engine.connect() as connection:
+        partitioned = engine.dialect.name == "postgresql" and is_partitioned(connection)
+        mark = rollup_mark(connection)
+        for month in archivable_months(connection, cutoff):
+            rows, max_id = export_month(connection, month)
+            connection.commit()
+            if max_id is None:
+                continue
+            if mark is not None and max_id > mark:
+                print(f"⚠️ {month:%Y-%m}: games are not in analytics rollups yet, keeping them in the database")
+                continue
+            drop_month(connection, month, partitioned)
+            connection.commit()
+            archived += 1
+            print(f"✓ {month:%Y-%m}: {rows} games in {archive_path(month)}")
+
+        if partitioned:
+            ensure_partitions(connection)
+            connection.commit()
+    return archived
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "run"
+    if command == "partition":
+        partition_table()
+    elif command == "run":
+        count = archive_old_games()
+        print(f"✓ Archived {count} months of game sessions")
+    elif command == "list":
+        for path in list_archives():
+            print(f"{path}\t{len(read_columns(path)['id'])} games\t{os.path.getsize(path)} bytes")
+    elif command == "read" and len(sys.argv) > 2:
+        user_id = int(sys.argv[sys.argv.index("--user") + 1]) if "--user" in sys.argv else None
+        for row in read_archive(sys.argv[2], user_id):
+            print(json.dumps(row))
+    else:
+        print(__doc__)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,10 @@ from jose import JWTError, jwt
 import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
 from . import schemas, crud
 from .config import settings
-from .database import get_db
+from .database import AsyncSessionLocal
+from .principal_cache import principal_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
@@ -43,13 +43,21 @@ def get_password_hash(password: str) -> str:
         password_bytes = password_bytes[:72]
 
     # Генерируем соль и хеш
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(password_bytes, salt)
 
     # Возвращаем как строку
     return hashed.decode('utf-8')
 
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Хеш посчитан с другой стоимостью, чем BCRYPT_ROUNDS (формат $2b$12$...)"""
+    try:
+        return int(hashed_password.split("$")[2]) != settings.BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return False
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -61,22 +69,45 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+def get_username_from_token(token: str) -> Optional[str]:
+    """Имя пользователя из JWT или None, если токен невалиден"""
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
-            raise credentials_exception
+            return None
         token_data = schemas.TokenData(username=username)
     except JWTError:
-        raise credentials_exception
+        return None
+    return token_data.username
+
 
-    user = crud.get_user_by_username(db, username=token_data.username)
+async def get_principal_from_token(token: str) -> Optional[schemas.UserResponse]:
+    """
+    Пользователь по JWT из кэша (см. principal_cache).
+    Сессия БД открывается только при промахе кэша.
+    """
+    username = get_username_from_token(token)
+    if username is None:
+        return None
+
+    principal = principal_cache.get(username)
+    if principal is None:
+        async with AsyncSessionLocal() as db:
+            user = await crud.get_user_by_username(db, username=username)
+        if user is None:
+            return None
+        principal = principal_cache.put(user)
+    return principal
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> schemas.UserResponse:
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    user = await get_principal_from_token(token)
     if user is None:
         raise credentials_exception
     return user
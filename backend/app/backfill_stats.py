@@ -0,0 +1,97 @@
+"""
+Пересборка таблицы user_stats из истории game_sessions.
+
+Игроки без строки user_stats переносятся и без нее: /my-stats считает их статистику
+по истории, а первая запись результата заполняет строку прошлыми играми
+(crud.aggregate_history). Пересборка нужна для восстановления после ручных правок
+game_sessions или чтобы перенести всех игроков сразу. Дальше таблица ведется
+инкрементально в транзакции записи результатов (crud.create_game_sessions).
+
+    python -m app.backfill_stats
+
+Запускать при остановленном сервере: игры, записанные во время пересборки, могут
+не попасть в счетчики.
+"""
+from collections import defaultdict
+
+from sqlalchemy import case, delete, func, insert, select
+
+from . import models
+from .archive import list_archives
+from .crud import RECENT_GAMES, game_summary
+from .database import Base, SessionLocal, engine
+
+CHUNK = 1000
+
+
+def aggregate_stats(db):
+    """Счетчики по всем играм каждого пользователя одним GROUP BY"""
+    games = models.GameSession
+    statement = select(
+        games.user_id,
+        func.count(games.id),
+        func.sum(case((games.victory, 1), else_=0)),
+        func.sum(games.score),
+        func.max(games.score),
+        func.sum(games.poke_coins_earned),
+        func.sum(games.waves_completed),
+        func.sum(games.pokemons_caught),
+        func.sum(games.enemies_defeated),
+    ).group_by(games.user_id)
+
+    for user_id, total, wins, score, high_score, coins, waves, pokemons, enemies in db.execute(statement):
+        wins = wins or 0
+        yield {
+            "user_id": user_id,
+            "total_games": total,
+            "wins": wins,
+            "losses": total - wins,
+            "total_score": score or 0,
+            "high_score": high_score or 0,
+            "total_coins_earned": coins or 0,
+            "total_waves": waves or 0,
+            "total_pokemons_caught": pokemons or 0,
+            "total_enemies_defeated": enemies or 0,
+        }
+
+
+def recent_games(db):
+    """Последние RECENT_GAMES игр каждого пользователя (ROW_NUMBER по убыванию даты)"""
+    games = models.GameSession
+    position = func.row_number().over(
+        partition_by=games.user_id,
+        order_by=(games.created_at.desc(), games.id.desc())
+    ).label("position")
+    ranked = select(games, position).subquery()
+    statement = select(ranked).where(ranked.c.position <= RECENT_GAMES) \
+        .order_by(ranked.c.user_id, ranked.c.position)
+
+    columns = [column.name for column in games.__table__.columns if column.name not in ("id", "created_at")]
+    recent = defaultdict(list)
+    for row in db.execute(statement).mappings():
+        recent[row["user_id"]].append(
+            game_summary({name: row[name] for name in columns}, row["id"], row["created_at"])
+        )
+    return recent
+
+
+def backfill_stats() -> int:
+    if list_archives():
+        print("⚠️ Archived game sessions are not in the database, their games will be missing from user_stats")
+    Base.metadata.create_all(bind=engine, tables=[models.UserStats.__table__])
+
+    with SessionLocal() as db:
+        recent = recent_games(db)
+        rows = [dict(stats, recent_games=recent.get(stats["user_id"], [])) for stats in aggregate_stats(db)]
+
+        # Одна транзакция: читатели видят либо старую таблицу, либо новую целиком
+        db.execute(delete(models.UserStats))
+        for start in range(0, len(rows), CHUNK):
+            db.execute(insert(models.UserStats), rows[start:start + CHUNK])
+        db.commit()
+    return len(rows)
+
+
+if __name__ == "__main__":
+    count = backfill_stats()
+    print(f"✓ user_stats rebuilt from game_sessions: {count} players")
@@ -0,0 +1,341 @@
+"""
+Чекпоинты игр из памяти воркера (SESSION_BACKEND=memory).
+
+Игры InMemorySessionStore живут только в процессе: если gunicorn перезапускает
+воркер (--timeout, max_requests, деплой), они пропадают вместе с монетами игроков.
+Раз в SESSION_CHECKPOINT_INTERVAL секунд все игры воркера сохраняются двоичными
+снимками (snapshot.py) - в Redis, если задан REDIS_URL, иначе в файлы каталога
+SESSION_CHECKPOINT_DIR. При остановке воркера сохраняется последний снимок.
+
+Восстановление ленивое: при первом обращении игрока к игре, которой нет в памяти,
+хранилище забирает ее чекпоинт (GETDEL / переименование файла), поэтому игру
+восстанавливает ровно один воркер. Завершенная игра удаляет свой чекпоинт.
+
+У каждого чекпоинта есть владелец - воркер, который держит игру в памяти. Воркер
+отмечается пульсом (ключ в Redis или файл {id}.owner с TTL); пока владелец жив,
+чужой чекпоинт не восстанавливается - иначе при нескольких воркерах gunicorn у игры
+были бы две живые копии, и результат засчитался бы дважды. При остановке воркер
+снимает пульс, и его игры сразу подхватывают остальные.
+"""
+import asyncio
+import os
+import struct
+import time
+import uuid
+from typing import Callable, Dict, Optional, Set, Tuple
+
+from .config import settings
+from .game_logic import PokemonGameLogic
+from .redis_client import RedisClient, redis_client
+from .snapshot import decode_game, encode_game
+
+# Заголовок чекпоинта: метка, id воркера-владельца, его pid
+OWNER_MAGIC = b"PTDC"
+_owner_header = struct.Struct("<4s16sI")
+# Игр, кодируемых между передачами управления event loop
+ENCODE_CHUNK = 50
+
+
+def split_owner(data: bytes) -> Tuple[Optional[bytes], int, bytes]:
+    """(владелец, pid, снимок); у чекпоинтов без заголовка владельца нет"""
+    if data[:4] == OWNER_MAGIC and len(data) >= _owner_header.size:
+        _, owner, pid = _owner_header.unpack_from(data)
+        return owner, pid, data[_owner_header.size:]
+    return None, 0, data
+
+
+class SessionCheckpointer:
+    def __init__(self, interval: float, directory: str, ttl: int, client: RedisClient = redis_client):
+        self.interval = interval
+        self.directory = directory
+        self.ttl = ttl
+        self.client = client
+        self._games: Optional[Callable[[], Dict[int, PokemonGameLogic]]] = None
+        self._task: Optional[asyncio.Task] = None
+        # Владелец задается при старте, в самом воркере (после fork gunicorn)
+        self.owner_id: Optional[bytes] = None
+        self._header = b""
+        # Игры, чекпоинты которых этот воркер уже записал
+        self._written: Set[int] = set()
+        # Игры, удаленные во время записи чекпоинта: запись могла вернуть их файлы/ключи
+        self._deleted_while_writing: Optional[Set[int]] = None
+
+        # Метрики
+        self.checkpoints = 0
+        self.failures = 0
+        self.restored = 0
+        self.last_sessions = 0
+        self.last_bytes = 0
+        self.last_encode_ms = 0.0
+        self.last_write_ms = 0.0
+
+    @property
+    def use_redis(self) -> bool:
+        # LocalRedis не переживает перезапуск процесса - без REDIS_URL пишем на диск
+        return self.client.redis is not None and not self.client.is_local
+
+    @property
+    def owner_ttl(self) -> float:
+        """Пульс старше этого - владелец считается упавшим"""
+        return max(3 * self.interval, 10.0)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, games: Callable[[], Dict[int, PokemonGameLogic]]):
+        self._games = games
+        if self.owner_id is None:
+            self.owner_id = uuid.uuid4().bytes
+            self._header = _owner_header.pack(OWNER_MAGIC, self.owner_id, os.getpid())
+        if not self.use_redis:
+            os.makedirs(self.directory, exist_ok=True)
+        if not self.running and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._games is not None:
+            try:
+                await self.checkpoint()
+            except Exception as e:
+                print(f"❌ Failed to checkpoint game sessions on shutdown: {e}")
+            try:
+                await self._release_owner()
+            except Exception as e:
+                print(f"⚠️ Failed to release checkpoint owner: {e}")
+
+    async def _run(self):
+        if not self.use_redis:
+            await asyncio.to_thread(self._purge_expired)
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.checkpoint()
+            except Exception as e:
+                self.failures += 1
+                print(f"❌ Game sessions checkpoint failed: {e}")
+
+    async def checkpoint(self):
+        """
+        Снимки всех игр воркера. Каждая игра кодируется без await - ее снимок согласован
+        без блокировок; между пачками по ENCODE_CHUNK игр управление отдается event loop,
+        чтобы запросы не ждали кодирования всех сессий воркера.
+        """
+        started = time.perf_counter()
+        header = self._header
+        games = list(self._games().items())
+        snapshots: Dict[int, bytes] = {}
+        self._deleted_while_writing = set()
+        try:
+            for offset in range(0, len(games), ENCODE_CHUNK):
+                for user_id, game in games[offset:offset + ENCODE_CHUNK]:
+                    snapshots[user_id] = header + encode_game(game)
+                await asyncio.sleep(0)
+            encoded = time.perf_counter()
+
+            # Пульс перед записью: чекпоинты не должны оказаться "без живого владельца"
+            await self._heartbeat()
+            if snapshots:
+                if self.use_redis:
+                    await self.client.set_checkpoints(snapshots, self.ttl)
+                else:
+                    await asyncio.to_thread(self._write_files, snapshots)
+        finally:
+            deleted, self._deleted_while_writing = self._deleted_while_writing, None
+        # Игры, завершенные во время кодирования или записи: их чекпоинты не должны вернуться
+        self._written.update(snapshots.keys() - deleted)
+        for user_id in deleted & snapshots.keys():
+            await self.delete(user_id)
+
+        self.checkpoints += 1
+        self.last_sessions = len(snapshots)
+        self.last_bytes = sum(len(snapshot) for snapshot in snapshots.values())
+        self.last_encode_ms = (encoded - started) * 1000
+        self.last_write_ms = (time.perf_counter() - encoded) * 1000
+
+    async def restore(self, user_id: int) -> Optional[PokemonGameLogic]:
+        """Забирает чекпоинт игры, если он есть и его владелец больше не работает"""
+        try:
+            data = await self._read(user_id)
+            if not data:
+                return None
+            owner, pid, _ = split_owner(data)
+            if await self._owner_alive(owner, pid):
+                # Игра живет в памяти другого воркера
+                return None
+            if self.use_redis:
+                data = await self.client.claim_checkpoint(user_id)
+            else:
+                data = await asyncio.to_thread(self._claim_file, user_id)
+        except Exception as e:
+            print(f"⚠️ Failed to load checkpoint of game {user_id}: {e}")
+            return None
+        if not data:
+            return None
+
+        try:
+            game = decode_game(split_owner(data)[2])
+        except (ValueError, KeyError, TypeError) as e:
+            # SnapshotError - тоже ValueError; битый чекпоинт уже забран и удален
+            print(f"⚠️ Dropped broken checkpoint of game {user_id}: {e}")
+            return None
+        self.restored += 1
+        print(f"✓ Game {user_id} restored from checkpoint")
+        return game
+
+    async def owns(self, user_id: int) -> bool:
+        """
+        Держит ли этот воркер единственную копию игры. Если наш записанный чекпоинт
+        пропал или принадлежит другому воркеру, игру уже восстановили в другом месте.
+        """
+        if user_id not in self._written:
+            # Чекпоинта еще не было - восстановить игру никто не мог
+            return True
+        try:
+            data = await self._read(user_id)
+        except Exception as e:
+            print(f"⚠️ Failed to check checkpoint owner of game {user_id}: {e}")
+            return True
+        return bool(data) and split_owner(data)[0] == self.owner_id
+
+    async def delete(self, user_id: int):
+        self._written.discard(user_id)
+        if self._deleted_while_writing is not None:
+            self._deleted_while_writing.add(user_id)
+        try:
+            if self.use_redis:
+                await self.client.delete_checkpoint(user_id)
+            else:
+                await asyncio.to_thread(os.remove, self._path(user_id))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️ Failed to delete checkpoint of game {user_id}: {e}")
+
+    async def _read(self, user_id: int) -> Optional[bytes]:
+        """Чекпоинт без захвата"""
+        if self.use_redis:
+            return await self.client.get_checkpoint(user_id)
+        return await asyncio.to_thread(self._read_file, user_id)
+
+    def _read_file(self, user_id: int) -> Optional[bytes]:
+        try:
+            if time.time() - os.path.getmtime(self._path(user_id)) > self.ttl:
+                return None
+            with open(self._path(user_id), "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    async def _heartbeat(self):
+        if self.use_redis:
+            await self.client.set_checkpoint_owner(self.owner_id.hex(), int(self.owner_ttl))
+            return
+        await asyncio.to_thread(self._write_owner_file)
+
+    async def _release_owner(self):
+        if self.use_redis:
+            await self.client.delete_checkpoint_owner(self.owner_id.hex())
+            return
+        try:
+            await asyncio.to_thread(os.remove, self._owner_path(self.owner_id))
+        except FileNotFoundError:
+            pass
+
+    async def _owner_alive(self, owner: Optional[bytes], pid: int) -> bool:
+        if owner is None or owner == self.owner_id:
+            # Чекпоинт без владельца (старый формат) или наш собственный, а игры в памяти нет
+            return False
+        if self.use_redis:
+            return await self.client.checkpoint_owner_alive(owner.hex())
+        return await asyncio.to_thread(self._owner_file_alive, owner, pid)
+
+    def _owner_file_alive(self, owner: bytes, pid: int) -> bool:
+        try:
+            if time.time() - os.path.getmtime(self._owner_path(owner)) > self.owner_ttl:
+                return False
+        except FileNotFoundError:
+            return False
+        if os.name == "posix":
+            # Упавший воркер виден сразу, не дожидаясь устаревания пульса
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                return False
+            except PermissionError:
+                pass
+        return True
+
+    def _path(self, user_id: int) -> str:
+        return os.path.join(self.directory, f"{user_id}.snap")
+
+    def _owner_path(self, owner: bytes) -> str:
+        return os.path.join(self.directory, f"{owner.hex()}.owner")
+
+    def _write_owner_file(self):
+        with open(self._owner_path(self.owner_id), "w") as file:
+            file.write(str(os.getpid()))
+
+    def _write_files(self, snapshots: Dict[int, bytes]):
+        # Файл заменяется целиком: при падении посреди записи остается прошлый снимок
+        for user_id, snapshot in snapshots.items():
+            path = self._path(user_id)
+            temporary = f"{path}.{os.getpid()}.tmp"
+            with open(temporary, "wb") as file:
+                file.write(snapshot)
+            os.replace(temporary, path)
+
+    def _claim_file(self, user_id: int) -> Optional[bytes]:
+        path = self._path(user_id)
+        claimed = f"{path}.{os.getpid()}.claimed"
+        try:
+            os.replace(path, claimed)
+        except FileNotFoundError:
+            return None
+        try:
+            if time.time() - os.path.getmtime(claimed) > self.ttl:
+                return None
+            with open(claimed, "rb") as file:
+                return file.read()
+        finally:
+            os.remove(claimed)
+
+    def _purge_expired(self):
+        """Чекпоинты старше TTL (игрок так и не вернулся) удаляются при старте"""
+        now = time.time()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    @property
+    def metrics(self) -> Dict:
+        return {
+            "running": self.running,
+            "backend": "redis" if self.use_redis else "disk",
+            "checkpoints": self.checkpoints,
+            "failures": self.failures,
+            "restored": self.restored,
+            "last_sessions": self.last_sessions,
+            "last_bytes": self.last_bytes,
+            "last_encode_ms": round(self.last_encode_ms, 3),
+            "last_write_ms": round(self.last_write_ms, 3),
+        }
+
+
+# Глобальные чекпоинты воркера
+checkpointer = SessionCheckpointer(
+    settings.SESSION_CHECKPOINT_INTERVAL,
+    settings.SESSION_CHECKPOINT_DIR,
+    settings.SESSION_CHECKPOINT_TTL,
+)
@@ -0,0 +1,302 @@
+"""
+Векторизованный движок симуляции юнитов на NumPy (COMBAT_ENGINE=numpy).
+
+На каждом шаге юниты сразу всех переданных игр раскладываются в общую структуру
+массивов (x, y, здоровье, скорость, перезарядка, код стихии) с номером сессии
+у каждого юнита. Движение, проверка радиуса атаки, выбор ближайшей цели,
+множители стихий и удаление погибших считаются пакетными операциями над этими
+массивами вместо O(P×E) циклов Python по юнитам каждой игры.
+
+Юниты разных сессий никогда не взаимодействуют: пары покемон-враг строятся только
+внутри своей сессии (сумма P_s×E_s пар, а не полная матрица всех юнитов воркера).
+
+Результат побитно совпадает с эталонным движком
+(PokemonGameLogic._move_enemies / _update_field):
+- расстояние считается как sqrt(dx*dx + dy*dy) в обоих движках;
+- эталон обрабатывает покемонов по очереди, и убитый враг пропадает для следующих
+  покемонов в том же шаге. Поэтому цели выбираются раундами: в каждой сессии все
+  покемоны до ее первого убийства разрешаются одной пачкой, затем убитый враг
+  исключается и оставшиеся покемоны этой сессии пересчитываются. Раундов столько,
+  сколько убийств за шаг в самой "кровавой" сессии (обычно 0-1);
+- урон - целые атаки × множители 0/0.5/1/2, поэтому накопленные суммы урона точны.
+"""
+from operator import attrgetter
+
+from .elements import EFFECTIVENESS, ELEMENT_COUNT
+from .units import POKEMON_SPEED_SCALE
+
+try:
+    import numpy as np
+except ImportError:  # numpy нужен только для COMBAT_ENGINE=numpy
+    np = None
+
+if np is not None:
+    # TYPE_MATRIX[код атакующего, код защищающегося] - множитель урона
+    TYPE_MATRIX = np.array(EFFECTIVENESS).reshape(ELEMENT_COUNT, ELEMENT_COUNT)
+
+
+def step_units(games, delta_time: float):
+    """Движение врагов и бой покемонов за один шаг симуляции сразу для всех games"""
+    if np is None:
+        raise RuntimeError("COMBAT_ENGINE=numpy requires numpy to be installed")
+
+    move_enemies(games, delta_time)
+    update_field(games, delta_time)
+
+
+def _column(items, key, dtype=float):
+    """Одно поле всех юнитов одним массивом"""
+    return np.fromiter(map(attrgetter(key), items), dtype=dtype, count=len(items))
+
+
+def _offsets(counts):
+    """Начала отрезков каждой сессии в общих массивах (длина len(counts) + 1)"""
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets
+
+
+def move_enemies(games, delta_time: float):
+    counts = [len(game.enemies) for game in games]
+    enemies = [enemy for game in games for enemy in game.enemies]
+    if not enemies:
+        return
+
+    session = np.repeat(np.arange(len(games)), counts)
+    base_y = np.array([game.player_base_y for game in games], dtype=float)[session]
+    y = _column(enemies, "y")
+    step = _column(enemies, "speed") * delta_time
+    dy = base_y - y
+    reached = np.abs(dy) < step
+    y = np.where(dy > 0, y + step, y - step)
+
+    for enemy, new_y in zip(enemies, y.tolist()):
+        enemy.y = new_y
+
+    if not reached.any():
+        return
+
+    # Враги дошли до базы игрока
+    arrived = np.bincount(session[reached], minlength=len(games)).tolist()
+    reached = reached.tolist()
+    offsets = _offsets(counts).tolist()
+    for index, game in enumerate(games):
+        if not arrived[index]:
+            continue
+        game.player_health -= 20 * arrived[index]
+        if game.player_health <= 0:
+            game.game_over = True
+        start = offsets[index]
+        game.enemies[:] = [
+            enemy for enemy, done in zip(game.enemies, reached[start:offsets[index + 1]]) if not done
+        ]
+
+
+def update_field(games, delta_time: float):
+    counts = [len(game.field) for game in games]
+    field = [pokemon for game in games for pokemon in game.field]
+    if not field:
+        return
+
+    count = len(field)
+    session = np.repeat(np.arange(len(games)), counts)
+    cooldown = np.maximum(0.0, _column(field, "attack_cooldown") - delta_time)
+    at_base = _column(field, "reached_enemy_base", bool)
+
+    # Покемоны на вражеской базе раз в секунду получают урон, равный номеру волны
+    wave = np.array([game.wave for game in games], dtype=float)[session]
+    timer = _column(field, "base_damage_timer")
+    health = _column(field, "current_health")
+    timer[at_base] += delta_time
+    hit = at_base & (timer >= 1.0)
+    health[hit] -= wave[hit]
+    timer[hit] = 0.0
+    dead = hit & (health <= 0)
+
+    # Выбор целей и атаки для покемонов, которые еще не дошли до базы врага
+    enemy_counts = [len(game.enemies) for game in games]
+    enemies = [enemy for game in games for enemy in game.enemies]
+    rows = np.flatnonzero(~at_base)
+    targets = np.full(count, -1)
+    if rows.size and enemies:
+        row_targets, attacked = resolve_attacks(
+            games, [field[i] for i in rows.tolist()], session[rows], cooldown[rows], enemies, enemy_counts
+        )
+        targets[rows] = row_targets
+        cooldown[rows[attacked]] = 0.8
+
+    # Покемоны без цели идут вверх к вражеской базе
+    enemy_base_y = np.array([game.enemy_base_y for game in games], dtype=float)[session]
+    y = _column(field, "y")
+    speed = _column(field, "speed")
+    moving = ~at_base & (targets < 0)
+    advancing = moving & (np.abs(enemy_base_y - y) > 10)
+    y = np.where(advancing, y - speed * delta_time * POKEMON_SPEED_SCALE, y)
+    arrived = advancing & (y <= enemy_base_y)
+    y[arrived] = enemy_base_y[arrived]
+
+    if arrived.any():
+        # Награда за достижение вражеской базы
+        for index, arrived_count in enumerate(np.bincount(session[arrived], minlength=len(games)).tolist()):
+            if arrived_count:
+                games[index].score += 50 * arrived_count
+                games[index].poke_coins += 5 * arrived_count
+
+    cooldown, at_base, timer, hit, health = cooldown.tolist(), at_base.tolist(), timer.tolist(), hit.tolist(), health.tolist()
+    targets, advancing, y, arrived = targets.tolist(), advancing.tolist(), y.tolist(), arrived.tolist()
+    for i, pokemon in enumerate(field):
+        pokemon.attack_cooldown = cooldown[i]
+        if at_base[i]:
+            pokemon.base_damage_timer = timer[i]
+            if hit[i]:
+                pokemon.current_health = health[i]
+        elif targets[i] >= 0:
+            pokemon.is_moving = False
+            pokemon.target = enemies[targets[i]].id
+        else:
+            pokemon.is_moving = True
+            pokemon.target = None
+            if advancing[i]:
+                pokemon.y = y[i]
+            if arrived[i]:
+                pokemon.reached_enemy_base = True
+                pokemon.is_moving = False
+                pokemon.base_damage_timer = 0
+
+    if dead.any():
+        dead = dead.tolist()
+        offsets = _offsets(counts).tolist()
+        for index, game in enumerate(games):
+            start, end = offsets[index], offsets[index + 1]
+            if any(dead[start:end]):
+                game.field[:] = [pokemon for pokemon, is_dead in zip(game.field, dead[start:end]) if not is_dead]
+
+
+def resolve_attacks(games, pokemons, pokemon_session, cooldown, enemies, enemy_counts):
+    """
+    Выбор ближайшей цели в радиусе и атаки для pokemons (в порядке полей игр).
+    enemies - враги всех игр подряд, enemy_counts - сколько их у каждой игры.
+    Наносит урон врагам, удаляет убитых из game.enemies и начисляет награды.
+    Возвращает (индексы целей в enemies или -1, маска атаковавших покемонов).
+    """
+    targets = np.full(len(pokemons), -1)
+    attacked = np.zeros(len(pokemons), dtype=bool)
+
+    # Пары строим только для покемонов, у сессии которых есть враги
+    pair_counts = np.asarray(enemy_counts)[pokemon_session]
+    rows = np.flatnonzero(pair_counts > 0)
+    if not rows.size:
+        return targets, attacked
+    pair_counts = pair_counts[rows]
+    session = pokemon_session[rows]
+
+    enemy_offsets = _offsets(enemy_counts)
+    enemy_x = _column(enemies, "x")
+    enemy_y = _column(enemies, "y")
+    enemy_health = _column(enemies, "current_health")
+    enemy_element = _column(enemies, "element_code", np.int64)
+
+    pokemons = [pokemons[i] for i in rows.tolist()]
+    x = _column(pokemons, "x")
+    y = _column(pokemons, "y")
+    attack_range = _column(pokemons, "attack_range")
+    attack = _column(pokemons, "attack")
+    element = _column(pokemons, "element_code", np.int64)
+
+    # Пары покемон × враг его сессии, подряд по покемонам
+    pair_row = np.repeat(np.arange(rows.size), pair_counts)
+    pair_enemy = (
+        enemy_offsets[session][pair_row]
+        + np.arange(pair_row.size) - _offsets(pair_counts)[:-1][pair_row]
+    )
+
+    dx = x[pair_row] - enemy_x[pair_enemy]
+    dy = y[pair_row] - enemy_y[pair_enemy]
+    distance = np.sqrt(dx * dx + dy * dy)
+    distance[distance >= attack_range[pair_row]] = np.inf
+    pair_damage = attack[pair_row] * TYPE_MATRIX[element[pair_row], enemy_element[pair_enemy]]
+
+    alive = np.ones(len(enemies), dtype=bool)
+    damaged = np.zeros(len(enemies), dtype=bool)
+    ready = cooldown[rows] <= 0
+    row_targets = np.full(rows.size, -1)
+    row_attacked = np.zeros(rows.size, dtype=bool)
+    # Еще не разрешенные покемоны (номера строк в rows) и их пары; после первого
+    # раунда остаются только покемоны сессий, где в прошлом раунде было убийство
+    pending = np.arange(rows.size)
+    pairs = np.arange(pair_row.size)
+
+    while pending.size:
+        counts = pair_counts[pending]
+        local_row = np.repeat(np.arange(pending.size), counts)
+        pending_session = session[pending]
+
+        # Ближайший живой враг в радиусе для каждого неразрешенного покемона
+        block = np.where(alive[pair_enemy[pairs]], distance[pairs], np.inf)
+        nearest_distance = np.minimum.reduceat(block, _offsets(counts)[:-1])
+        has_target = np.isfinite(nearest_distance)
+        # Первый враг при равных расстояниях, как и эталон
+        candidates = np.flatnonzero((block == nearest_distance[local_row]) & has_target[local_row])
+        candidate_rows, first = np.unique(local_row[candidates], return_index=True)
+        nearest_pair = np.zeros(pending.size, dtype=np.int64)
+        nearest_pair[candidate_rows] = pairs[candidates[first]]
+        nearest = pair_enemy[nearest_pair]
+
+        attacking = np.flatnonzero(has_target & ready[pending])
+        # По умолчанию каждая сессия разрешается до конца
+        end_row = np.full(len(games), rows.size)
+        killed = np.empty(0, dtype=np.int64)
+        kill_sessions = np.empty(0, dtype=np.int64)
+
+        if attacking.size:
+            hit_targets = nearest[attacking]
+            damage = pair_damage[nearest_pair[attacking]]
+            # Накопленный урон по каждой цели в порядке атак (группировка устойчивой сортировкой)
+            order = np.argsort(hit_targets, kind="stable")
+            sorted_damage = damage[order]
+            running = np.cumsum(sorted_damage)
+            sorted_targets = hit_targets[order]
+            group_start = np.ones(order.size, dtype=bool)
+            group_start[1:] = sorted_targets[1:] != sorted_targets[:-1]
+            group_offset = (running - sorted_damage)[group_start]
+            total = np.empty(order.size)
+            total[order] = running - group_offset[np.cumsum(group_start) - 1]
+
+            kills = np.flatnonzero(enemy_health[hit_targets] - total <= 0)
+            if kills.size:
+                # В каждой сессии все покемоны до ее первого убийства включительно разрешаются в этом раунде
+                kill_sessions, first_kill = np.unique(pending_session[attacking[kills]], return_index=True)
+                first_kill = kills[first_kill]
+                end_row[kill_sessions] = pending[attacking[first_kill]]
+                killed = hit_targets[first_kill]
+
+            applied = pending[attacking] <= end_row[pending_session[attacking]]
+            np.subtract.at(enemy_health, hit_targets[applied], damage[applied])
+            damaged[hit_targets[applied]] = True
+            row_attacked[pending[attacking[applied]]] = True
+
+        resolved = pending <= end_row[pending_session]
+        row_targets[pending[resolved]] = np.where(has_target[resolved], nearest[resolved], -1)
+        pairs = pairs[~resolved[local_row]]
+        pending = pending[~resolved]
+
+        if killed.size:
+            alive[killed] = False
+            for index in kill_sessions.tolist():
+                games[index].reward_enemy_defeated()
+
+    targets[rows] = row_targets
+    attacked[rows] = row_attacked
+
+    for enemy, health, was_damaged in zip(enemies, enemy_health.tolist(), damaged.tolist()):
+        if was_damaged:
+            enemy.current_health = health
+    if not alive.all():
+        alive = alive.tolist()
+        enemy_offsets = enemy_offsets.tolist()
+        for index, game in enumerate(games):
+            start, end = enemy_offsets[index], enemy_offsets[index + 1]
+            if not all(alive[start:end]):
+                game.enemies[:] = [enemy for enemy, is_alive in zip(game.enemies, alive[start:end]) if is_alive]
+
+    return targets, attacked
@@ -17,6 +17,74 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 
+    # Пароли: стоимость bcrypt (2^rounds итераций) и отдельный пул потоков для него (см. app/password_pool.py)
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 32  # больше ожидающих операций - сразу 503
+
+    # Кэш аутентифицированных пользователей (см. app/principal_cache.py); размер 0 - без кэша
+    PRINCIPAL_CACHE_SIZE: int = 10000
+    PRINCIPAL_CACHE_TTL: float = 30.0  # секунды
+
+    # Redis (если не указан - используется локальная заглушка в памяти)
+    REDIS_URL: Optional[str] = None
+
+    # Хранилище игровых сессий: "memory" (в процессе) или "redis" (общее для всех воркеров);
+    # не задано - "redis" при REDIS_URL, иначе "memory" (тогда gunicorn запускает один воркер)
+    SESSION_BACKEND: Optional[str] = None
+    SESSION_LOCK_TIMEOUT: float = 5.0  # секунды ожидания блокировки сессии
+    # Чекпоинты игр из памяти (см. app/checkpoint.py): в Redis при REDIS_URL, иначе в каталог; интервал 0 - выключены
+    SESSION_CHECKPOINT_INTERVAL: float = 5.0  # секунды
+    SESSION_CHECKPOINT_DIR: str = "checkpoints"
+    SESSION_CHECKPOINT_TTL: int = 3600  # секунды, как у игр в Redis
+    # Брошенные игры в памяти (см. app/session_registry.py) завершаются с сохранением результата
+    SESSION_IDLE_TIMEOUT: float = 600.0  # секунды без запросов игрока; 0 - не завершать
+    SESSION_REAPER_INTERVAL: float = 30.0  # секунды между проверками
+    SESSION_MAX_LIVE: int = 10000  # игр в памяти воркера; 0 - без ограничения
+
+    # Серверная симуляция с фиксированным шагом
+    SIMULATION_TICK_RATE: int = 20  # тиков в секунду
+    SIMULATION_MAX_CATCHUP_STEPS: int = 5  # максимум шагов догона за один тик
+    SIMULATION_BATCH_SIZE: int = 200  # сессий в одном пакетном шаге мира (между ними - передача управления event loop)
+    COMBAT_ENGINE: str = "python"  # "python" (словари) или "numpy" (векторизованный, нужен numpy)
+
+    # Очередь отложенной записи результатов игр (см. app/result_queue.py)
+    RESULT_QUEUE_BATCH_SIZE: int = 200  # записей в одной транзакции
+    RESULT_QUEUE_FLUSH_INTERVAL: float = 0.5  # секунды между записями
+    RESULT_QUEUE_MAX_ATTEMPTS: int = 3  # после стольких неудачных записей результат уходит в файл
+    RESULT_QUEUE_SPILL_FILE: Optional[str] = "pending_results.jsonl"  # результаты, не записанные в БД
+
+    # Кэш ответа /my-stats (таблица user_stats, см. app/backfill_stats.py)
+    USER_STATS_CACHE_TTL: int = 10  # секунды
+
+    # Агрегаты игр для аналитики (см. app/analytics.py); интервал 0 - без фоновой задачи
+    ANALYTICS_ROLLUP_INTERVAL: float = 60.0  # секунды между проходами
+    ANALYTICS_ROLLUP_CHUNK: int = 5000  # игр в одной транзакции
+    ANALYTICS_ROLLUP_LAG: float = 5.0  # игры моложе этого (секунды) ждут следующего прохода
+
+    # Архив старых игр (python -m app.archive run, см. app/archive.py)
+    GAME_ARCHIVE_DIR: str = "archive"
+    GAME_ARCHIVE_AFTER_DAYS: int = 180  # месяцы старше этого уходят из game_sessions в файлы
+
+    # Каталог записей повторов завершенных игр (зерно + журнал, см. app/replay.py); не задан - не сохраняются
+    REPLAY_DIR: Optional[str] = None
+
+    # Состояние игры для клиента (/game/state, см. app/state_json.py)
+    GAME_STATE_PRECISION: int = 1  # знаков после запятой у координат и здоровья юнитов
+
+    # WebSocket-канал игры
+    WS_PUSH_RATE: int = 4  # кадров состояния в секунду; между кадрами клиент экстраполирует движение по vy
+    WS_KEYFRAME_INTERVAL: int = 50  # полный кадр каждые N кадров
+
+    @property
+    def session_backend(self) -> str:
+        return self.SESSION_BACKEND or ("redis" if self.REDIS_URL else "memory")
+
+    @property
+    def sessions_shared(self) -> bool:
+        """Игры и индексы общие для воркеров: только с настоящим Redis"""
+        return self.session_backend == "redis" and bool(self.REDIS_URL)
+
     class Config:
         env_file = ".env"
         case_sensitive = True
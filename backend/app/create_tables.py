@@ -1,5 +1,5 @@
 from database import Base, engine
-from models import User, GameSession, UserPokemon, Leaderboard
+from models import User, GameSession, UserPokemon, Leaderboard, UserStats, GameRollup, RollupCheckpoint
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -33,6 +33,9 @@ def init_db():
         logger.info(f"  - {GameSession.__tablename__}")
         logger.info(f"  - {UserPokemon.__tablename__}")
         logger.info(f"  - {Leaderboard.__tablename__}")
+        logger.info(f"  - {UserStats.__tablename__}")
+        logger.info(f"  - {GameRollup.__tablename__}")
+        logger.info(f"  - {RollupCheckpoint.__tablename__}")
 
     except Exception as e:
         logger.error(f"✗ Error creating tables: {e}")
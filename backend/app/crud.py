@@ -1,33 +1,43 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, func
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import bindparam, case, desc, func, insert, select, tuple_, update
 from . import models, schemas
-from .auth import get_password_hash
+from .leaderboard import leaderboard_index
+from .principal_cache import principal_cache
+from .redis_client import redis_client
+
+
+async def index_scores(scores: Dict[int, int]):
+    """Обновляет индекс лидерборда после commit (ошибка Redis не должна ломать запись в БД)"""
+    try:
+        await leaderboard_index.record_scores(scores)
+    except Exception as e:
+        print(f"⚠️ Failed to update leaderboard index: {e}")
 
 
 # User CRUD
-def get_user(db: Session, user_id: int):
-    return db.query(models.User).filter(models.User.id == user_id).first()
+async def get_user(db: AsyncSession, user_id: int):
+    return await db.scalar(select(models.User).where(models.User.id == user_id))
 
 
-def get_user_by_username(db: Session, username: str):
-    return db.query(models.User).filter(models.User.username == username).first()
+async def get_user_by_username(db: AsyncSession, username: str):
+    return await db.scalar(select(models.User).where(models.User.username == username))
 
 
-def get_user_by_email(db: Session, email: str):
-    return db.query(models.User).filter(models.User.email == email).first()
+async def get_user_by_email(db: AsyncSession, email: str):
+    return await db.scalar(select(models.User).where(models.User.email == email))
 
 
-def create_user(db: Session, user: schemas.UserCreate):
+async def create_user(db: AsyncSession, user: schemas.UserCreate, hashed_password: str):
     # Проверяем, существует ли пользователь
-    existing_user = get_user_by_username(db, username=user.username)
+    existing_user = await get_user_by_username(db, username=user.username)
     if existing_user:
         return None
 
-    existing_email = get_user_by_email(db, email=user.email)
+    existing_email = await get_user_by_email(db, email=user.email)
     if existing_email:
         return None
 
-    hashed_password = get_password_hash(user.password)
     db_user = models.User(
         username=user.username,
         email=user.email,
@@ -35,8 +45,8 @@ def create_user(db: Session, user: schemas.UserCreate):
         poke_coins=100  # Начальные монеты при регистрации
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
 
     # Создаем запись в лидерборде для нового пользователя
     leaderboard_entry = models.Leaderboard(
@@ -44,86 +54,363 @@ def create_user(db: Session, user: schemas.UserCreate):
         username=db_user.username
     )
     db.add(leaderboard_entry)
-    db.commit()
+    await db.commit()
+    await index_scores({db_user.id: 0})
 
     return db_user
 
 
-# Game Session CRUD
-def create_game_session(db: Session, session_data: schemas.GameResult, user_id: int):
-    db_session = models.GameSession(
-        user_id=user_id,
-        score=session_data.score,
-        poke_coins_earned=session_data.poke_coins_earned,
-        waves_completed=session_data.waves_completed,
-        pokemons_caught=session_data.pokemons_caught,
-        enemies_defeated=session_data.enemies_defeated,
-        game_duration=session_data.game_duration,
-        victory=session_data.victory
-    )
-    db.add(db_session)
-
-    # Обновляем баланс пользователя
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+async def set_user_active(db: AsyncSession, user_id: int, is_active: bool):
+    user = await get_user(db, user_id)
     if user:
-        user.poke_coins += session_data.poke_coins_earned
+        user.is_active = is_active
+        await db.commit()
+        await db.refresh(user)
+        await principal_cache.invalidate_users([user_id])
+    return user
 
-    db.commit()
-    db.refresh(db_session)
 
-    # Обновляем лидерборд
-    leaderboard = db.query(models.Leaderboard).filter(models.Leaderboard.user_id == user_id).first()
-    if leaderboard:
-        if session_data.score > leaderboard.high_score:
-            leaderboard.high_score = session_data.score
-        leaderboard.total_waves += session_data.waves_completed
-        leaderboard.total_pokemons += session_data.pokemons_caught
-        leaderboard.total_enemies += session_data.enemies_defeated
-        db.commit()
+# Game Session CRUD
+async def create_game_session(db: AsyncSession, session_data: schemas.GameResult, user_id: int):
+    """
+    Сохраняет результат одной игры - пакет из одного элемента (см. create_game_sessions):
+    запись сессии, монеты, лидерборд и user_stats в одной транзакции.
+    Возвращает строку новой сессии (id, created_at).
+    """
+    session_id = (await create_game_sessions(db, [(user_id, session_data)]))[0]
+    saved = await db.execute(
+        select(models.GameSession.id, models.GameSession.created_at).where(models.GameSession.id == session_id)
+    )
+    return saved.one()
+
+
+async def create_game_sessions(db: AsyncSession, results: List[Tuple[int, schemas.GameResult]]) -> List[int]:
+    """
+    Пакетное сохранение результатов (очередь записи, см. result_queue) одной транзакцией:
+    одна вставка executemany и по одному UPDATE на пользователя с суммами за весь пакет
+    (монеты, лидерборд, накопленная статистика user_stats).
+    Возвращает id новых сессий в порядке results.
+    """
+    if not results:
+        return []
+
+    rows = [dict(result.model_dump(), user_id=user_id) for user_id, result in results]
+
+    # Суммы по пользователям: несколько игр одного пользователя - одно обновление
+    totals: Dict[int, Dict] = {}
+    for user_id, result in results:
+        total = totals.get(user_id)
+        if total is None:
+            total = totals[user_id] = {
+                "target_id": user_id, "coins": 0, "score": 0, "waves": 0, "pokemons": 0, "enemies": 0,
+                "games": 0, "wins": 0, "total_score": 0,
+            }
+        total["coins"] += result.poke_coins_earned
+        total["score"] = max(total["score"], result.score)
+        total["waves"] += result.waves_completed
+        total["pokemons"] += result.pokemons_caught
+        total["enemies"] += result.enemies_defeated
+        total["games"] += 1
+        total["wins"] += result.victory
+        total["total_score"] += result.score
+
+    # Core-таблицы: список параметров уходит одним executemany
+    users = models.User.__table__
+    board = models.Leaderboard.__table__
+    add_coins = update(users) \
+        .where(users.c.id == bindparam("target_id")) \
+        .values(poke_coins=users.c.poke_coins + bindparam("coins"))
+    update_leaderboard = update(board) \
+        .where(board.c.user_id == bindparam("target_id")) \
+        .values(
+            high_score=case((board.c.high_score < bindparam("score"), bindparam("score")), else_=board.c.high_score),
+            total_waves=board.c.total_waves + bindparam("waves"),
+            total_pokemons=board.c.total_pokemons + bindparam("pokemons"),
+            total_enemies=board.c.total_enemies + bindparam("enemies")
+        )
+
+    try:
+        saved = (await db.execute(
+            insert(models.GameSession).returning(
+                models.GameSession.id, models.GameSession.created_at, sort_by_parameter_order=True
+            ),
+            rows
+        )).all()
+        params = list(totals.values())
+        await db.execute(add_coins, params)
+        await db.execute(update_leaderboard, params)
+        await update_user_stats(db, totals, rows, saved)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    await principal_cache.invalidate_users(list(totals))
+    await drop_cached_stats(list(totals))
+    await index_scores({user_id: total["score"] for user_id, total in totals.items()})
+    return [session_id for session_id, _ in saved]
+
+
+# User stats CRUD
+RECENT_GAMES = 10
+STATS_COUNTERS = (
+    "total_games", "wins", "losses", "total_score", "total_coins_earned",
+    "total_waves", "total_pokemons_caught", "total_enemies_defeated",
+)
+
+
+def upsert_insert(dialect: str, table):
+    """INSERT с поддержкой ON CONFLICT для диалекта БД (PostgreSQL или SQLite)"""
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert(table)
+
+
+def stats_upsert(dialect: str):
+    """INSERT ... ON CONFLICT: новая строка статистики или прибавление к существующей"""
+    stats = models.UserStats.__table__
+    statement = upsert_insert(dialect, stats)
+    excluded = statement.excluded
+    return statement.on_conflict_do_update(
+        index_elements=[stats.c.user_id],
+        set_={
+            **{name: stats.c[name] + excluded[name] for name in STATS_COUNTERS},
+            "high_score": case((excluded.high_score > stats.c.high_score, excluded.high_score), else_=stats.c.high_score),
+            "updated_at": func.now(),
+        }
+    )
 
-    return db_session
 
+def game_summary(row: Dict, session_id: int, created_at) -> Dict:
+    """Запись игры для recent_games (поля как у GameSession)"""
+    summary = {key: value for key, value in row.items() if key != "user_id"}
+    summary["id"] = session_id
+    summary["created_at"] = created_at.isoformat() if created_at else None
+    return summary
+
+
+async def aggregate_history(db: AsyncSession, user_ids: List[int], exclude_ids: List[int] = ()) -> Dict[int, Dict]:
+    """
+    Строки user_stats по истории game_sessions - для игроков, которых еще нет в user_stats
+    (их игры сыграны до появления таблицы). exclude_ids - сессии текущей транзакции
+    """
+    games = models.GameSession
+    condition = games.user_id.in_(user_ids)
+    if exclude_ids:
+        condition = condition & games.id.notin_(list(exclude_ids))
+
+    totals = await db.execute(
+        select(
+            games.user_id,
+            func.count(games.id),
+            func.sum(case((games.victory, 1), else_=0)),
+            func.sum(games.score),
+            func.max(games.score),
+            func.sum(games.poke_coins_earned),
+            func.sum(games.waves_completed),
+            func.sum(games.pokemons_caught),
+            func.sum(games.enemies_defeated),
+        ).where(condition).group_by(games.user_id)
+    )
+    history = {}
+    for user_id, total, wins, score, high_score, coins, waves, pokemons, enemies in totals:
+        wins = wins or 0
+        history[user_id] = {
+            "user_id": user_id,
+            "total_games": total,
+            "wins": wins,
+            "losses": total - wins,
+            "total_score": score or 0,
+            "high_score": high_score or 0,
+            "total_coins_earned": coins or 0,
+            "total_waves": waves or 0,
+            "total_pokemons_caught": pokemons or 0,
+            "total_enemies_defeated": enemies or 0,
+            "recent_games": [],
+        }
+    if not history:
+        return history
+
+    # Последние игры каждого игрока (ROW_NUMBER по убыванию даты), как в backfill_stats
+    position = func.row_number().over(
+        partition_by=games.user_id,
+        order_by=(games.created_at.desc(), games.id.desc())
+    ).label("position")
+    ranked = select(games, position).where(condition).subquery()
+    recent = await db.execute(
+        select(ranked).where(ranked.c.position <= RECENT_GAMES).order_by(ranked.c.user_id, ranked.c.position)
+    )
+    columns = [column.name for column in games.__table__.columns if column.name not in ("id", "created_at")]
+    for row in recent.mappings():
+        history[row["user_id"]]["recent_games"].append(
+            game_summary({name: row[name] for name in columns}, row["id"], row["created_at"])
+        )
+    return history
+
+
+async def update_user_stats(db: AsyncSession, totals: Dict[int, Dict], rows: List[Dict], saved: List):
+    """Обновляет user_stats в текущей транзакции (без commit)"""
+    stats = models.UserStats.__table__
+    dialect = db.bind.dialect.name
+
+    # Первая запись игрока: строка заполняется его прошлыми играми, чтобы счетчики
+    # не начинались с нуля без ручного backfill_stats. DO NOTHING - если строку
+    # одновременно создала другая транзакция, ее история уже учтена там
+    existing = set(await db.scalars(select(stats.c.user_id).where(stats.c.user_id.in_(list(totals)))))
+    missing = [user_id for user_id in totals if user_id not in existing]
+    if missing:
+        history = await aggregate_history(db, missing, [session_id for session_id, _ in saved])
+        if history:
+            await db.execute(
+                upsert_insert(dialect, stats).on_conflict_do_nothing(index_elements=[stats.c.user_id]),
+                list(history.values())
+            )
+
+    await db.execute(stats_upsert(dialect), [
+        {
+            "user_id": user_id,
+            "total_games": total["games"],
+            "wins": total["wins"],
+            "losses": total["games"] - total["wins"],
+            "total_score": total["total_score"],
+            "high_score": total["score"],
+            "total_coins_earned": total["coins"],
+            "total_waves": total["waves"],
+            "total_pokemons_caught": total["pokemons"],
+            "total_enemies_defeated": total["enemies"],
+            "recent_games": [],
+        }
+        for user_id, total in totals.items()
+    ])
+
+    # Последние игры: строки уже заблокированы upsert'ом до конца транзакции
+    current = await db.execute(
+        select(stats.c.user_id, stats.c.recent_games).where(stats.c.user_id.in_(list(totals)))
+    )
+    recent = {user_id: list(games or []) for user_id, games in current}
+    for row, (session_id, created_at) in zip(rows, saved):
+        recent[row["user_id"]].insert(0, game_summary(row, session_id, created_at))
 
-def get_user_game_sessions(db: Session, user_id: int, skip: int = 0, limit: int = 10):
-    return db.query(models.GameSession) \
-        .filter(models.GameSession.user_id == user_id) \
-        .order_by(desc(models.GameSession.created_at)) \
-        .offset(skip) \
-        .limit(limit) \
-        .all()
+    await db.execute(
+        update(stats).where(stats.c.user_id == bindparam("target_id")).values(recent_games=bindparam("games")),
+        [{"target_id": user_id, "games": games[:RECENT_GAMES]} for user_id, games in recent.items()]
+    )
 
 
-# Leaderboard CRUD
-def get_leaderboard(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Leaderboard) \
-        .order_by(desc(models.Leaderboard.high_score)) \
-        .offset(skip) \
-        .limit(limit) \
-        .all()
+async def drop_cached_stats(user_ids: List[int]):
+    try:
+        await redis_client.delete_user_stats(*user_ids)
+    except Exception as e:
+        print(f"⚠️ Failed to drop cached user stats: {e}")
 
 
-def get_user_stats(db: Session, user_id: int):
-    user_stats = db.query(models.Leaderboard).filter(models.Leaderboard.user_id == user_id).first()
+async def get_user_game_sessions(db: AsyncSession, user_id: int, before_id: Optional[int] = None, limit: int = 10):
+    """
+    Игры пользователя из горячей таблицы, новые первыми. Keyset-пагинация по id
+    (before_id - id последней игры предыдущей страницы) вместо OFFSET.
+    Игры старше GAME_ARCHIVE_AFTER_DAYS лежат в архиве (см. archive.py)
+    """
+    statement = select(models.GameSession).where(models.GameSession.user_id == user_id)
+    if before_id is not None:
+        statement = statement.where(models.GameSession.id < before_id)
+    result = await db.scalars(statement.order_by(desc(models.GameSession.id)).limit(limit))
+    return result.all()
 
-    # Получаем последние игры пользователя
-    recent_games = db.query(models.GameSession) \
-        .filter(models.GameSession.user_id == user_id) \
-        .order_by(desc(models.GameSession.created_at)) \
-        .limit(10) \
-        .all()
 
-    # Получаем пользователя для монет
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+# Leaderboard CRUD
+async def get_leaderboard(db: AsyncSession, skip: int = 0, limit: int = 100):
+    result = await db.scalars(
+        select(models.Leaderboard)
+        .order_by(desc(models.Leaderboard.high_score))
+        .offset(skip)
+        .limit(limit)
+    )
+    return result.all()
+
+
+async def get_leaderboard_after(db: AsyncSession, high_score: int, user_id: int, limit: int):
+    """
+    Keyset-пагинация: строки после (high_score, user_id) в порядке high_score DESC, user_id DESC.
+    Использует индекс idx_leaderboard_score_user, стоимость не зависит от глубины страницы.
+    """
+    result = await db.scalars(
+        select(models.Leaderboard)
+        .where(tuple_(models.Leaderboard.high_score, models.Leaderboard.user_id) < tuple_(high_score, user_id))
+        .order_by(desc(models.Leaderboard.high_score), desc(models.Leaderboard.user_id))
+        .limit(limit)
+    )
+    return result.all()
+
+
+async def get_leaderboard_players(db: AsyncSession, user_ids: List[int]) -> Dict[int, models.Leaderboard]:
+    """Строки лидерборда для страницы индекса (см. leaderboard.py)"""
+    if not user_ids:
+        return {}
+    result = await db.scalars(select(models.Leaderboard).where(models.Leaderboard.user_id.in_(user_ids)))
+    return {row.user_id: row for row in result}
+
+
+def stats_payload(stats: models.UserStats = None) -> Dict:
+    """Счетчики user_stats с производными метриками (schemas.UserStats); без строки - нули"""
+    payload = schemas.UserStats.model_validate(stats).model_dump() if stats else schemas.UserStats().model_dump()
+    if stats and stats.total_games:
+        payload["average_score"] = round(stats.total_score / stats.total_games, 2)
+        payload["win_rate"] = round(stats.wins / stats.total_games * 100, 2)
+    return payload
+
+
+async def get_user_stats(db: AsyncSession, user_id: int):
+    """
+    Статистика для /my-stats одним запросом: пользователь + накопленная строка user_stats
+    (вместо чтения лидерборда, последних игр и пользователя тремя запросами)
+    """
+    row = (await db.execute(
+        select(models.User.username, models.User.poke_coins, models.UserStats)
+        .outerjoin(models.UserStats, models.UserStats.user_id == models.User.id)
+        .where(models.User.id == user_id)
+    )).one_or_none()
+    if row is None:
+        return None
 
+    username, poke_coins, stats = row
+    if stats is None:
+        # Игрок еще не играл после появления user_stats - считаем по истории игр
+        history = await aggregate_history(db, [user_id])
+        if user_id in history:
+            stats = models.UserStats(**history[user_id])
     return {
-        "leaderboard": user_stats,
-        "recent_games": recent_games,
-        "poke_coins": user.poke_coins if user else 0
+        "leaderboard": {
+            "username": username,
+            "high_score": stats.high_score if stats else 0,
+            "total_waves": stats.total_waves if stats else 0,
+            "total_pokemons": stats.total_pokemons_caught if stats else 0,
+            "total_enemies": stats.total_enemies_defeated if stats else 0,
+        },
+        "recent_games": stats.recent_games if stats else [],
+        "poke_coins": poke_coins,
+        "stats": stats_payload(stats),
     }
 
 
+# Analytics CRUD
+async def get_game_rollups(db: AsyncSession, bucket: str, start, end):
+    """Агрегаты интервалов [start, end) - только таблица game_rollups"""
+    result = await db.scalars(
+        select(models.GameRollup)
+        .where(
+            models.GameRollup.bucket == bucket,
+            models.GameRollup.bucket_start >= start,
+            models.GameRollup.bucket_start < end
+        )
+        .order_by(models.GameRollup.bucket_start)
+    )
+    return result.all()
+
+
 # Pokemon CRUD
-def add_pokemon_to_user(db: Session, user_id: int, pokemon_data: schemas.PokemonCreate):
+async def add_pokemon_to_user(db: AsyncSession, user_id: int, pokemon_data: schemas.PokemonCreate):
     db_pokemon = models.UserPokemon(
         user_id=user_id,
         pokemon_id=pokemon_data.pokemon_id,
@@ -136,40 +423,47 @@ def add_pokemon_to_user(db: Session, user_id: int, pokemon_data: schemas.Pokemon
         is_favorite=False
     )
     db.add(db_pokemon)
-    db.commit()
-    db.refresh(db_pokemon)
+    await db.commit()
+    await db.refresh(db_pokemon)
     return db_pokemon
 
 
-def get_user_pokemons(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.UserPokemon) \
-        .filter(models.UserPokemon.user_id == user_id) \
-        .order_by(desc(models.UserPokemon.level), desc(models.UserPokemon.experience)) \
-        .offset(skip) \
-        .limit(limit) \
-        .all()
+async def get_user_pokemons(db: AsyncSession, user_id: int, skip: int = 0, limit: int = 100):
+    result = await db.scalars(
+        select(models.UserPokemon)
+        .where(models.UserPokemon.user_id == user_id)
+        .order_by(desc(models.UserPokemon.level), desc(models.UserPokemon.experience))
+        .offset(skip)
+        .limit(limit)
+    )
+    return result.all()
 
 
-def update_pokemon_favorite(db: Session, pokemon_id: int, user_id: int, is_favorite: bool):
-    pokemon = db.query(models.UserPokemon) \
-        .filter(models.UserPokemon.id == pokemon_id, models.UserPokemon.user_id == user_id) \
-        .first()
+async def update_pokemon_favorite(db: AsyncSession, pokemon_id: int, user_id: int, is_favorite: bool):
+    pokemon = await db.scalar(
+        select(models.UserPokemon)
+        .where(models.UserPokemon.id == pokemon_id, models.UserPokemon.user_id == user_id)
+    )
 
     if pokemon:
         pokemon.is_favorite = is_favorite
-        db.commit()
-        db.refresh(pokemon)
+        await db.commit()
+        await db.refresh(pokemon)
 
     return pokemon
 
 
-def update_user_coins(db: Session, user_id: int, coins_change: int):
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+async def update_user_coins(db: AsyncSession, user_id: int, coins_change: int):
+    # Атомарное изменение; гарантируем, что монеты не уйдут в минус
+    new_coins = models.User.poke_coins + coins_change
+    user = await db.scalar(
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(poke_coins=case((new_coins < 0, 0), else_=new_coins))
+        .returning(models.User)
+    )
+    await db.commit()
     if user:
-        user.poke_coins += coins_change
-        # Гарантируем, что монеты не уйдут в минус
-        if user.poke_coins < 0:
-            user.poke_coins = 0
-        db.commit()
-        db.refresh(user)
+        await principal_cache.invalidate_users([user_id])
+        await drop_cached_stats([user_id])
     return user
@@ -1,9 +1,24 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import QueuePool
 from .config import DATABASE_URL
 
+
+def get_async_database_url(url: str) -> str:
+    """URL для асинхронного драйвера: aiosqlite для SQLite, asyncpg для PostgreSQL"""
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql:"):
+        return url.replace("postgresql:", "postgresql+asyncpg:", 1)
+    if url.startswith("postgresql+psycopg2:"):
+        return url.replace("postgresql+psycopg2:", "postgresql+asyncpg:", 1)
+    return url
+
+
+ASYNC_DATABASE_URL = get_async_database_url(DATABASE_URL)
+
 # Определяем параметры подключения в зависимости от типа БД
 if DATABASE_URL.startswith("sqlite"):
     # Для SQLite
@@ -14,6 +29,7 @@ if DATABASE_URL.startswith("sqlite"):
         connect_args=connect_args,
         echo=False  # Установите True для отладки SQL запросов
     )
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=False)
     print(f"✓ Using SQLite database: {DATABASE_URL}")
 else:
     # Для PostgreSQL
@@ -26,21 +42,30 @@ else:
         pool_pre_ping=True,  # Проверка соединения перед использованием
         echo=False  # Установите True для отладки SQL запросов
     )
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        pool_size=10,
+        max_overflow=20,
+        pool_pre_ping=True,
+        echo=False
+    )
     print(f"✓ Using PostgreSQL database with connection pool")
 
-# Сессия БД
+# Синхронная сессия - для скриптов (create_tables.py, миграции)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Асинхронная сессия - для роутеров и crud.
+# expire_on_commit=False: после commit объекты читаются без повторного запроса
+# (ленивая подгрузка в асинхронной сессии недоступна)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 
-def get_db():
+async def get_db():
     """
-    Dependency для получения сессии БД.
+    Dependency для получения асинхронной сессии БД.
     Гарантирует закрытие сессии после использования.
     """
-    db = SessionLocal()
-    try:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -0,0 +1,51 @@
+"""
+Стихии покемонов и таблица эффективности атак.
+"""
+
+# Все стихии, допустимые ограничением check_valid_element в models.UserPokemon
+ELEMENTS = (
+    "fire", "water", "grass", "electric", "ice", "fighting", "poison", "ground", "flying",
+    "psychic", "bug", "rock", "ghost", "dark", "dragon", "steel", "fairy", "normal",
+)
+
+# Множители урона атакующая стихия -> защищающаяся; отсутствующая пара = 1.0
+TYPE_EFFECTIVENESS = {
+    "fire": {"grass": 2.0, "water": 0.5, "ice": 2.0, "bug": 2.0, "steel": 2.0},
+    "water": {"fire": 2.0, "grass": 0.5, "ground": 2.0, "rock": 2.0},
+    "grass": {"water": 2.0, "fire": 0.5, "ground": 2.0, "rock": 2.0, "electric": 0.5},
+    "electric": {"water": 2.0, "flying": 2.0, "grass": 0.5, "ground": 0},
+    "flying": {"grass": 2.0, "fighting": 2.0, "bug": 2.0, "electric": 0.5, "rock": 0.5},
+    "poison": {"grass": 2.0, "fairy": 2.0, "poison": 0.5, "ground": 0.5, "psychic": 0.5},
+    "psychic": {"fighting": 2.0, "poison": 2.0, "dark": 0, "ghost": 0.5},
+    "fighting": {"normal": 2.0, "rock": 2.0, "steel": 2.0, "flying": 0.5, "psychic": 0.5},
+    "rock": {"fire": 2.0, "ice": 2.0, "flying": 2.0, "bug": 2.0, "fighting": 0.5, "ground": 0.5},
+}
+
+# Реестр стихий: имя -> небольшой целочисленный код (индекс в ELEMENTS).
+# Шаблоны покемонов и врагов несут код в поле "element_code", поэтому в бою
+# строки стихий не хэшируются.
+ELEMENT_CODES = {name: code for code, name in enumerate(ELEMENTS)}
+ELEMENT_COUNT = len(ELEMENTS)
+
+# Предрасчитанная матрица ELEMENT_COUNT × ELEMENT_COUNT в плоском виде:
+# EFFECTIVENESS[attacker_code * ELEMENT_COUNT + defender_code] - множитель урона.
+# Векторный движок строит из нее NumPy-матрицу reshape(ELEMENT_COUNT, ELEMENT_COUNT).
+EFFECTIVENESS = tuple(
+    TYPE_EFFECTIVENESS.get(attacker, {}).get(defender, 1.0)
+    for attacker in ELEMENTS
+    for defender in ELEMENTS
+)
+
+
+def element_code(name: str) -> int:
+    return ELEMENT_CODES[name]
+
+
+def with_element_code(template: dict) -> dict:
+    """Добавляет шаблону покемона или врага код его стихии"""
+    template["element_code"] = ELEMENT_CODES[template["element"]]
+    return template
+
+
+def type_multiplier(attacker_code: int, defender_code: int) -> float:
+    return EFFECTIVENESS[attacker_code * ELEMENT_COUNT + defender_code]
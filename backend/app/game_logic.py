@@ -1,12 +1,44 @@
-import random
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, Optional
 from datetime import datetime
+from . import combat_numpy
+from .config import settings
+from .elements import ELEMENT_CODES, type_multiplier, with_element_code
+from .rng import GameRandom, new_seed
+from .spatial import UniformGrid
+from .units import POKEMON_SPEED_SCALE, Enemy, Pokemon
+
+# Линии баз (клиент получает их со схемой /game/state/schema)
+PLAYER_BASE_Y = 450  # враги останавливаются у базы игрока
+ENEMY_BASE_Y = 100  # покемоны - у вражеской базы
 
 
 class PokemonGameLogic:
-    def __init__(self, user_id: int):
+    # Версия формата сериализации (to_dict / from_dict)
+    STATE_VERSION = 4
+
+    # Поля, которые полностью описывают игру и переносятся между воркерами
+    SERIALIZED_FIELDS = (
+        "user_id", "engine", "player_health", "player_level", "player_exp", "player_max_exp",
+        "pokeballs", "score", "poke_coins", "wave", "game_over", "victory",
+        "deck", "hand", "field", "enemies", "wave_data",
+        "enemy_spawn_timer", "enemy_spawn_interval", "player_base_y", "enemy_base_y",
+        "last_tick_at", "tick_accumulator", "next_entity_id", "seed", "action_log",
+    )
+
+    def __init__(self, user_id: int, engine: Optional[str] = None, seed: Optional[int] = None):
         self.user_id = user_id
+        # Движок симуляции юнитов: "python" (словари) или "numpy" (векторизованный)
+        self.engine = engine or settings.COMBAT_ENGINE
         self.start_time = datetime.now()
+
+        # Собственный генератор игры: по зерну и журналу игру можно повторить (replay.py)
+        self.seed = new_seed() if seed is None else seed
+        self.rng = GameRandom(self.seed)
+        # Журнал [время от начала, "step", шаг, число шагов] / [время, действие, аргументы...];
+        # None - журнал не ведется (повтор игры или сессия старого формата)
+        self.action_log: Optional[List[list]] = []
+
         self.reset_game()
 
     def reset_game(self):
@@ -22,6 +54,9 @@ class PokemonGameLogic:
         self.game_over = False
         self.victory = False
 
+        # Счетчик уникальных id покемонов и врагов в пределах игры
+        self.next_entity_id = 100
+
         # Колода и рука
         self.deck = self.generate_initial_deck()
         self.hand = []
@@ -34,8 +69,12 @@ class PokemonGameLogic:
         self.enemy_spawn_interval = 1.5
 
         # Позиция базы игрока (нижняя линия)
-        self.player_base_y = 450  # Нижняя граница для врагов
-        self.enemy_base_y = 100  # Верхняя граница для наших покемонов
+        self.player_base_y = PLAYER_BASE_Y  # Нижняя граница для врагов
+        self.enemy_base_y = ENEMY_BASE_Y  # Верхняя граница для наших покемонов
+
+        # Серверные часы симуляции (см. advance)
+        self.last_tick_at = time.time()
+        self.tick_accumulator = 0.0
 
     def generate_initial_deck(self) -> List[Dict]:
         basic_pokemons = [
@@ -43,7 +82,7 @@ class PokemonGameLogic:
             {"id": 2, "name": "Squirtle", "element": "water", "health": 70, "attack": 10, "speed": 1.8},
             {"id": 3, "name": "Bulbasaur", "element": "grass", "health": 65, "attack": 11, "speed": 1.6},
         ]
-        return random.sample(basic_pokemons, 2)
+        return [with_element_code(pokemon) for pokemon in self.rng.sample(basic_pokemons, 2)]
 
     def generate_wave(self, wave_number: int) -> List[Dict]:
         enemies = []
@@ -60,13 +99,19 @@ class PokemonGameLogic:
                 {"name": "Geodude", "element": "rock", "health": 40 + wave_number * 6, "attack": 15 + wave_number,
                  "speed": 30 + wave_number * 5},
             ]
-            enemy = random.choice(enemy_types)
+            enemy = with_element_code(self.rng.choice(enemy_types))
             enemy["id"] = i
             enemies.append(enemy)
 
         return enemies
 
+    def new_entity_id(self) -> int:
+        entity_id = self.next_entity_id
+        self.next_entity_id += 1
+        return entity_id
+
     def open_pokeball(self) -> Dict:
+        self.log_action("open_pokeball")
         if self.pokeballs <= 0:
             return {"error": "No pokeballs left"}
 
@@ -82,8 +127,8 @@ class PokemonGameLogic:
             {"name": "Machop", "element": "fighting", "health": 70, "attack": 16, "speed": 1.4},
         ]
 
-        new_pokemon = random.choice(possible_pokemons)
-        new_pokemon["id"] = len(self.hand) + len(self.field) + 100
+        new_pokemon = with_element_code(self.rng.choice(possible_pokemons))
+        new_pokemon["id"] = self.new_entity_id()
 
         self.hand.append(new_pokemon)
 
@@ -91,6 +136,7 @@ class PokemonGameLogic:
 
     def play_card(self, card_id: int, x: int) -> Dict:  # ⭐ ИЗМЕНЕНИЕ: убран параметр y
         """Размещение покемона на базе игрока (фиксированная высота)"""
+        self.log_action("play_card", card_id, x)
         card_index = next((i for i, card in enumerate(self.hand) if card["id"] == card_id), None)
 
         if card_index is None:
@@ -104,45 +150,97 @@ class PokemonGameLogic:
             return {"error": "Position out of bounds"}
 
         # Проверяем, не занята ли позиция (допускаем минимальное расстояние 80px)
-        for pokemon in self.field:
-            if abs(pokemon["x"] - x) < 80 and abs(pokemon["y"] - base_y) < 50:
-                return {"error": "Position already occupied by another Pokemon"}
+        if UniformGrid(self.field).any_in_box(x, base_y, 80, 50):
+            return {"error": "Position already occupied by another Pokemon"}
 
         card = self.hand.pop(card_index)
-        field_pokemon = {
-            **card,
-            "x": x,
-            "y": base_y,  # ⭐ ФИКСИРОВАННАЯ Y координата
-            "current_health": card["health"],
-            "max_health": card["health"],  # ⭐ НОВОЕ: максимальное здоровье
-            "attack_cooldown": 0,
-            "is_moving": False,
-            "target": None,
-            "speed": card.get("speed", 1.5),
-            "attack_range": 120,
-            "reached_enemy_base": False,  # ⭐ НОВОЕ: достиг базы врага
-            "base_damage_timer": 0  # ⭐ НОВОЕ: таймер для урона на базе врага
-        }
+        field_pokemon = Pokemon(card, x, base_y)  # ⭐ ФИКСИРОВАННАЯ Y координата
         self.field.append(field_pokemon)
 
-        return {"success": True, "field": self.field}
+        return {"success": True, "field": [pokemon.to_wire() for pokemon in self.field]}
+
+    def advance(self, now: float, step: float, max_steps: int) -> int:
+        """
+        Продвигает симуляцию фиксированными шагами step (сек) до момента now (time.time()).
+        Возвращает число выполненных шагов.
+        """
+        steps = self.pending_steps(now, step, max_steps)
+        for _ in range(steps):
+            self.step(step)
+            if self.game_over:
+                break
+        return steps
+
+    def pending_steps(self, now: float, step: float, max_steps: int) -> int:
+        """
+        Учет серверного времени: сколько шагов step нужно выполнить к моменту now.
+        За один вызов не больше max_steps шагов - отставание сверх лимита
+        отбрасывается, чтобы зависший воркер не "перематывал" игру рывком.
+        """
+        elapsed = max(0.0, now - self.last_tick_at)
+        self.last_tick_at = now
+        if self.game_over:
+            self.tick_accumulator = 0.0
+            return 0
+
+        self.tick_accumulator += elapsed
+        steps = int(self.tick_accumulator / step)
+        if steps > max_steps:
+            steps = max_steps
+            self.tick_accumulator = 0.0
+        else:
+            self.tick_accumulator -= steps * step
+        return steps
 
     def update(self, delta_time: float = 0.1) -> Dict:
         """Обновление игрового состояния. delta_time в секундах."""
+        self.step(delta_time)
+        return self.get_state()
+
+    def step(self, delta_time: float):
+        """Один шаг симуляции без сборки состояния для клиента"""
         if self.game_over:
-            return self.get_state()
+            return
 
+        self.begin_step(delta_time)
+
+        # Движение и бой: выбранный движок симуляции юнитов
+        if self.engine == "numpy":
+            combat_numpy.step_units([self], delta_time)
+        else:
+            self.step_units(delta_time)
+
+        self.check_victory()
+
+    def begin_step(self, delta_time: float):
+        """Начало шага: запись в журнал и спавн врагов"""
+        self.log_step(delta_time)
+        self.spawn_enemies(delta_time)
+
+    def log_step(self, delta_time: float):
+        log = self.action_log
+        if log is None:
+            return
+        # Подряд идущие шаги одной длины хранятся одной записью
+        if log and log[-1][1] == "step" and log[-1][2] == delta_time:
+            log[-1][3] += 1
+        else:
+            log.append([self._log_time(), "step", delta_time, 1])
+
+    def log_action(self, action: str, *args):
+        if self.action_log is not None:
+            self.action_log.append([self._log_time(), action, *args])
+
+    def _log_time(self) -> float:
+        return round(time.time() - self.start_time.timestamp(), 3)
+
+    def spawn_enemies(self, delta_time: float):
         # Спавн врагов СВЕРХУ
         self.enemy_spawn_timer += delta_time
         if self.enemy_spawn_timer >= self.enemy_spawn_interval and self.wave_data:
             enemy_data = self.wave_data.pop(0)
-            enemy = {
-                **enemy_data,
-                "x": random.randint(50, 750),
-                "y": 100,
-                "current_health": enemy_data["health"],
-                "speed": enemy_data.get("speed", 50)
-            }
+            # id в волне повторяются между волнами, поэтому у врага на поле свой id
+            enemy = Enemy(enemy_data, self.new_entity_id(), self.rng.randint(50, 750), 100)
             self.enemies.append(enemy)
             self.enemy_spawn_timer = 0
 
@@ -150,17 +248,29 @@ class PokemonGameLogic:
                 self.wave += 1
                 self.wave_data = self.generate_wave(self.wave)
 
+    def step_units(self, delta_time: float):
+        """Эталонный движок юнитов на словарях (COMBAT_ENGINE=python)"""
+        self._move_enemies(delta_time)
+        self._update_field(delta_time)
+
+    def check_victory(self):
+        # Проверка победы (после 5 волн)
+        if self.wave > 5:
+            self.game_over = True
+            self.victory = True
+
+    def _move_enemies(self, delta_time: float):
         # Движение врагов ВНИЗ к базе игрока
         for enemy in self.enemies[:]:
             # Цель: нижняя линия защиты игрока
             target_y = self.player_base_y
 
             # Двигаемся вниз
-            dy = target_y - enemy["y"]
+            dy = target_y - enemy.y
             distance = abs(dy)
 
-            if distance < enemy["speed"] * delta_time:
-                enemy["y"] = target_y
+            if distance < enemy.speed * delta_time:
+                enemy.y = target_y
                 # Враг дошел до базы
                 self.player_health -= 20
                 self.enemies.remove(enemy)
@@ -169,81 +279,72 @@ class PokemonGameLogic:
                     self.game_over = True
             else:
                 # Продолжаем движение вниз
-                enemy["y"] += enemy["speed"] * delta_time if dy > 0 else -enemy["speed"] * delta_time
+                enemy.y += enemy.speed * delta_time if dy > 0 else -enemy.speed * delta_time
 
+    def _update_field(self, delta_time: float):
         # ⭐ НОВАЯ ЛОГИКА: покемоны на вражеской базе получают урон
         pokemons_to_remove = []
 
+        # Индекс врагов по клеткам: поиск цели смотрит только соседние клетки
+        enemy_grid = UniformGrid(self.enemies)
+
         for pokemon in self.field:
-            pokemon["attack_cooldown"] = max(0, pokemon["attack_cooldown"] - delta_time)
+            pokemon.attack_cooldown = max(0, pokemon.attack_cooldown - delta_time)
 
             # Если покемон уже на вражеской базе
-            if pokemon.get("reached_enemy_base", False):
-                pokemon["base_damage_timer"] += delta_time
+            if pokemon.reached_enemy_base:
+                pokemon.base_damage_timer += delta_time
 
                 # Каждую секунду наносим урон равный номеру волны
-                if pokemon["base_damage_timer"] >= 1.0:
-                    pokemon["current_health"] -= self.wave
-                    pokemon["base_damage_timer"] = 0
+                if pokemon.base_damage_timer >= 1.0:
+                    pokemon.current_health -= self.wave
+                    pokemon.base_damage_timer = 0
 
                     # Если здоровье закончилось - удаляем покемона
-                    if pokemon["current_health"] <= 0:
+                    if pokemon.current_health <= 0:
                         pokemons_to_remove.append(pokemon)
                         continue
             else:
-                # Ищем ближайшего врага
-                nearest_enemy = None
-                nearest_distance = float('inf')
-
-                for enemy in self.enemies:
-                    distance = ((pokemon["x"] - enemy["x"]) ** 2 + (pokemon["y"] - enemy["y"]) ** 2) ** 0.5
-                    if distance < pokemon["attack_range"] and distance < nearest_distance:
-                        nearest_enemy = enemy
-                        nearest_distance = distance
+                # Ищем ближайшего врага в радиусе атаки
+                nearest_index = enemy_grid.nearest(pokemon.x, pokemon.y, pokemon.attack_range)
+                nearest_enemy = enemy_grid.units[nearest_index] if nearest_index is not None else None
 
                 if nearest_enemy:
                     # Если враг в радиусе атаки
-                    pokemon["is_moving"] = False
-                    pokemon["target"] = nearest_enemy["id"]
+                    pokemon.is_moving = False
+                    pokemon.target = nearest_enemy.id
 
-                    if pokemon["attack_cooldown"] <= 0:
-                        damage_multiplier = self.get_type_multiplier(pokemon["element"], nearest_enemy["element"])
-                        damage = pokemon["attack"] * damage_multiplier
+                    if pokemon.attack_cooldown <= 0:
+                        damage_multiplier = type_multiplier(pokemon.element_code, nearest_enemy.element_code)
+                        damage = pokemon.attack * damage_multiplier
 
-                        nearest_enemy["current_health"] -= damage
-                        pokemon["attack_cooldown"] = 0.8
+                        nearest_enemy.current_health -= damage
+                        pokemon.attack_cooldown = 0.8
 
-                        if nearest_enemy["current_health"] <= 0:
+                        if nearest_enemy.current_health <= 0:
                             self.enemies.remove(nearest_enemy)
-                            self.score += 15
-                            self.player_exp += 2
-                            self.poke_coins += 1  # ⭐ НОВОЕ: монеты за врага
-
-                            if self.player_exp >= self.player_max_exp:
-                                self.player_level += 1
-                                self.pokeballs += 2
-                                self.player_exp = 0
-                                self.player_max_exp = int(self.player_max_exp * 1.2)
+                            enemy_grid.remove(nearest_index)
+                            self.reward_enemy_defeated()
                 else:
                     # Если врагов нет, двигаемся вверх к вражеской базе
-                    pokemon["is_moving"] = True
-                    pokemon["target"] = None
+                    pokemon.is_moving = True
+                    pokemon.target = None
 
                     # Двигаемся вверх с учетом скорости покемона
                     target_y = self.enemy_base_y
-                    dy = target_y - pokemon["y"]
+                    dy = target_y - pokemon.y
                     distance = abs(dy)
 
                     if distance > 10:  # Если не достигли цели
                         # Двигаемся вверх
-                        pokemon["y"] -= pokemon["speed"] * delta_time * 30
+                        pokemon.y -= pokemon.speed * delta_time * POKEMON_SPEED_SCALE
 
                         # Проверяем, достигли ли вражеской базы
-                        if pokemon["y"] <= target_y:
-                            pokemon["y"] = target_y
-                            pokemon["reached_enemy_base"] = True
-                            pokemon["is_moving"] = False
-                            pokemon["base_damage_timer"] = 0
+                        if pokemon.y <= target_y:
+                            pokemon.y = target_y
+                            pokemon.reached_enemy_base = True
+                            pokemon.is_moving = False
+                            pokemon.base_damage_timer = 0
                             # Награда за достижение вражеской базы
                             self.score += 50
                             self.poke_coins += 5  # ⭐ НОВОЕ: монеты за достижение базы
@@ -252,28 +353,52 @@ class PokemonGameLogic:
         for pokemon in pokemons_to_remove:
             self.field.remove(pokemon)
 
-        # Проверка победы (после 5 волн)
-        if self.wave > 5:
-            self.game_over = True
-            self.victory = True
+    def reward_enemy_defeated(self):
+        """Награда за побежденного врага (общая для всех движков)"""
+        self.score += 15
+        self.player_exp += 2
+        self.poke_coins += 1  # ⭐ НОВОЕ: монеты за врага
 
-        return self.get_state()
+        if self.player_exp >= self.player_max_exp:
+            self.player_level += 1
+            self.pokeballs += 2
+            self.player_exp = 0
+            self.player_max_exp = int(self.player_max_exp * 1.2)
 
     def get_type_multiplier(self, attacker: str, defender: str) -> float:
-        effectiveness = {
-            "fire": {"grass": 2.0, "water": 0.5, "ice": 2.0, "bug": 2.0, "steel": 2.0},
-            "water": {"fire": 2.0, "grass": 0.5, "ground": 2.0, "rock": 2.0},
-            "grass": {"water": 2.0, "fire": 0.5, "ground": 2.0, "rock": 2.0, "electric": 0.5},
-            "electric": {"water": 2.0, "flying": 2.0, "grass": 0.5, "ground": 0},
-            "flying": {"grass": 2.0, "fighting": 2.0, "bug": 2.0, "electric": 0.5, "rock": 0.5},
-            "poison": {"grass": 2.0, "fairy": 2.0, "poison": 0.5, "ground": 0.5, "psychic": 0.5},
-            "psychic": {"fighting": 2.0, "poison": 2.0, "dark": 0, "ghost": 0.5},
-            "fighting": {"normal": 2.0, "rock": 2.0, "steel": 2.0, "flying": 0.5, "psychic": 0.5},
-            "rock": {"fire": 2.0, "ice": 2.0, "flying": 2.0, "bug": 2.0, "fighting": 0.5, "ground": 0.5},
-        }
-        return effectiveness.get(attacker, {}).get(defender, 1.0)
+        return type_multiplier(ELEMENT_CODES[attacker], ELEMENT_CODES[defender])
+
+    def state_time(self) -> float:
+        """Момент (time.time()), которому соответствует состояние: остаток аккумулятора еще не просчитан"""
+        return self.last_tick_at - self.tick_accumulator
+
+    def pokemon_velocity(self, pokemon: Pokemon) -> float:
+        """Скорость покемона по y (пикс/с) до следующего шага - для экстраполяции на клиенте"""
+        if self.game_over:
+            return 0.0
+        if pokemon.is_moving and not pokemon.reached_enemy_base and abs(self.enemy_base_y - pokemon.y) > 10:
+            return round(-pokemon.speed * POKEMON_SPEED_SCALE, 3)
+        return 0.0
+
+    def enemy_velocity(self, enemy: Enemy) -> float:
+        """Скорость врага по y (пикс/с): враги всегда идут к базе игрока"""
+        dy = self.player_base_y - enemy.y
+        if dy == 0 or self.game_over:
+            return 0.0
+        return float(enemy.speed if dy > 0 else -enemy.speed)
 
     def get_state(self) -> Dict:
+        field = []
+        for pokemon in self.field:
+            data = pokemon.to_wire()
+            data["vy"] = self.pokemon_velocity(pokemon)
+            field.append(data)
+        enemies = []
+        for enemy in self.enemies:
+            data = enemy.to_wire()
+            data["vy"] = self.enemy_velocity(enemy)
+            enemies.append(data)
+
         return {
             "player_health": self.player_health,
             "player_level": self.player_level,
@@ -282,24 +407,70 @@ class PokemonGameLogic:
             "pokeballs": self.pokeballs,
             "poke_coins": self.poke_coins,  # ⭐ НОВОЕ: монеты в состоянии
             "hand": self.hand,
-            "field": [
-                {
-                    **pokemon,
-                    "is_moving": pokemon.get("is_moving", False),
-                    "target": pokemon.get("target"),
-                    "speed": pokemon.get("speed", 1.5),
-                    "reached_enemy_base": pokemon.get("reached_enemy_base", False),  # ⭐ НОВОЕ
-                    "max_health": pokemon.get("max_health", pokemon["health"])  # ⭐ НОВОЕ
-                }
-                for pokemon in self.field
-            ],
-            "enemies": self.enemies,
+            "field": field,
+            "enemies": enemies,
             "wave": self.wave,
             "score": self.score,
             "game_over": self.game_over,
             "victory": self.victory,
             "player_base_y": self.player_base_y,
-            "enemy_base_y": self.enemy_base_y
+            "enemy_base_y": self.enemy_base_y,
+            # Время состояния и отправки: клиент экстраполирует позиции по vy на возраст кадра
+            "time": round(self.state_time(), 3),
+            "server_time": round(time.time(), 3),
+        }
+
+    def to_dict(self) -> Dict:
+        """Сериализация игры в JSON-совместимый словарь (для общего хранилища сессий)"""
+        data = {field: getattr(self, field) for field in self.SERIALIZED_FIELDS}
+        data["field"] = [pokemon.to_wire() for pokemon in self.field]
+        data["enemies"] = [enemy.to_wire() for enemy in self.enemies]
+        data["rng_state"] = self.rng.getstate()
+        data["version"] = self.STATE_VERSION
+        data["start_time"] = self.start_time.isoformat()
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "PokemonGameLogic":
+        """Восстановление игры из словаря to_dict() без повторной генерации колоды и волн"""
+        if data.get("version") == 2:
+            data = cls._upgrade_v2(data)
+        if data.get("version") == 3:
+            data = cls._upgrade_v3(data)
+        if data.get("version") != cls.STATE_VERSION:
+            raise ValueError(f"Unsupported game state version: {data.get('version')}")
+
+        game = cls.__new__(cls)
+        for field in cls.SERIALIZED_FIELDS:
+            setattr(game, field, data[field])
+        game.field = [Pokemon.from_wire(pokemon) for pokemon in data["field"]]
+        game.enemies = [Enemy.from_wire(enemy) for enemy in data["enemies"]]
+        game.start_time = datetime.fromisoformat(data["start_time"])
+        game.rng = GameRandom()
+        game.rng.setstate(data["rng_state"])
+        return game
+
+    @staticmethod
+    def _upgrade_v2(data: Dict) -> Dict:
+        """Версия 2 не хранила коды стихий у юнитов и шаблонов"""
+        data = dict(data, version=3)
+        for name in ("deck", "hand", "field", "enemies", "wave_data"):
+            data[name] = [with_element_code(dict(unit)) for unit in data[name]]
+        return data
+
+    @staticmethod
+    def _upgrade_v3(data: Dict) -> Dict:
+        """Версия 3 использовала глобальный random: зерна нет, игру нельзя повторить"""
+        return dict(data, version=4, seed=None, action_log=None, rng_state=new_seed())
+
+    def get_replay(self) -> Dict:
+        """Запись для повтора игры: зерно, журнал и заявленный результат (см. replay.py)"""
+        return {
+            "user_id": self.user_id,
+            "engine": self.engine,
+            "seed": self.seed,
+            "log": self.action_log,
+            "result": self.get_game_result(),
         }
 
     def get_game_result(self) -> Dict:
@@ -0,0 +1,102 @@
+"""
+Индекс лидерборда в sorted set Redis (ZSET): user_id -> лучший счет.
+
+Ранг игрока, страница топа и окно "игроки рядом со мной" считаются за O(log N)
+(ZREVRANK / ZREVRANGE), без ORDER BY ... OFFSET и без COUNT по всей таблице.
+Имена и прочая статистика для страницы берутся из SQL одним запросом по id.
+
+Без REDIS_URL индекс живет в LocalRedis на skip list (см. skiplist.py) с той же
+стоимостью O(log N). Он свой у воркера, но без общего Redis воркер один (см. gunicorn.conf.py),
+поэтому индекс не расходится с таблицей: при старте строится из нее и обновляется каждым результатом.
+
+Счет обновляется после записи результата игры (crud), ZADD GT оставляет максимум.
+Каждое обновление увеличивает версию лидерборда - по ней сбрасывается кэш страниц.
+При пустом индексе (холодный старт, новый Redis) он перестраивается из таблицы leaderboard.
+"""
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from . import models
+from .database import AsyncSessionLocal
+from .redis_client import RedisClient, redis_client
+
+LEADERBOARD_KEY = "leaderboard:scores"
+REBUILD_CHUNK = 1000
+
+
+def member(user_id: int) -> str:
+    """
+    Элемент ZSET для игрока. При равном счете ZSET упорядочивает элементы как строки,
+    поэтому id дополняются нулями: порядок совпадает с SQL (high_score DESC, user_id DESC)
+    """
+    return f"{user_id:010d}"
+
+
+class LeaderboardIndex:
+    def __init__(self, client: RedisClient, key: str = LEADERBOARD_KEY):
+        self.client = client
+        self.key = key
+
+    @property
+    def redis(self):
+        return self.client.redis
+
+    async def record_scores(self, scores: Dict[int, int]):
+        """Обновляет лучшие счета {user_id: score}; меньший счет не перезаписывает больший"""
+        if scores:
+            await self.redis.zadd(self.key, {member(user_id): score for user_id, score in scores.items()}, gt=True)
+            await self.client.bump_leaderboard_version()
+
+    async def total(self) -> int:
+        return await self.redis.zcard(self.key)
+
+    async def rank(self, user_id: int) -> Optional[int]:
+        """Место игрока, с 1"""
+        rank = await self.redis.zrevrank(self.key, member(user_id))
+        return None if rank is None else rank + 1
+
+    async def top(self, offset: int, limit: int) -> List[Tuple[int, int]]:
+        """[(user_id, score)] для мест offset+1 .. offset+limit"""
+        if limit <= 0:
+            return []
+        items = await self.redis.zrevrange(self.key, offset, offset + limit - 1, withscores=True)
+        return [(int(user_id), int(score)) for user_id, score in items]
+
+    async def around(self, user_id: int, radius: int) -> Tuple[Optional[int], int, List[Tuple[int, int]]]:
+        """Место игрока, место первого игрока окна и окно из radius игроков выше и ниже"""
+        rank = await self.rank(user_id)
+        if rank is None:
+            return None, 1, []
+        offset = max(rank - 1 - radius, 0)
+        return rank, offset + 1, await self.top(offset, rank - offset + radius)
+
+    async def rebuild(self, db) -> int:
+        """Перестраивает индекс из таблицы leaderboard (во временный ключ, затем RENAME)"""
+        building_key = f"{self.key}:rebuild"
+        await self.redis.delete(building_key)
+
+        result = await db.stream(select(models.Leaderboard.user_id, models.Leaderboard.high_score))
+        count = 0
+        async for chunk in result.partitions(REBUILD_CHUNK):
+            await self.redis.zadd(building_key, {member(user_id): high_score for user_id, high_score in chunk})
+            count += len(chunk)
+
+        if count:
+            await self.redis.rename(building_key, self.key)
+        else:
+            await self.redis.delete(self.key)
+        await self.client.bump_leaderboard_version()
+        return count
+
+    async def ensure_built(self):
+        """Холодный старт: пустой индекс строится из SQL"""
+        if await self.redis.zcard(self.key):
+            return
+        async with AsyncSessionLocal() as db:
+            count = await self.rebuild(db)
+        print(f"✓ Leaderboard index rebuilt from database: {count} players")
+
+
+# Глобальный индекс лидерборда
+leaderboard_index = LeaderboardIndex(redis_client)
@@ -1,4 +1,5 @@
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
@@ -9,11 +10,24 @@ from .routers.auth import router as auth_router
 from .routers.users import router as users_router
 from .routers.game import router as game_router
 from .routers.leaderboard import router as leaderboard_router
+from .routers.analytics import router as analytics_router
+from .analytics import rollup_worker
+from .archive import extend_partitions
 from .config import settings
-from .database import engine, Base
+from .database import async_engine, engine, Base
+from .redis_client import redis_client
+from .leaderboard import leaderboard_index
+from .password_pool import PasswordPoolBusy, password_pool
+from .principal_cache import principal_cache
+from .result_queue import result_queue
+from .checkpoint import checkpointer
+from .session_store import SessionLockTimeout, session_store
+from .scheduler import scheduler
 
 # Создаем таблицы
 Base.metadata.create_all(bind=engine)
+# Секции game_sessions на следующие месяцы (PostgreSQL, после python -m app.archive partition)
+extend_partitions()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -30,11 +44,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.on_event("startup")
+async def startup():
+    await redis_client.connect()
+    principal_cache.start()
+    await leaderboard_index.ensure_built()
+    await session_store.start()
+    scheduler.start()
+    result_queue.start()
+    rollup_worker.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await scheduler.stop()
+    await session_store.stop()
+    await rollup_worker.stop()
+    await result_queue.stop()
+    await principal_cache.stop()
+    await redis_client.disconnect()
+    password_pool.shutdown()
+    await async_engine.dispose()
+
+
+@app.exception_handler(SessionLockTimeout)
+async def session_lock_timeout_handler(request: Request, exc: SessionLockTimeout):
+    # Параллельный запрос того же игрока слишком долго держит сессию
+    return JSONResponse(status_code=409, content={"detail": str(exc)})
+
+
+@app.exception_handler(PasswordPoolBusy)
+async def password_pool_busy_handler(request: Request, exc: PasswordPoolBusy):
+    # Всплеск входов: отказываем сразу, а не держим запрос в очереди bcrypt
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+
 # Подключаем роутеры
 app.include_router(auth_router)
 app.include_router(users_router)
 app.include_router(game_router)
 app.include_router(leaderboard_router)
+app.include_router(analytics_router)
 
 # Определяем абсолютные пути
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -85,3 +136,16 @@ async def play(request: Request):
 def health_check():
     return {"status": "ok", "service": "Pokemon Tower Defense"}
 
+
+@app.get("/metrics")
+def metrics():
+    """Внутренние метрики воркера"""
+    return {
+        "scheduler": scheduler.metrics,
+        "password_pool": password_pool.metrics,
+        "result_queue": result_queue.metrics,
+        "analytics": rollup_worker.metrics,
+        "checkpoints": checkpointer.metrics,
+        "sessions": session_store.metrics,
+    }
+
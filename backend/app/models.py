@@ -92,6 +92,33 @@ class UserPokemon(Base):
     user = relationship("User", back_populates="owned_pokemons")
 
 
+class UserStats(Base):
+    """
+    Накопленная статистика игрока, обновляется в транзакции записи результатов игр
+    (crud.create_game_sessions). Пересобирается из game_sessions: python -m app.backfill_stats
+    """
+    __tablename__ = "user_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    total_games = Column(Integer, default=0, nullable=False)
+    wins = Column(Integer, default=0, nullable=False)
+    losses = Column(Integer, default=0, nullable=False)
+    total_score = Column(Integer, default=0, nullable=False)
+    high_score = Column(Integer, default=0, nullable=False)
+    total_coins_earned = Column(Integer, default=0, nullable=False)
+    total_waves = Column(Integer, default=0, nullable=False)
+    total_pokemons_caught = Column(Integer, default=0, nullable=False)
+    total_enemies_defeated = Column(Integer, default=0, nullable=False)
+    recent_games = Column(JSON, default=list, nullable=False)  # последние RECENT_GAMES игр, новые первыми
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    # Ограничения для PostgreSQL
+    __table_args__ = (
+        CheckConstraint('total_games = wins + losses', name='check_stats_games_total'),
+        CheckConstraint('total_score >= 0', name='check_stats_score_positive'),
+    )
+
+
 class Leaderboard(Base):
     __tablename__ = "leaderboard"
 
@@ -111,8 +138,40 @@ class Leaderboard(Base):
         CheckConstraint('total_pokemons >= 0', name='check_total_pokemons_positive'),
         CheckConstraint('total_enemies >= 0', name='check_total_enemies_positive'),
         Index('idx_leaderboard_high_score', 'high_score', unique=False),
+        Index('idx_leaderboard_score_user', 'high_score', 'user_id'),  # keyset-пагинация лидерборда
         Index('idx_leaderboard_total_waves', 'total_waves', unique=False),
     )
 
     # Связи
     user = relationship("User", foreign_keys=[user_id])
+
+
+class GameRollup(Base):
+    """
+    Агрегаты game_sessions по интервалам времени (час / сутки) для аналитики.
+    Заполняется инкрементально фоновой задачей (см. app/analytics.py)
+    """
+    __tablename__ = "game_rollups"
+
+    bucket = Column(String(10), primary_key=True)  # "hour" или "day"
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    games = Column(Integer, default=0, nullable=False)
+    wins = Column(Integer, default=0, nullable=False)
+    total_score = Column(Integer, default=0, nullable=False)
+    total_waves = Column(Integer, default=0, nullable=False)
+    coins_minted = Column(Integer, default=0, nullable=False)
+    total_duration = Column(Float, default=0.0, nullable=False)
+
+    # Ограничения для PostgreSQL
+    __table_args__ = (
+        CheckConstraint('wins <= games', name='check_rollup_wins'),
+    )
+
+
+class RollupCheckpoint(Base):
+    """Отметка обработанных game_sessions (последний id) для каждого потока агрегации"""
+    __tablename__ = "rollup_checkpoints"
+
+    name = Column(String(50), primary_key=True)
+    last_session_id = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
@@ -0,0 +1,103 @@
+"""
+Отдельный пул потоков для хеширования и проверки паролей.
+
+bcrypt специально медленный (сотни миллисекунд при BCRYPT_ROUNDS=12). Если считать
+его в общем пуле потоков FastAPI, всплеск входов занимает все потоки, и игровые
+запросы ждут в очереди за ним. Поэтому bcrypt выполняется в своем пуле
+ограниченного размера (PASSWORD_HASH_WORKERS). bcrypt отпускает GIL, поэтому
+хватает потоков, процессы не нужны.
+
+Очередь тоже ограничена: если ожидающих операций уже PASSWORD_HASH_MAX_PENDING,
+новая сразу отклоняется с PasswordPoolBusy (в main.py это 503 с Retry-After).
+Клиенту лучше получить быстрый отказ, чем ждать в очереди дольше таймаута.
+
+    hashed = await password_pool.hash(password)
+    ok = await password_pool.verify(password, user.hashed_password)
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from .auth import get_password_hash, verify_password
+from .config import settings
+
+
+class PasswordPoolBusy(Exception):
+    """Очередь пула паролей заполнена"""
+
+
+class PasswordPool:
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Счетчик меняется только в потоке event loop, блокировка не нужна
+        self.pending = 0
+
+        # Метрики
+        self.rejected = 0
+        self.max_pending_seen = 0
+        self.stats: Dict[str, Dict] = {
+            op: {"count": 0, "avg_ms": 0.0, "max_ms": 0.0, "last_ms": 0.0} for op in ("hash", "verify")
+        }
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password")
+        return self._executor
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run("verify", verify_password, plain_password, hashed_password)
+
+    async def _run(self, op: str, func: Callable, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordPoolBusy("Too many login requests, try again later")
+
+        self.pending += 1
+        self.max_pending_seen = max(self.max_pending_seen, self.pending)
+        try:
+            loop = asyncio.get_running_loop()
+            started = time.perf_counter()
+            result = await loop.run_in_executor(self.executor, func, *args)
+            self._record(op, (time.perf_counter() - started) * 1000)
+            return result
+        finally:
+            self.pending -= 1
+
+    def _record(self, op: str, elapsed_ms: float):
+        # Время включает ожидание в очереди пула - именно его видит клиент
+        stats = self.stats[op]
+        stats["count"] += 1
+        stats["last_ms"] = elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        stats["avg_ms"] = elapsed_ms if stats["count"] == 1 else stats["avg_ms"] * 0.9 + elapsed_ms * 0.1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    @property
+    def metrics(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "bcrypt_rounds": settings.BCRYPT_ROUNDS,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "max_pending_seen": self.max_pending_seen,
+            "rejected": self.rejected,
+            **{
+                op: {key: round(value, 3) for key, value in stats.items()}
+                for op, stats in self.stats.items()
+            },
+        }
+
+
+# Глобальный пул воркера
+password_pool = PasswordPool(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_PENDING)
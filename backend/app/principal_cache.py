@@ -0,0 +1,127 @@
+"""
+Кэш аутентифицированных пользователей (principal) в памяти воркера.
+
+get_current_user вызывается на каждый запрос, в том числе на частый опрос
+/game/state, поэтому пользователь по имени из JWT берется из кэша, а не из БД.
+В кэше лежат отвязанные от сессии БД схемы UserResponse (только для чтения).
+
+- размер ограничен (PRINCIPAL_CACHE_SIZE), вытесняются давно не использованные записи;
+- запись живет PRINCIPAL_CACHE_TTL секунд;
+- crud сбрасывает запись при изменении монет или is_active (invalidate_users).
+
+Кэш локален для воркера, поэтому с общим Redis сброс рассылается всем воркерам
+через pub/sub (канал RedisClient.PRINCIPAL_CHANNEL): /users/me, /users/coins и
+проверка is_active читают кэш без запроса к БД. Без Redis воркер один (см.
+gunicorn.conf.py) и локального сброса достаточно. Если сообщение потерялось
+(обрыв соединения), после переподключения кэш очищается целиком, а в худшем
+случае запись устаревает не дольше чем на TTL.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from . import schemas
+from .config import settings
+from .redis_client import RedisClient, redis_client
+
+
+class PrincipalCache:
+    def __init__(self, max_size: int, ttl: float, client: RedisClient):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.client = client
+        self._task: Optional[asyncio.Task] = None
+        # username -> (истекает, пользователь); порядок - от давно использованных к недавним
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._usernames: Dict[int, str] = {}
+        # Синхронные эндпоинты работают в пуле потоков
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, username: str) -> Optional[schemas.UserResponse]:
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._pop(username)
+                return None
+            self._entries.move_to_end(username)
+            return entry[1]
+
+    def put(self, user) -> schemas.UserResponse:
+        """Кладет в кэш пользователя (модель БД или схему) и возвращает закэшированную схему"""
+        principal = schemas.UserResponse.model_validate(user)
+        if self.max_size <= 0:
+            return principal
+
+        with self._lock:
+            self._pop(principal.username)
+            self._entries[principal.username] = (time.monotonic() + self.ttl, principal)
+            self._usernames[principal.id] = principal.username
+            while len(self._entries) > self.max_size:
+                self._pop(next(iter(self._entries)))
+        return principal
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            username = self._usernames.get(user_id)
+            if username is not None:
+                self._pop(username)
+
+    async def invalidate_users(self, user_ids: List[int]):
+        """Сброс записей в этом воркере и, через Redis pub/sub, во всех остальных"""
+        for user_id in user_ids:
+            self.invalidate(user_id)
+        if user_ids and self.shared:
+            try:
+                await self.client.publish_principal_invalidation(user_ids)
+            except Exception as e:
+                print(f"⚠️ Failed to publish principal invalidation: {e}")
+
+    @property
+    def shared(self) -> bool:
+        # Рассылка нужна, только если воркеры делят настоящий Redis
+        return self.client.redis is not None and not self.client.is_local
+
+    def start(self):
+        if self._task is None and self.shared and self.max_size > 0:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _listen(self):
+        while True:
+            try:
+                async for user_ids in self.client.principal_invalidations():
+                    for user_id in user_ids:
+                        self.invalidate(user_id)
+            except Exception as e:
+                print(f"⚠️ Principal invalidation channel failed: {e}")
+            # Пока подписки не было, сбросы других воркеров могли потеряться
+            self.clear()
+            await asyncio.sleep(1)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._usernames.clear()
+
+    def _pop(self, username: str):
+        entry = self._entries.pop(username, None)
+        if entry is not None:
+            self._usernames.pop(entry[1].id, None)
+
+
+principal_cache = PrincipalCache(settings.PRINCIPAL_CACHE_SIZE, settings.PRINCIPAL_CACHE_TTL, redis_client)
@@ -1,54 +1,398 @@
-import redis.asyncio as redis
+import time
+from typing import Dict, List, Optional, Tuple
 from .config import settings
-import json
+from .skiplist import SortedScoreSet
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # redis не установлен - работаем на локальной заглушке
+    redis = None
+
+
+class LocalRedis:
+    """
+    Минимальная замена Redis в памяти процесса (в духе fakeredis).
+    Поддерживает только команды, которые использует RedisClient.
+    Подходит для локального запуска и тестов, но НЕ разделяется между воркерами.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._expires = {}
+
+    def _alive(self, key) -> bool:
+        expire_at = self._expires.get(key)
+        if expire_at is not None and expire_at <= time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+            return False
+        return key in self._data
+
+    async def ping(self):
+        return True
+
+    async def close(self):
+        self._data.clear()
+        self._expires.clear()
+
+    async def get(self, key):
+        return self._data.get(key) if self._alive(key) else None
+
+    async def mget(self, keys):
+        return [await self.get(key) for key in keys]
+
+    async def set(self, key, value, ex=None, px=None, nx=False):
+        if nx and self._alive(key):
+            return None
+        self._data[key] = value
+        if ex is not None:
+            self._expires[key] = time.monotonic() + ex
+        elif px is not None:
+            self._expires[key] = time.monotonic() + px / 1000
+        else:
+            self._expires.pop(key, None)
+        return True
+
+    async def incr(self, key):
+        value = int(await self.get(key) or 0) + 1
+        self._data[key] = str(value)
+        return value
+
+    async def setex(self, key, seconds, value):
+        return await self.set(key, value, ex=seconds)
+
+    async def getdel(self, key):
+        value = await self.get(key)
+        await self.delete(key)
+        return value
+
+    async def sadd(self, key, *members):
+        if not self._alive(key):
+            self._data[key] = set()
+        current = self._data[key]
+        added = len(set(members) - current)
+        current.update(members)
+        return added
+
+    async def srem(self, key, *members):
+        current = self._data[key] if self._alive(key) else set()
+        removed = len(current & set(members))
+        current.difference_update(members)
+        return removed
+
+    async def smembers(self, key):
+        return set(self._data.get(key, ())) if self._alive(key) else set()
+
+    # Sorted set: {member: score} для поиска score и skip list для рангов
+    def _zset(self, key, create=False):
+        if self._alive(key):
+            return self._data[key]
+        if not create:
+            return None
+        zset = self._data[key] = ({}, SortedScoreSet())
+        return zset
+
+    async def zadd(self, key, mapping, nx=False, gt=False):
+        scores, index = self._zset(key, create=True)
+        added = 0
+        for member, score in mapping.items():
+            member, score = str(member), float(score)
+            current = scores.get(member)
+            if current is None:
+                added += 1
+            elif nx or (gt and score <= current) or score == current:
+                continue
+            else:
+                index.remove(current, member)
+            scores[member] = score
+            index.add(score, member)
+        return added
+
+    async def zrem(self, key, *members):
+        zset = self._zset(key)
+        if zset is None:
+            return 0
+        removed = 0
+        for member in map(str, members):
+            score = zset[0].pop(member, None)
+            if score is not None:
+                zset[1].remove(score, member)
+                removed += 1
+        return removed
+
+    async def zscore(self, key, member):
+        zset = self._zset(key)
+        return zset[0].get(str(member)) if zset else None
+
+    async def zcard(self, key):
+        zset = self._zset(key)
+        return len(zset[0]) if zset else 0
+
+    async def zrevrank(self, key, member):
+        zset = self._zset(key)
+        if zset is None or str(member) not in zset[0]:
+            return None
+        member = str(member)
+        return len(zset[0]) - 1 - zset[1].rank(zset[0][member], member)
+
+    async def zrevrange(self, key, start, end, withscores=False):
+        zset = self._zset(key)
+        if zset is None:
+            return []
+        size = len(zset[0])
+        start = max(start + size if start < 0 else start, 0)
+        end = min(end + size if end < 0 else end, size - 1)
+        if start > end:
+            return []
+        # Ранги по убыванию start..end - это ранги по возрастанию size-1-end..size-1-start
+        items = list(zset[1].slice(size - 1 - end, size - 1 - start))
+        items.reverse()
+        if withscores:
+            return [(member, score) for score, member in items]
+        return [member for _, member in items]
+
+    async def rename(self, key, new_key):
+        if not self._alive(key):
+            raise KeyError(key)
+        self._data[new_key] = self._data.pop(key)
+        expire_at = self._expires.pop(key, None)
+        if expire_at is not None:
+            self._expires[new_key] = expire_at
+        else:
+            self._expires.pop(new_key, None)
+        return True
+
+    async def delete(self, *keys):
+        removed = 0
+        for key in keys:
+            if self._alive(key):
+                removed += 1
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return removed
 
 
 class RedisClient:
+    # Атомарное снятие блокировки: удаляем ключ, только если он все еще наш
+    RELEASE_LOCK_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+
+    # Продление блокировки, только если она все еще наша
+    RENEW_LOCK_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('pexpire', KEYS[1], ARGV[2])
+    end
+    return 0
+    """
+
+    # Снятие пачки блокировок одним вызовом (тик планировщика)
+    RELEASE_LOCKS_SCRIPT = """
+    local released = 0
+    for _, key in ipairs(KEYS) do
+        if redis.call('get', key) == ARGV[1] then
+            released = released + redis.call('del', key)
+        end
+    end
+    return released
+    """
+
+    # Канал сброса кэша аутентификации во всех воркерах (см. principal_cache.py)
+    PRINCIPAL_CHANNEL = "principal:invalidate"
+
     def __init__(self):
         self.redis = None
+        # Соединение без декодирования ответов - для двоичных снимков игр (см. snapshot.py)
+        self.binary = None
+
+    @property
+    def is_local(self) -> bool:
+        return isinstance(self.redis, LocalRedis)
 
     async def connect(self):
-        self.redis = await redis.from_url(
-            settings.REDIS_URL,
-            encoding="utf-8",
-            decode_responses=True
-        )
+        if settings.REDIS_URL and redis is not None:
+            self.redis = await redis.from_url(
+                settings.REDIS_URL,
+                encoding="utf-8",
+                decode_responses=True
+            )
+            self.binary = await redis.from_url(settings.REDIS_URL)
+        else:
+            print("⚠️ REDIS_URL не задан - используется локальный Redis в памяти")
+            self.redis = self.binary = LocalRedis()
 
     async def disconnect(self):
+        if self.binary and self.binary is not self.redis:
+            await self.binary.close()
         if self.redis:
             await self.redis.close()
 
     async def ping(self):
         return await self.redis.ping()
 
-    async def set_game(self, user_id: int, game_data: dict):
+    async def set_game(self, user_id: int, snapshot: bytes):
+        """Двоичный снимок игры (snapshot.encode_game)"""
         key = f"game:{user_id}"
-        await self.redis.setex(
+        await self.binary.setex(
             key,
             3600,  # TTL 1 час
-            json.dumps(game_data)
+            snapshot
         )
 
-    async def get_game(self, user_id: int) -> dict:
-        key = f"game:{user_id}"
-        data = await self.redis.get(key)
-        return json.loads(data) if data else None
+    async def get_game(self, user_id: int) -> Optional[bytes]:
+        """Снимок игры; сессии, сохраненные до снимков, возвращаются как JSON в байтах"""
+        return await self.binary.get(f"game:{user_id}")
+
+    async def get_games(self, user_ids: List[int]) -> List[Optional[bytes]]:
+        """Снимки пачки игр одним MGET"""
+        if not user_ids:
+            return []
+        return await self.binary.mget([f"game:{user_id}" for user_id in user_ids])
+
+    async def set_games(self, snapshots: Dict[int, bytes]):
+        """Снимки пачки игр одним конвейером (pipeline), TTL как у set_game"""
+        if self.is_local:
+            for user_id, snapshot in snapshots.items():
+                await self.set_game(user_id, snapshot)
+            return
+        async with self.binary.pipeline(transaction=False) as pipe:
+            for user_id, snapshot in snapshots.items():
+                pipe.setex(f"game:{user_id}", 3600, snapshot)
+            await pipe.execute()
+
+    async def set_checkpoints(self, snapshots: Dict[int, bytes], ttl: int):
+        """Чекпоинты игр воркера одним конвейером (pipeline)"""
+        if self.is_local:
+            for user_id, snapshot in snapshots.items():
+                await self.binary.setex(f"checkpoint:{user_id}", ttl, snapshot)
+            return
+        async with self.binary.pipeline(transaction=False) as pipe:
+            for user_id, snapshot in snapshots.items():
+                pipe.setex(f"checkpoint:{user_id}", ttl, snapshot)
+            await pipe.execute()
+
+    async def get_checkpoint(self, user_id: int) -> Optional[bytes]:
+        return await self.binary.get(f"checkpoint:{user_id}")
+
+    async def claim_checkpoint(self, user_id: int) -> Optional[bytes]:
+        """Забирает чекпоинт (GETDEL): после перезапуска игру восстановит только один воркер"""
+        return await self.binary.getdel(f"checkpoint:{user_id}")
+
+    async def delete_checkpoint(self, user_id: int):
+        await self.binary.delete(f"checkpoint:{user_id}")
+
+    async def set_checkpoint_owner(self, owner: str, ttl: int):
+        """Пульс воркера-владельца чекпоинтов"""
+        await self.redis.setex(f"checkpoint_owner:{owner}", ttl, "1")
+
+    async def checkpoint_owner_alive(self, owner: str) -> bool:
+        return await self.redis.get(f"checkpoint_owner:{owner}") is not None
+
+    async def delete_checkpoint_owner(self, owner: str):
+        await self.redis.delete(f"checkpoint_owner:{owner}")
 
     async def delete_game(self, user_id: int):
         key = f"game:{user_id}"
         await self.redis.delete(key)
 
-    async def set_leaderboard_cache(self, data: dict):
+    async def acquire_lock(self, name: str, token: str, ttl_ms: int) -> bool:
+        """Пытается взять блокировку (SET NX PX). Возвращает True при успехе."""
+        return bool(await self.redis.set(f"lock:{name}", token, px=ttl_ms, nx=True))
+
+    async def acquire_locks(self, names: List[str], token: str, ttl_ms: int) -> List[bool]:
+        """Пачка блокировок без ожидания (SET NX PX одним конвейером): взята ли каждая"""
+        if self.is_local:
+            return [await self.acquire_lock(name, token, ttl_ms) for name in names]
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for name in names:
+                pipe.set(f"lock:{name}", token, px=ttl_ms, nx=True)
+            return [bool(acquired) for acquired in await pipe.execute()]
+
+    async def release_locks(self, names: List[str], token: str):
+        if not names:
+            return
+        if self.is_local:
+            for name in names:
+                await self.release_lock(name, token)
+            return
+        await self.redis.eval(self.RELEASE_LOCKS_SCRIPT, len(names), *(f"lock:{name}" for name in names), token)
+
+    async def release_lock(self, name: str, token: str):
+        key = f"lock:{name}"
+        if isinstance(self.redis, LocalRedis):
+            if await self.redis.get(key) == token:
+                await self.redis.delete(key)
+            return
+        await self.redis.eval(self.RELEASE_LOCK_SCRIPT, 1, key, token)
+
+    async def renew_lock(self, name: str, token: str, ttl_ms: int) -> bool:
+        key = f"lock:{name}"
+        if isinstance(self.redis, LocalRedis):
+            if await self.redis.get(key) != token:
+                return False
+            return bool(await self.redis.set(key, token, px=ttl_ms))
+        return bool(await self.redis.eval(self.RENEW_LOCK_SCRIPT, 1, key, token, ttl_ms))
+
+    async def add_active_game(self, user_id: int):
+        await self.redis.sadd("games:active", user_id)
+
+    async def remove_active_game(self, user_id: int):
+        await self.redis.srem("games:active", user_id)
+
+    async def get_active_games(self) -> list:
+        return [int(user_id) for user_id in await self.redis.smembers("games:active")]
+
+    async def get_leaderboard_version(self) -> int:
+        """Версия лидерборда: растет при каждом изменении, сбрасывает кэш страниц и ETag"""
+        return int(await self.redis.get("leaderboard:version") or 0)
+
+    async def bump_leaderboard_version(self):
+        await self.redis.incr("leaderboard:version")
+
+    async def set_leaderboard_cache(self, page: str, version: int, next_cursor: str, body: str):
+        """Готовый JSON страницы лидерборда с версией, для которой он собран, и курсором следующей"""
         await self.redis.setex(
-            "leaderboard:cache",
+            f"leaderboard:cache:{page}",
             300,  # 5 минут кэша
-            json.dumps(data)
+            f"{version}:{next_cursor}:{body}"
         )
 
-    async def get_leaderboard_cache(self) -> dict:
-        data = await self.redis.get("leaderboard:cache")
-        return json.loads(data) if data else None
+    async def get_leaderboard_cache(self, page: str, version: int) -> Optional[Tuple[str, str]]:
+        """(курсор следующей страницы, JSON) или None, если страницы нет или она устарела"""
+        data = await self.redis.get(f"leaderboard:cache:{page}")
+        if not data:
+            return None
+        cached_version, next_cursor, body = data.split(":", 2)
+        return (next_cursor, body) if int(cached_version) == version else None
+
+    async def publish_principal_invalidation(self, user_ids: List[int]):
+        await self.redis.publish(self.PRINCIPAL_CHANNEL, ",".join(map(str, user_ids)))
+
+    async def principal_invalidations(self):
+        """id пользователей из канала сброса кэша аутентификации (до отмены или обрыва соединения)"""
+        pubsub = self.redis.pubsub()
+        await pubsub.subscribe(self.PRINCIPAL_CHANNEL)
+        try:
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    yield [int(user_id) for user_id in message["data"].split(",")]
+        finally:
+            await pubsub.reset()
+
+    async def set_user_stats(self, user_id: int, body: str):
+        """Готовый JSON /my-stats; короткий TTL - страховка, основной сброс при записи результатов"""
+        await self.redis.setex(f"stats:{user_id}", settings.USER_STATS_CACHE_TTL, body)
+
+    async def get_user_stats(self, user_id: int) -> Optional[str]:
+        return await self.redis.get(f"stats:{user_id}")
+
+    async def delete_user_stats(self, *user_ids: int):
+        if user_ids:
+            await self.redis.delete(*(f"stats:{user_id}" for user_id in user_ids))
 
 
 # Создаем глобальный экземпляр
-redis_client = RedisClient()
\ No newline at end of file
+redis_client = RedisClient()
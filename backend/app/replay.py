@@ -0,0 +1,126 @@
+"""
+Повтор игр по зерну и журналу действий.
+
+Игра детерминирована: вся случайность идет из генератора с зерном игры, а
+серверный планировщик записывает каждый шаг симуляции в журнал вместе с
+действиями игрока. Повтор заново создает игру с тем же зерном и применяет журнал
+без сети и без ожидания (шаги выполняются подряд с максимальной скоростью).
+
+Применение:
+- проверка присланных результатов (verify сравнивает заявленный и пересчитанный результат);
+- повтор реальных игр как входных данных для регрессий производительности;
+- пакетные античит-проверки.
+
+Записи повторов сохраняются при завершении игры в REPLAY_DIR (если задан).
+Запуск из каталога backend:
+    python -m app.replay replays/*.json [--engine numpy]
+"""
+import argparse
+import json
+import os
+import time
+from typing import Dict, Optional
+
+from .config import settings
+from .game_logic import PokemonGameLogic
+
+# Поля результата, которые должны совпасть при повторе (длительность зависит от настенных часов)
+VERIFIED_FIELDS = (
+    "victory", "score", "poke_coins_earned", "waves_completed", "pokemons_caught", "enemies_defeated",
+)
+
+
+def replay(record: Dict, engine: Optional[str] = None) -> PokemonGameLogic:
+    """Пересимулирует игру из записи get_replay(); engine позволяет повторить на другом движке"""
+    if record.get("seed") is None or record.get("log") is None:
+        raise ValueError("Game has no seed or action log and can't be replayed")
+
+    game = PokemonGameLogic(record["user_id"], engine=engine or record["engine"], seed=record["seed"])
+    game.action_log = None  # повтор не ведет собственный журнал
+
+    for entry in record["log"]:
+        action = entry[1]
+        if action == "step":
+            delta_time, count = entry[2], entry[3]
+            for _ in range(count):
+                game.step(delta_time)
+        elif action == "open_pokeball":
+            game.open_pokeball()
+        elif action == "play_card":
+            game.play_card(entry[2], entry[3])
+        else:
+            raise ValueError(f"Unknown replay action: {action}")
+
+    return game
+
+
+def verify(record: Dict, engine: Optional[str] = None) -> Dict:
+    """Повторяет игру и сравнивает результат с заявленным в записи"""
+    started = time.perf_counter()
+    game = replay(record, engine)
+    elapsed = time.perf_counter() - started
+
+    replayed = game.get_game_result()
+    claimed = record["result"]
+    mismatches = {
+        field: {"claimed": claimed.get(field), "replayed": replayed[field]}
+        for field in VERIFIED_FIELDS
+        if claimed.get(field) != replayed[field]
+    }
+    steps = sum(entry[3] for entry in record["log"] if entry[1] == "step")
+    return {
+        "valid": not mismatches,
+        "mismatches": mismatches,
+        "steps": steps,
+        "replay_ms": round(elapsed * 1000, 3),
+    }
+
+
+def save_replay(record: Dict, session_id: int) -> Optional[str]:
+    """Сохраняет запись повтора в REPLAY_DIR/<session_id>.json"""
+    if not settings.REPLAY_DIR:
+        return None
+    os.makedirs(settings.REPLAY_DIR, exist_ok=True)
+    path = os.path.join(settings.REPLAY_DIR, f"{session_id}.json")
+    with open(path, "w") as file:
+        json.dump(record, file)
+    return path
+
+
+def load_replay(path: str) -> Dict:
+    with open(path) as file:
+        return json.load(file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay and verify recorded games")
+    parser.add_argument("paths", nargs="+", help="replay files (REPLAY_DIR/<session_id>.json)")
+    parser.add_argument("--engine", choices=("python", "numpy"), help="replay on another combat engine")
+    args = parser.parse_args()
+
+    invalid = 0
+    total_steps = 0
+    total_ms = 0.0
+    for path in args.paths:
+        try:
+            report = verify(load_replay(path), args.engine)
+        except (ValueError, KeyError, OSError) as e:
+            invalid += 1
+            print(f"❌ {path}: {e}")
+            continue
+
+        total_steps += report["steps"]
+        total_ms += report["replay_ms"]
+        if report["valid"]:
+            print(f"✅ {path}: {report['steps']} steps in {report['replay_ms']} ms")
+        else:
+            invalid += 1
+            print(f"❌ {path}: result mismatch {report['mismatches']}")
+
+    if total_ms:
+        print(f"Replayed {total_steps} steps in {total_ms:.1f} ms ({total_steps / total_ms * 1000:.0f} steps/s)")
+    raise SystemExit(1 if invalid else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+Очередь отложенной записи результатов игр (write-behind).
+
+/game/end не ждет своего commit: результат кладется в очередь воркера, а фоновая
+задача сохраняет накопленное пакетом (crud.create_game_sessions) - когда набралось
+RESULT_QUEUE_BATCH_SIZE записей или прошло RESULT_QUEUE_FLUSH_INTERVAL секунд.
+На пике, когда много игр заканчивается одновременно, это одна транзакция на
+пакет вместо транзакции на каждую игру.
+
+    await result_queue.put(user_id, result)                      # вернуться сразу
+    session_id = await result_queue.put(user_id, result, wait=True)  # дождаться записи
+
+Если пакет не записался, его строки пишутся по одной, чтобы одна плохая строка не мешала остальным.
+Записи, которые не удалось сохранить за RESULT_QUEUE_MAX_ATTEMPTS попыток, и все,
+что осталось в очереди при остановке без доступной БД, дописываются в файл
+RESULT_QUEUE_SPILL_FILE (JSON-строки) и загружаются обратно при следующем старте.
+"""
+import asyncio
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from . import crud, schemas
+from .config import settings
+from .database import AsyncSessionLocal
+from .replay import save_replay
+
+
+class PendingResult:
+    __slots__ = ("user_id", "result", "replay", "future", "attempts")
+
+    def __init__(self, user_id: int, result: schemas.GameResult, replay: Optional[Dict] = None,
+                 future: Optional[asyncio.Future] = None, attempts: int = 0):
+        self.user_id = user_id
+        self.result = result
+        self.replay = replay
+        self.future = future
+        self.attempts = attempts
+
+    def to_json(self) -> str:
+        return json.dumps({"user_id": self.user_id, "result": self.result.model_dump(), "replay": self.replay,
+                           "attempts": self.attempts})
+
+    @classmethod
+    def from_json(cls, line: str) -> "PendingResult":
+        data = json.loads(line)
+        return cls(data["user_id"], schemas.GameResult(**data["result"]), data.get("replay"),
+                   attempts=data.get("attempts", 0))
+
+    def fail(self, error: Exception):
+        """Результат не будет записан - ожидающий put(wait=True) получает ошибку"""
+        if self.future is not None and not self.future.done():
+            self.future.set_exception(error)
+
+
+class ResultWriteQueue:
+    def __init__(self, batch_size: int, flush_interval: float, max_attempts: int, spill_file: Optional[str]):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.spill_file = spill_file
+        self._pending: List[PendingResult] = []
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        # Метрики
+        self.enqueued = 0
+        self.saved = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.failed_results = 0  # неудачные записи отдельных результатов после разбора пакета
+        self.spilled = 0
+        self.last_batch_size = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            # Примитивы asyncio привязываются к event loop - создаем их в текущем
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._restore_spilled()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Останавливает фоновую задачу и сохраняет остаток очереди (или сбрасывает его в файл)"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        try:
+            await self.flush_all()
+        except Exception as e:
+            print(f"❌ Failed to flush game results on shutdown: {e}")
+            pending, self._pending = self._pending, []
+            self._spill(pending, e)
+
+    async def put(self, user_id: int, result: schemas.GameResult, replay: Optional[Dict] = None,
+                  wait: bool = False) -> Optional[int]:
+        """Ставит результат в очередь; при wait=True дожидается записи и возвращает id сессии"""
+        future = asyncio.get_running_loop().create_future() if wait else None
+        self._pending.append(PendingResult(user_id, result, replay, future))
+        self.enqueued += 1
+
+        if wait or len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        if not self.running:
+            # Без фоновой задачи (скрипты, тесты) пишем сразу
+            await self.flush_all()
+        if future is not None:
+            return await future
+        return None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush_all()
+            except Exception as e:
+                print(f"❌ Game results flush failed: {e}")
+
+    async def flush_all(self):
+        while self._pending:
+            await self.flush()
+
+    async def flush(self):
+        """
+        Сохраняет один пакет из начала очереди. Если пакет не записался, его строки пишутся
+        по одной: повтор (и в итоге файл) достается только строкам, которые не записываются сами.
+        """
+        async with self._flush_lock:
+            batch = self._pending[:self.batch_size]
+            if not batch:
+                return
+            del self._pending[:len(batch)]
+
+            started = time.perf_counter()
+            failed: List[Tuple[PendingResult, Exception]] = []
+            try:
+                saved = list(zip(batch, await self._save(batch)))
+            except Exception as e:
+                self.failed_batches += 1
+                if len(batch) == 1:
+                    saved, failed = [], [(batch[0], e)]
+                else:
+                    saved, failed = await self._save_each(batch)
+            self._requeue(failed)
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.saved += len(saved)
+            self.batches += 1
+            self.last_batch_size = len(batch)
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+
+        for item, session_id in saved:
+            if item.replay is not None:
+                try:
+                    save_replay(item.replay, session_id)
+                except OSError as e:
+                    # Запись повтора не должна мешать сохранению результата
+                    print(f"⚠️ Failed to save replay for session {session_id}: {e}")
+            if item.future is not None and not item.future.done():
+                item.future.set_result(session_id)
+
+        if failed:
+            # Повтор - на следующем проходе фоновой задачи, а не сразу
+            raise failed[-1][1]
+
+    async def _save(self, items: List[PendingResult]) -> List[int]:
+        async with AsyncSessionLocal() as db:
+            return await crud.create_game_sessions(db, [(item.user_id, item.result) for item in items])
+
+    async def _save_each(self, batch: List[PendingResult]):
+        """Строки пакета по одной транзакции: [(запись, id сессии)], [(запись, ошибка)]"""
+        saved, failed = [], []
+        for item in batch:
+            try:
+                saved.append((item, (await self._save([item]))[0]))
+            except Exception as e:
+                failed.append((item, e))
+        if saved:
+            print(f"⚠️ Game results batch failed, {len(failed)} of {len(batch)} results isolated")
+        return saved, failed
+
+    def _requeue(self, failed: List[Tuple[PendingResult, Exception]]):
+        """После неудачной записи: повтор в начале очереди или, после max_attempts попыток, файл"""
+        retry, spill = [], []
+        for item, error in failed:
+            item.attempts += 1
+            self.failed_results += 1
+            if item.attempts < self.max_attempts:
+                retry.append(item)
+            else:
+                item.fail(error)
+                spill.append(item)
+        self._pending[:0] = retry
+        if spill:
+            self._spill(spill, failed[-1][1])
+
+    def _spill(self, items: List[PendingResult], error: Exception):
+        if not items:
+            return
+        # Ожидающие записи получают ошибку: в этом процессе результат уже не сохранится
+        for item in items:
+            item.fail(error)
+        if not self.spill_file:
+            print(f"❌ Lost {len(items)} game results (RESULT_QUEUE_SPILL_FILE is not set)")
+            return
+        try:
+            with open(self.spill_file, "a") as file:
+                for item in items:
+                    file.write(item.to_json() + "\n")
+        except OSError as e:
+            print(f"❌ Lost {len(items)} game results, failed to write {self.spill_file}: {e}")
+            return
+        self.spilled += len(items)
+        print(f"⚠️ {len(items)} game results saved to {self.spill_file}, they will be retried on next start")
+
+    def _restore_spilled(self):
+        if not self.spill_file:
+            return
+        # Переименование забирает файл целиком: при нескольких воркерах его прочитает только один
+        claimed = f"{self.spill_file}.{os.getpid()}"
+        try:
+            os.replace(self.spill_file, claimed)
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            print(f"⚠️ Failed to claim {self.spill_file}: {e}")
+            return
+
+        # Число попыток сохраняется в файле: результат, исчерпавший их, после старта
+        # пробуется один раз (отдельно от пакета, если пакет не записался) и снова уходит в файл
+        with open(claimed) as file:
+            restored = [PendingResult.from_json(line) for line in file if line.strip()]
+        self._pending[:0] = restored
+        os.remove(claimed)
+        print(f"✓ Restored {len(restored)} game results from {self.spill_file}")
+
+    @property
+    def metrics(self) -> Dict:
+        return {
+            "running": self.running,
+            "pending": len(self._pending),
+            "enqueued": self.enqueued,
+            "saved": self.saved,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "failed_results": self.failed_results,
+            "spilled": self.spilled,
+            "last_batch_size": self.last_batch_size,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "max_flush_ms": round(self.max_flush_ms, 3),
+        }
+
+
+# Глобальная очередь воркера
+result_queue = ResultWriteQueue(
+    settings.RESULT_QUEUE_BATCH_SIZE,
+    settings.RESULT_QUEUE_FLUSH_INTERVAL,
+    settings.RESULT_QUEUE_MAX_ATTEMPTS,
+    settings.RESULT_QUEUE_SPILL_FILE,
+)
@@ -0,0 +1,47 @@
+"""
+Генератор случайных чисел отдельной игры.
+
+У каждой игры свой генератор с известным зерном, поэтому игру можно повторить
+по зерну и журналу действий (см. replay.py), а сессии воркера не делят общий
+глобальный random.
+
+Базовый генератор - splitmix64: все состояние - одно 64-битное число, его дешево
+сохранять в хранилище сессий на каждом тике (состояние Mersenne Twister - 625 чисел).
+choice / sample / randint работают через getrandbits, как у random.Random.
+"""
+import random
+import secrets
+
+_MASK = (1 << 64) - 1
+
+
+def new_seed() -> int:
+    return secrets.randbits(63)
+
+
+class GameRandom(random.Random):
+    def seed(self, a=None, version=2):
+        self.state = (new_seed() if a is None else int(a)) & _MASK
+
+    def getstate(self) -> int:
+        return self.state
+
+    def setstate(self, state: int):
+        self.state = state
+
+    def _next(self) -> int:
+        self.state = z = (self.state + 0x9E3779B97F4A7C15) & _MASK
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK
+        return z ^ (z >> 31)
+
+    def random(self) -> float:
+        return (self._next() >> 11) * (1.0 / (1 << 53))
+
+    def getrandbits(self, k: int) -> int:
+        if k <= 64:
+            return self._next() >> (64 - k)
+        result = 0
+        for shift in range(0, k, 64):
+            result |= self._next() << shift
+        return result & ((1 << k) - 1)
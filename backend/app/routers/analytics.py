@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Импорты из текущего пакета
+from .. import crud, schemas
+from ..analytics import COUNTERS, as_utc, bucket_start, bucket_step
+from ..auth import get_current_user
+from ..database import get_db
+
+router = APIRouter(prefix="/api/v1/analytics", tags=["analytics"])
+
+# Период по умолчанию и максимум интервалов в одном ответе
+DEFAULT_SPAN = {"hour": timedelta(hours=48), "day": timedelta(days=30)}
+MAX_BUCKETS = 1000
+
+
+def summarize(start: datetime, counters: Dict) -> schemas.AnalyticsBucket:
+    games = counters["games"]
+    return schemas.AnalyticsBucket(
+        bucket_start=start,
+        games=games,
+        wins=counters["wins"],
+        win_rate=round(counters["wins"] / games * 100, 2) if games else 0.0,
+        average_score=round(counters["total_score"] / games, 2) if games else 0.0,
+        average_waves=round(counters["total_waves"] / games, 2) if games else 0.0,
+        average_duration=round(counters["total_duration"] / games, 2) if games else 0.0,
+        coins_minted=counters["coins_minted"]
+    )
+
+
+@router.get("/games", response_model=schemas.AnalyticsResponse)
+async def get_game_analytics(
+        bucket: str = Query("day", pattern="^(hour|day)$"),
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        current_user: schemas.UserResponse = Depends(get_current_user),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Игры, победы, средние волны/счет и выпущенные монеты по часам или суткам.
+    Читает только агрегаты game_rollups (отстают от игр на интервал фоновой задачи);
+    интервалы без игр возвращаются с нулями.
+    """
+    step = bucket_step(bucket)
+    end = bucket_start(end or datetime.now(timezone.utc), bucket) + step
+    start = bucket_start(start, bucket) if start else end - DEFAULT_SPAN[bucket]
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if (end - start) / step > MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Too many buckets (max {MAX_BUCKETS})")
+
+    rollups = {as_utc(row.bucket_start): row for row in await crud.get_game_rollups(db, bucket, start, end)}
+
+    buckets = []
+    total = dict.fromkeys(COUNTERS, 0)
+    current = start
+    while current < end:
+        row = rollups.get(current)
+        counters = {name: getattr(row, name) for name in COUNTERS} if row else dict.fromkeys(COUNTERS, 0)
+        for name in COUNTERS:
+            total[name] += counters[name]
+        buckets.append(summarize(current, counters))
+        current += step
+
+    return schemas.AnalyticsResponse(
+        bucket=bucket,
+        start=start,
+        end=end,
+        buckets=buckets,
+        total=summarize(start, total)
+    )
@@ -1,51 +1,62 @@
 from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # Импорты из родительского пакета
 from ..schemas import UserCreate, UserResponse, Token
 from .. import crud, auth
 from ..config import settings
 from ..database import get_db
+from ..password_pool import password_pool
+from ..principal_cache import principal_cache
 
 router = APIRouter(prefix="/api/v1/auth", tags=["authentication"])
 
 
 @router.post("/register", response_model=UserResponse)
-def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
     # Проверка существования пользователя
-    db_user = crud.get_user_by_username(db, username=user.username)
+    db_user = await crud.get_user_by_username(db, username=user.username)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already registered"
         )
 
-    db_user = crud.get_user_by_email(db, email=user.email)
+    db_user = await crud.get_user_by_email(db, email=user.email)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
 
-    # Создание пользователя
-    return crud.create_user(db=db, user=user)
+    # Создание пользователя (bcrypt считается в отдельном пуле, см. password_pool)
+    hashed_password = await password_pool.hash(user.password)
+    return await crud.create_user(db=db, user=user, hashed_password=hashed_password)
 
 
 @router.post("/login", response_model=Token)
-def login(
+async def login(
         form_data: OAuth2PasswordRequestForm = Depends(),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
-    user = crud.get_user_by_username(db, username=form_data.username)
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+    user = await crud.get_user_by_username(db, username=form_data.username)
+    if not user or not await password_pool.verify(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    # BCRYPT_ROUNDS изменили - пересчитываем хеш, пока пароль известен
+    if auth.password_needs_rehash(user.hashed_password):
+        user.hashed_password = await password_pool.hash(form_data.password)
+        await db.commit()
+
+    # Первые запросы после входа не пойдут в БД за пользователем
+    principal_cache.put(user)
+
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth.create_access_token(
         data={"sub": user.username}, expires_delta=access_token_expires
@@ -1,54 +1,69 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from .. import schemas, crud, game_logic
-from ..auth import get_current_user
-from ..database import get_db
+import asyncio
+import json
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect, status
+from pydantic import ValidationError
+from .. import schemas, game_logic
+from ..auth import get_current_active_user, get_principal_from_token
+from ..config import settings
+from ..result_queue import result_queue
+from ..session_store import session_store, SessionLockTimeout
+from ..state_delta import StateDeltaEncoder
+from ..state_frame import FRAME_MEDIA_TYPE, accepts_frame, encode_frame, frame_schema
+from ..state_json import GameStateResponse, client_state, dumps
 
 router = APIRouter(prefix="/api/v1/game", tags=["game"])
 
-# ⭐ ВАЖНО: храним активные игры в памяти
-active_games = {}
+
+async def load_game(user_id: int) -> game_logic.PokemonGameLogic:
+    """Загрузка активной игры из хранилища сессий (вызывать под session_store.lock)"""
+    game = await session_store.get(user_id)
+    if game is None:
+        raise HTTPException(status_code=404, detail="Game not found")
+    return game
 
 
 @router.post("/start")
-def start_game(
-        current_user: schemas.UserResponse = Depends(get_current_user),
-        db: Session = Depends(get_db)
+async def start_game(
+        current_user: schemas.UserResponse = Depends(get_current_active_user)
 ):
     """Начало новой игры"""
-    # Завершаем старую игру, если есть
-    if current_user.id in active_games:
-        try:
-            # Сохраняем результат старой игры
-            game = active_games[current_user.id]
-            result = game.get_game_result()
-            game_result = schemas.GameResult(**result)
-            crud.create_game_session(db, game_result, current_user.id)
-            del active_games[current_user.id]
-        except Exception as e:
-            print(f"⚠️ Error ending previous game: {e}")
-
-    # Создаем новую игру
-    game = game_logic.PokemonGameLogic(current_user.id)
-    active_games[current_user.id] = game
-
-    # Сразу обновляем состояние, чтобы появились враги
-    game.update(0)
+    async with session_store.lock(current_user.id):
+        # Завершаем старую игру, если есть
+        old_game = await session_store.get(current_user.id)
+        if old_game is not None:
+            try:
+                # Сохраняем результат старой игры
+                result = old_game.get_game_result()
+                game_result = schemas.GameResult(**result)
+                await result_queue.put(current_user.id, game_result, old_game.get_replay())
+            except Exception as e:
+                print(f"⚠️ Error ending previous game: {e}")
+
+        # Создаем новую игру
+        game = game_logic.PokemonGameLogic(current_user.id)
+
+        await session_store.save(current_user.id, game)
 
     return {"message": "Game started", "game_id": current_user.id}
 
 
 @router.post("/action")
-def game_action(
+async def game_action(
         action: schemas.GameAction,
-        current_user: schemas.UserResponse = Depends(get_current_user)
+        current_user: schemas.UserResponse = Depends(get_current_active_user)
 ):
     """Выполнение действия в игре"""
-    if current_user.id not in active_games:
-        raise HTTPException(status_code=404, detail="Game not found")
+    async with session_store.lock(current_user.id):
+        game = await load_game(current_user.id)
+        result = apply_action(game, action)
+        await session_store.save(current_user.id, game)
+
+    return result
 
-    game = active_games[current_user.id]
 
+def apply_action(game: game_logic.PokemonGameLogic, action: schemas.GameAction) -> dict:
+    """Применение игрового действия к игре"""
     # ⭐ ВАЖНО: проверяем, не закончилась ли игра
     if game.game_over:
         return {"error": "Game is already over"}
@@ -66,74 +81,180 @@ def game_action(
     else:
         raise HTTPException(status_code=400, detail="Unknown action type")
 
-    # Обновляем состояние игры после действия
-    game.update(0.1)
-
     return result
 
 
-@router.get("/state")
-def get_game_state(
-        current_user: schemas.UserResponse = Depends(get_current_user)
+@router.get("/state", response_class=GameStateResponse)
+async def get_game_state(
+        request: Request,
+        current_user: schemas.UserResponse = Depends(get_current_active_user)
 ):
-    """Получение текущего состояния игры"""
-    if current_user.id not in active_games:
-        raise HTTPException(status_code=404, detail="Game not found")
-
-    game = active_games[current_user.id]
+    """
+    Получение текущего состояния игры (симуляцию продвигает планировщик).
+    С Accept: application/x-poketd-frame - двоичный кадр (см. state_frame), иначе JSON.
+    """
+    binary = accepts_frame(request.headers.get("accept"))
+    async with session_store.lock(current_user.id):
+        game = await load_game(current_user.id)
+        if binary:
+            return Response(encode_frame(game), media_type=FRAME_MEDIA_TYPE, headers={"Vary": "Accept"})
+        return GameStateResponse(client_state(game), headers={"Vary": "Accept"})
 
-    # Обновляем состояние игры перед возвратом
-    state = game.update(0.1)  # небольшое обновление
 
-    return state
+@router.get("/state/schema")
+async def get_state_schema():
+    """Схема двоичного кадра состояния: клиент запрашивает ее один раз"""
+    return frame_schema()
 
 
-@router.post("/update")
-def update_game(
-        delta_time: float = 0.016,  # 60 FPS по умолчанию
-        current_user: schemas.UserResponse = Depends(get_current_user)
+@router.post("/update", response_class=GameStateResponse)
+async def update_game(
+        request: Request,
+        delta_time: float = 0.016,
+        current_user: schemas.UserResponse = Depends(get_current_active_user)
 ):
-    """Обновление игрового состояния (для автоматических обновлений)"""
-    if current_user.id not in active_games:
-        raise HTTPException(status_code=404, detail="Game not found")
-
-    game = active_games[current_user.id]
-    state = game.update(delta_time)
-
-    return state
+    """
+    Устаревший эндпоинт: время игры теперь идет только на сервере.
+    delta_time игнорируется, возвращается текущее состояние.
+    """
+    return await get_game_state(request, current_user)
 
 
 @router.post("/end")
-def end_game(
-        current_user: schemas.UserResponse = Depends(get_current_user),
-        db: Session = Depends(get_db)
+async def end_game(
+        wait: bool = Query(False, description="дождаться записи в БД и вернуть session_id"),
+        current_user: schemas.UserResponse = Depends(get_current_active_user)
 ):
     """Завершение игры и сохранение результата"""
-    if current_user.id not in active_games:
-        raise HTTPException(status_code=404, detail="Game not found")
+    async with session_store.lock(current_user.id):
+        game = await load_game(current_user.id)
+        return await finish_game(game, current_user.id, wait)
+
 
+async def finish_game(game: game_logic.PokemonGameLogic, user_id: int, wait: bool = False) -> dict:
+    """
+    Сохранение результата игры и удаление ее из хранилища (под блокировкой сессии).
+    Результат пишется в БД пакетом через result_queue; с wait=True ответ ждет записи
+    и содержит session_id, иначе session_id = None.
+    """
     try:
-        game = active_games[current_user.id]
         result = game.get_game_result()
 
         # ⭐ ВАЖНО: ВСЕГДА сохраняем результат
         game_result = schemas.GameResult(**result)
-        saved_session = crud.create_game_session(db, game_result, current_user.id)
+        session_id = await result_queue.put(user_id, game_result, game.get_replay(), wait=wait)
 
-        print(f"🎮 Game ended for user {current_user.id}. Coins earned: {result['poke_coins_earned']}")
+        print(f"🎮 Game ended for user {user_id}. Coins earned: {result['poke_coins_earned']}")
 
         # Удаляем игру из активных
-        del active_games[current_user.id]
+        await session_store.delete(user_id)
 
         return {
             **result,
-            "session_id": saved_session.id,
-            "message": "Game saved successfully"
+            "session_id": session_id,
+            "message": "Game saved successfully" if wait else "Game result queued"
         }
 
     except Exception as e:
         print(f"❌ Error saving game result: {e}")
-        # ⭐ ВАЖНО: даже при ошибке удаляем игру из памяти
-        if current_user.id in active_games:
-            del active_games[current_user.id]
-        raise HTTPException(status_code=500, detail=f"Failed to save game result: {str(e)}")
\ No newline at end of file
+        # ⭐ ВАЖНО: даже при ошибке удаляем игру из хранилища
+        await session_store.delete(user_id)
+        raise HTTPException(status_code=500, detail=f"Failed to save game result: {str(e)}")
+
+
+@router.websocket("/ws")
+async def game_websocket(
+        websocket: WebSocket,
+        token: str = Query(...),
+        frame_format: str = Query("json", alias="format", pattern="^(json|frame)$")
+):
+    """
+    WebSocket-канал игры: аутентификация один раз при подключении,
+    действия приходят сообщениями, состояние уходит дельта-кадрами (см. state_delta),
+    а с format=frame - двоичными кадрами state_frame (схема - GET /game/state/schema).
+
+    Клиент -> сервер:
+        {"action_type": "open_pokeball" | "play_card", "data": {...}, "request_id": 1}
+        {"type": "keyframe"} - запросить полный кадр
+    Сервер -> клиент:
+        {"type": "keyframe" | "delta", ...} или двоичный кадр (format=frame)
+        {"type": "action_result", "request_id": 1, "result": {...}} или {..., "error": "..."}
+        {"type": "error", "detail": "..."}
+    """
+    user = await get_principal_from_token(token)
+    if user is None or not user.is_active:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    user_id = user.id
+    await websocket.accept()
+
+    encoder = StateDeltaEncoder(settings.WS_KEYFRAME_INTERVAL) if frame_format == "json" else None
+    pusher = asyncio.create_task(push_game_frames(websocket, user_id, encoder))
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+            except ValueError:
+                await websocket.send_json({"type": "error", "detail": "Invalid JSON"})
+                continue
+            if not isinstance(message, dict):
+                await websocket.send_json({"type": "error", "detail": "Message must be a JSON object"})
+                continue
+
+            if message.get("type") == "keyframe":
+                # Двоичные кадры и так полные
+                if encoder is not None:
+                    encoder.reset()
+                continue
+
+            await websocket.send_json(await handle_ws_action(user_id, message))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        pusher.cancel()
+
+
+async def handle_ws_action(user_id: int, message: dict) -> dict:
+    reply = {"type": "action_result", "request_id": message.get("request_id")}
+    try:
+        action = schemas.GameAction(action_type=message.get("action_type"), data=message.get("data"))
+        async with session_store.lock(user_id):
+            game = await load_game(user_id)
+            reply["result"] = apply_action(game, action)
+            await session_store.save(user_id, game)
+    except HTTPException as e:
+        reply["error"] = e.detail
+    except (ValidationError, SessionLockTimeout) as e:
+        reply["error"] = str(e)
+    return reply
+
+
+async def push_game_frames(websocket: WebSocket, user_id: int, encoder: Optional[StateDeltaEncoder]):
+    """Периодическая отправка кадров состояния с частотой WS_PUSH_RATE (без encoder - двоичные кадры)"""
+    interval = 1.0 / settings.WS_PUSH_RATE
+    game_missing = False
+    try:
+        while True:
+            # Без блокировки: шаг симуляции синхронный, поэтому состояние всегда согласовано.
+            # Открытая вкладка без действий игрока не продлевает жизнь игры и не восстанавливает
+            # ее из чекпоинта - это делает первый запрос игрока (GET /game/state при загрузке)
+            game = await session_store.get(user_id, touch=False)
+            if game is None:
+                if not game_missing:
+                    game_missing = True
+                    if encoder is not None:
+                        encoder.reset()
+                    await websocket.send_json({"type": "error", "detail": "Game not found"})
+            else:
+                game_missing = False
+                if encoder is None:
+                    await websocket.send_bytes(encode_frame(game))
+                else:
+                    frame = encoder.encode(client_state(game))
+                    if frame is not None:
+                        await websocket.send_text(dumps(frame).decode("utf-8"))
+            await asyncio.sleep(interval)
+    except (WebSocketDisconnect, RuntimeError):
+        # Клиент отключился во время отправки
+        pass
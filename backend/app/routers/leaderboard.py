@@ -1,42 +1,172 @@
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+import hashlib
+import json
+import math
+from typing import Dict, List, Optional, Tuple
 
 # Импорты из текущего пакета
 from .. import schemas, crud
 from ..auth import get_current_user
 from ..database import get_db
+from ..leaderboard import leaderboard_index
+from ..redis_client import redis_client
 
 router = APIRouter(prefix="/api/v1/leaderboard", tags=["leaderboard"])
 
 
+# Размер страницы, по которому around-me считает current_page
+PAGE_SIZE = 50
+MAX_LIMIT = 1000
+# skip - только для верхних страниц, глубже - по курсору (OFFSET стоит O(skip))
+MAX_SKIP = 1000
+# Страницы публичного лидерборда в пределах первых HOT_RANKS мест кэшируются готовым JSON
+HOT_RANKS = 1000
+
+
+def encode_cursor(high_score: int, user_id: int, rank: int) -> str:
+    """Курсор - последняя строка страницы: (high_score, user_id) для keyset и ее место"""
+    return f"{high_score}-{user_id}-{rank}"
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int, int]:
+    try:
+        high_score, user_id, rank = map(int, cursor.split("-"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if rank < 1:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return high_score, user_id, rank
+
+
+async def build_entries(db: AsyncSession, ranked: List[Tuple[int, int]], first_rank: int) -> List[Dict]:
+    """Записи лидерборда для [(user_id, score)] из индекса: имена и волны - из SQL одним запросом"""
+    players = await crud.get_leaderboard_players(db, [user_id for user_id, _ in ranked])
+
+    result = []
+    for rank, (user_id, score) in enumerate(ranked, start=first_rank):
+        player = players.get(user_id)
+        if player is None:
+            continue
+        result.append({
+            "username": player.username,
+            "high_score": score,
+            "total_waves": player.total_waves,
+            "rank": rank
+        })
+    return result
+
+
+async def load_page(db: AsyncSession, skip: int, limit: int, cursor: Optional[str]) -> Tuple[List[Dict], str]:
+    """Записи страницы и курсор следующей ("" - страница последняя)"""
+    if cursor:
+        # Keyset: строки после курсора; места считаются от места последней строки прошлой страницы
+        high_score, user_id, last_rank = decode_cursor(cursor)
+        rows = await crud.get_leaderboard_after(db, high_score, user_id, limit)
+        entries = [
+            {
+                "username": row.username,
+                "high_score": row.high_score,
+                "total_waves": row.total_waves,
+                "rank": last_rank + 1 + i
+            }
+            for i, row in enumerate(rows)
+        ]
+        last = (rows[-1].high_score, rows[-1].user_id, last_rank + len(rows)) if rows else None
+        count = len(rows)
+    else:
+        ranked = await leaderboard_index.top(skip, limit)
+        entries = await build_entries(db, ranked, skip + 1)
+        last = (ranked[-1][1], ranked[-1][0], skip + len(ranked)) if ranked else None
+        count = len(ranked)
+
+    next_cursor = encode_cursor(*last) if last and count == limit else ""
+    return entries, next_cursor
+
+
 @router.get("/", response_model=List[schemas.LeaderboardEntry])
-def get_leaderboard(
-        skip: int = Query(0, ge=0),
-        limit: int = Query(100, ge=1, le=1000),
-        db: Session = Depends(get_db)
+async def get_leaderboard(
+        request: Request,
+        skip: int = Query(0, ge=0, le=MAX_SKIP),
+        limit: int = Query(100, ge=1, le=MAX_LIMIT),
+        cursor: Optional[str] = Query(None, description="значение X-Next-Cursor предыдущей страницы"),
+        db: AsyncSession = Depends(get_db)
 ):
-    """Получение лидерборда"""
-    leaderboard = crud.get_leaderboard(db, skip=skip, limit=limit)
+    """
+    Получение лидерборда.
+    Следующая страница - по курсору из заголовка X-Next-Cursor (keyset, без OFFSET):
+    в курсоре и последняя строка, и ее место, поэтому глубина страницы не влияет на стоимость.
+    skip - не больше MAX_SKIP.
+    Верхние страницы отдаются из кэша готовым JSON. ETag - хэш тела ответа, поэтому он совпадает на любом воркере.
+    """
+    page = f"c{cursor}:{limit}" if cursor else f"{skip}:{limit}"
+    hot = cursor is None and skip + limit <= HOT_RANKS
+    version = await redis_client.get_leaderboard_version() if hot else 0
+    cached = await redis_client.get_leaderboard_cache(page, version) if hot else None
+    if cached is not None:
+        next_cursor, body = cached
+    else:
+        entries, next_cursor = await load_page(db, skip, limit, cursor)
+        body = json.dumps(entries)
+        if hot:
+            await redis_client.set_leaderboard_cache(page, version, next_cursor, body)
 
-    # Добавляем ранги
-    result = []
-    for i, entry in enumerate(leaderboard, start=skip + 1):
-        entry_data = {
-            "username": entry.username,
-            "high_score": entry.high_score,
-            "total_waves": entry.total_waves,
-            "rank": i
-        }
-        result.append(schemas.LeaderboardEntry(**entry_data))
+    etag = '"' + hashlib.md5(f"{next_cursor}\n{body}".encode("utf-8")).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return Response(content=body, media_type="application/json", headers=headers)
 
-    return result
+
+@router.get("/page", response_model=schemas.LeaderboardResponse)
+async def get_leaderboard_page(
+        page: int = Query(1, ge=1),
+        page_size: int = Query(PAGE_SIZE, ge=1, le=200),
+        current_user: schemas.UserResponse = Depends(get_current_user),
+        db: AsyncSession = Depends(get_db)
+):
+    """Страница лидерборда с местом текущего пользователя"""
+    offset = (page - 1) * page_size
+    ranked = await leaderboard_index.top(offset, page_size)
+    total = await leaderboard_index.total()
+    return schemas.LeaderboardResponse(
+        entries=await build_entries(db, ranked, offset + 1),
+        user_rank=await leaderboard_index.rank(current_user.id),
+        total_pages=max(1, math.ceil(total / page_size)),
+        current_page=page
+    )
+
+
+@router.get("/around-me", response_model=schemas.LeaderboardResponse)
+async def get_players_around_me(
+        radius: int = Query(5, ge=0, le=50),
+        current_user: schemas.UserResponse = Depends(get_current_user),
+        db: AsyncSession = Depends(get_db)
+):
+    """Игроки выше и ниже текущего пользователя; current_page - его страница при PAGE_SIZE"""
+    rank, first_rank, ranked = await leaderboard_index.around(current_user.id, radius)
+    total = await leaderboard_index.total()
+    return schemas.LeaderboardResponse(
+        entries=await build_entries(db, ranked, first_rank),
+        user_rank=rank,
+        total_pages=max(1, math.ceil(total / PAGE_SIZE)),
+        current_page=(rank - 1) // PAGE_SIZE + 1 if rank else 1
+    )
 
 
 @router.get("/my-stats")
-def get_my_stats(
+async def get_my_stats(
         current_user: schemas.UserResponse = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
-    """Получение статистики текущего пользователя"""
-    return crud.get_user_stats(db, current_user.id)
\ No newline at end of file
+    """Получение статистики текущего пользователя (user_stats, кэш на USER_STATS_CACHE_TTL)"""
+    body = await redis_client.get_user_stats(current_user.id)
+    if body is None:
+        stats = await crud.get_user_stats(db, current_user.id)
+        if stats is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        body = json.dumps(stats)
+        await redis_client.set_user_stats(current_user.id, body)
+    return Response(content=body, media_type="application/json")
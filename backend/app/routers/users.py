@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # Импорты из текущего пакета
-from .. import schemas, crud
+from .. import crud, schemas
 from ..auth import get_current_user
 from ..database import get_db
 
@@ -10,36 +11,45 @@ router = APIRouter(prefix="/api/v1/users", tags=["users"])
 
 
 @router.get("/me", response_model=schemas.UserResponse)
-def read_users_me(
-        current_user: schemas.UserResponse = Depends(get_current_user),
-        db: Session = Depends(get_db)
-):
-    # ⭐ НОВОЕ: получаем актуальные монеты из БД
-    user = crud.get_user(db, current_user.id)
-    if user:
-        # Обновляем объект текущего пользователя
-        current_user.poke_coins = user.poke_coins
+async def read_users_me(current_user: schemas.UserResponse = Depends(get_current_user)):
+    # Из кэша аутентификации: его записи сбрасываются во всех воркерах (см. principal_cache)
     return current_user
 
 
 @router.get("/coins")
-def get_user_coins(
+async def get_user_coins(current_user: schemas.UserResponse = Depends(get_current_user)):
+    """Получение баланса монет пользователя"""
+    return {"poke_coins": current_user.poke_coins}
+
+
+@router.get("/me/stats", response_model=schemas.UserStats)
+async def get_user_stats(
         current_user: schemas.UserResponse = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
-    """Получение баланса монет пользователя"""
-    user = crud.get_user(db, current_user.id)
-    if not user:
+    """Накопленная статистика игр пользователя"""
+    stats = await crud.get_user_stats(db, current_user.id)
+    if stats is None:
         raise HTTPException(status_code=404, detail="User not found")
+    return stats["stats"]
+
 
-    return {"poke_coins": user.poke_coins}
+@router.get("/me/games", response_model=List[schemas.GameSessionResponse])
+async def get_user_games(
+        before_id: Optional[int] = None,
+        limit: int = Query(10, ge=1, le=100),
+        current_user: schemas.UserResponse = Depends(get_current_user),
+        db: AsyncSession = Depends(get_db)
+):
+    """История игр, новые первыми; следующая страница - before_id = id последней игры"""
+    return await crud.get_user_game_sessions(db, current_user.id, before_id, limit)
 
 
 @router.put("/me")
-def update_user_profile(
+async def update_user_profile(
         user_update: schemas.UserBase,
         current_user: schemas.UserResponse = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
     # Реализация обновления профиля
     return {"message": "Profile update not implemented yet"}
\ No newline at end of file
@@ -0,0 +1,139 @@
+"""
+Серверный планировщик симуляции.
+
+Игры продвигаются фоновой asyncio-задачей с фиксированной частотой
+(SIMULATION_TICK_RATE) по настенным часам, а не по запросам клиента.
+Поэтому скорость игры не зависит от частоты опроса, а HTTP-запросы
+только читают состояние и применяют действия игрока.
+
+Сессии пачки (SIMULATION_BATCH_SIZE) продвигаются вместе через SimulationWorld:
+при COMBAT_ENGINE=numpy юниты всех игр пачки считаются одним векторным шагом.
+С RedisSessionStore игры тикает один воркер-лидер, поэтому блокировки, чтение и запись
+пачки идут пакетными вызовами хранилища: несколько запросов к Redis на пачку, а не на игру.
+"""
+import asyncio
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from .config import settings
+from .session_store import SessionStore, session_store
+from .world import SimulationWorld
+
+
+class SimulationScheduler:
+    def __init__(
+            self,
+            store: SessionStore,
+            tick_rate: int = settings.SIMULATION_TICK_RATE,
+            max_catchup_steps: int = settings.SIMULATION_MAX_CATCHUP_STEPS,
+            batch_size: int = settings.SIMULATION_BATCH_SIZE
+    ):
+        self.store = store
+        self.step = 1.0 / tick_rate
+        self.max_catchup_steps = max_catchup_steps
+        self.batch_size = batch_size
+        self.token = uuid.uuid4().hex
+        self._task: Optional[asyncio.Task] = None
+
+        # Метрики тиков
+        self.ticks = 0
+        self.overruns = 0  # тик не уложился в интервал
+        self.last_tick_ms = 0.0
+        self.avg_tick_ms = 0.0  # экспоненциальное среднее
+        self.max_tick_ms = 0.0
+        self.last_sessions = 0
+        self.last_steps = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        lease_ttl_ms = int(self.step * 1000 * 10)
+
+        while True:
+            try:
+                if await self.store.acquire_scheduler_lease(self.token, lease_ttl_ms):
+                    await self.tick()
+            except Exception as e:
+                print(f"❌ Simulation tick failed: {e}")
+
+            next_tick += self.step
+            delay = next_tick - loop.time()
+            if delay < 0:
+                # Не успели - не копим долг по тикам, его догонит advance() на следующем тике
+                self.overruns += 1
+                next_tick = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
+
+    async def tick(self):
+        """Один тик: продвигаем все активные игры пачками по batch_size"""
+        started = time.perf_counter()
+        now = time.time()
+        user_ids = await self.store.active_ids()
+        steps = 0
+
+        for offset in range(0, len(user_ids), self.batch_size):
+            steps += await self._advance_batch(user_ids[offset:offset + self.batch_size], now)
+            # Отдаем управление event loop между пачками, чтобы не задерживать HTTP-запросы
+            await asyncio.sleep(0)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.ticks += 1
+        self.last_tick_ms = elapsed_ms
+        self.avg_tick_ms = elapsed_ms if self.ticks == 1 else self.avg_tick_ms * 0.95 + elapsed_ms * 0.05
+        self.max_tick_ms = max(self.max_tick_ms, elapsed_ms)
+        self.last_sessions = len(user_ids)
+        self.last_steps = steps
+
+    async def _advance_batch(self, user_ids: List[int], now: float) -> int:
+        # Сессии, которые держат запросы игроков, пропускаются - продвинем на следующем тике.
+        # Блокировки, чтение и запись пачки - пакетные вызовы хранилища (для Redis - конвейеры)
+        async with self.store.lock_many(user_ids) as locked:
+            world = SimulationWorld()
+            for user_id, game in (await self.store.get_many(locked)).items():
+                if game is None:
+                    # Сессия истекла в хранилище - убираем из списка активных
+                    await self.store.delete(user_id)
+                    continue
+                if not game.game_over:
+                    world.add(user_id, game)
+
+            advanced = world.advance(now, self.step, self.max_catchup_steps)
+            await self.store.save_many({user_id: world.view(user_id) for user_id in advanced})
+            return sum(advanced.values())
+
+    @property
+    def metrics(self) -> Dict:
+        return {
+            "running": self.running,
+            "tick_rate": round(1.0 / self.step),
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "last_tick_ms": round(self.last_tick_ms, 3),
+            "avg_tick_ms": round(self.avg_tick_ms, 3),
+            "max_tick_ms": round(self.max_tick_ms, 3),
+            "sessions": self.last_sessions,
+            "steps": self.last_steps,
+        }
+
+
+# Глобальный планировщик воркера
+scheduler = SimulationScheduler(session_store)
@@ -136,6 +136,41 @@ class LeaderboardResponse(BaseModel):
     current_page: int = 1
 
 
+class GameSessionResponse(BaseModel):
+    id: int
+    victory: bool
+    score: int
+    poke_coins_earned: int
+    waves_completed: int
+    pokemons_caught: int
+    enemies_defeated: int
+    game_duration: float
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+# Analytics schemas
+class AnalyticsBucket(BaseModel):
+    bucket_start: datetime
+    games: int = Field(0, ge=0)
+    wins: int = Field(0, ge=0)
+    win_rate: float = Field(0.0, ge=0.0, le=100.0)
+    average_score: float = Field(0.0, ge=0.0)
+    average_waves: float = Field(0.0, ge=0.0)
+    average_duration: float = Field(0.0, ge=0.0)
+    coins_minted: int = Field(0, ge=0)
+
+
+class AnalyticsResponse(BaseModel):
+    bucket: str
+    start: datetime
+    end: datetime
+    buckets: List[AnalyticsBucket]
+    total: AnalyticsBucket
+
+
 # Pokemon schemas для коллекции
 class PokemonBase(BaseModel):
     pokemon_id: int = Field(..., ge=1)
@@ -0,0 +1,73 @@
+"""
+Реестр живых игр воркера для InMemorySessionStore.
+
+Игры упорядочены по последнему обращению игрока (OrderedDict, как LRU), поэтому:
+- простаивающие дольше SESSION_IDLE_TIMEOUT берутся с начала списка без обхода всех игр;
+- при превышении SESSION_MAX_LIVE вытесняется игра, к которой дольше всех не обращались.
+
+Обращения планировщика и рассылки кадров WebSocket не считаются активностью игрока
+(touch=False) - иначе брошенная вкладка держала бы игру в памяти вечно.
+"""
+import time
+from collections import OrderedDict
+from typing import Dict, Iterator, Optional
+
+from .game_logic import PokemonGameLogic
+
+
+class SessionRegistry:
+    def __init__(self, max_live: int):
+        self.max_live = max_live
+        # user_id -> [игра, время последнего обращения игрока (time.monotonic)]
+        self._entries: "OrderedDict[int, list]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._entries
+
+    def get(self, user_id: int, touch: bool = True) -> Optional[PokemonGameLogic]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        if touch:
+            entry[1] = time.monotonic()
+            self._entries.move_to_end(user_id)
+        return entry[0]
+
+    def put(self, user_id: int, game: PokemonGameLogic, touch: bool = True):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self._entries[user_id] = [game, time.monotonic()]
+            return
+        entry[0] = game
+        if touch:
+            entry[1] = time.monotonic()
+            self._entries.move_to_end(user_id)
+
+    def pop(self, user_id: int) -> Optional[PokemonGameLogic]:
+        entry = self._entries.pop(user_id, None)
+        return entry[0] if entry else None
+
+    def ids(self):
+        return list(self._entries)
+
+    def games(self) -> Dict[int, PokemonGameLogic]:
+        return {user_id: entry[0] for user_id, entry in self._entries.items()}
+
+    def idle(self, timeout: float) -> Iterator[int]:
+        """Игры без обращений игрока дольше timeout секунд, самые старые первыми"""
+        cutoff = time.monotonic() - timeout
+        for user_id, entry in list(self._entries.items()):
+            if entry[1] > cutoff:
+                break
+            yield user_id
+
+    def least_recent(self) -> Iterator[int]:
+        """Кандидаты на вытеснение - в порядке давности последнего обращения"""
+        return iter(list(self._entries))
+
+    @property
+    def full(self) -> bool:
+        return 0 < self.max_live <= len(self._entries)
@@ -0,0 +1,382 @@
+"""
+Хранилище активных игровых сессий.
+
+Два бэкенда:
+- InMemorySessionStore - игры живут в памяти воркера (без REDIS_URL, только один воркер),
+  с периодическими чекпоинтами на случай перезапуска воркера (см. checkpoint.py);
+  брошенные игры и игры сверх SESSION_MAX_LIVE завершаются с сохранением результата;
+- RedisSessionStore - игры хранятся в Redis двоичными снимками (snapshot.py)
+  и доступны любому воркеру gunicorn.
+
+Все изменения игры выполняются под блокировкой сессии:
+
+    async with session_store.lock(user_id):
+        game = await session_store.get(user_id)
+        ...
+        await session_store.save(user_id, game)
+
+Фоновые обращения (планировщик, рассылка кадров) передают touch=False:
+они не считаются активностью игрока.
+"""
+import asyncio
+import json
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Dict, List, Optional
+
+from . import schemas
+from .checkpoint import SessionCheckpointer, checkpointer
+from .config import settings
+from .game_logic import PokemonGameLogic
+from .redis_client import redis_client
+from .result_queue import result_queue
+from .session_registry import SessionRegistry
+from .snapshot import SnapshotError, decode_game, encode_game, is_snapshot
+
+
+class SessionLockTimeout(Exception):
+    """Не удалось получить блокировку игровой сессии за отведенное время"""
+
+
+class SessionStore(ABC):
+    """Базовый интерфейс хранилища сессий"""
+
+    def __init__(self):
+        # Локальные блокировки защищают сессию от параллельных запросов внутри воркера.
+        # Храним [lock, число ожидающих], чтобы удалять блокировку, когда она никому не нужна
+        self._local_locks: Dict[int, list] = {}
+
+    @asynccontextmanager
+    async def lock(self, user_id: int, timeout: Optional[float] = None):
+        if timeout is None:
+            timeout = settings.SESSION_LOCK_TIMEOUT
+        entry = self._local_locks.get(user_id)
+        if entry is None:
+            entry = self._local_locks[user_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            if entry[1] == 1:
+                # Блокировку никто не держит и не ждет - acquire не ждет (тик планировщика
+                # берет тысячи свободных блокировок, без wait_for это дешевле)
+                await entry[0].acquire()
+            else:
+                try:
+                    await asyncio.wait_for(entry[0].acquire(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    raise SessionLockTimeout(f"Game session {user_id} is busy")
+            try:
+                yield
+            finally:
+                entry[0].release()
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._local_locks.pop(user_id, None)
+
+    async def start(self):
+        """Фоновые задачи хранилища (после подключения к Redis)"""
+
+    async def stop(self):
+        pass
+
+    @abstractmethod
+    async def get(self, user_id: int, touch: bool = True) -> Optional[PokemonGameLogic]:
+        """Игра игрока или None; touch=False - фоновое чтение, не активность игрока"""
+
+    @abstractmethod
+    async def save(self, user_id: int, game: PokemonGameLogic, touch: bool = True):
+        """Сохраняет игру (под блокировкой сессии)"""
+
+    @abstractmethod
+    async def delete(self, user_id: int):
+        """Удаляет игру из хранилища и из списка активных"""
+
+    @abstractmethod
+    async def active_ids(self) -> List[int]:
+        """Идентификаторы всех активных игр (для планировщика симуляции)"""
+
+    @asynccontextmanager
+    async def lock_many(self, user_ids: List[int]):
+        """
+        Блокировки пачки сессий без ожидания (тик планировщика): отдает список id,
+        которые удалось заблокировать; сессии, занятые запросами игроков, пропускаются.
+        Здесь - только локальные блокировки, распределенные хранилище берет сразу для всей пачки
+        """
+        async with AsyncExitStack() as stack:
+            locked = []
+            for user_id in user_ids:
+                try:
+                    await stack.enter_async_context(SessionStore.lock(self, user_id, timeout=0))
+                except SessionLockTimeout:
+                    continue
+                locked.append(user_id)
+            yield locked
+
+    async def get_many(self, user_ids: List[int]) -> Dict[int, Optional[PokemonGameLogic]]:
+        """Игры пачки сессий (фоновое чтение, под lock_many)"""
+        return {user_id: await self.get(user_id, touch=False) for user_id in user_ids}
+
+    async def save_many(self, games: Dict[int, PokemonGameLogic]):
+        for user_id, game in games.items():
+            await self.save(user_id, game, touch=False)
+
+    async def acquire_scheduler_lease(self, token: str, ttl_ms: int) -> bool:
+        """
+        Право тикать игры этого хранилища. Для хранилища в памяти каждый воркер
+        тикает свои игры сам, поэтому право есть всегда.
+        """
+        return True
+
+    @property
+    def metrics(self) -> Dict:
+        return {}
+
+
+class InMemorySessionStore(SessionStore):
+    """Игры хранятся объектами в памяти процесса - без сериализации на каждом запросе"""
+
+    def __init__(self, checkpoints: Optional[SessionCheckpointer] = None,
+                 idle_timeout: float = 0, reaper_interval: float = 30.0, max_live: int = 0):
+        super().__init__()
+        self._games = SessionRegistry(max_live)
+        self.checkpoints = checkpoints
+        self.idle_timeout = idle_timeout
+        self.reaper_interval = reaper_interval
+        self._reaper: Optional[asyncio.Task] = None
+
+        # Метрики
+        self.evicted_idle = 0
+        self.evicted_lru = 0
+        self.finalized = 0
+        self.finalize_failures = 0
+        self.dropped_stale = 0
+
+    async def start(self):
+        if self.checkpoints:
+            self.checkpoints.start(self._games.games)
+        if self._reaper is None and self.idle_timeout > 0:
+            self._reaper = asyncio.create_task(self._run_reaper())
+
+    async def stop(self):
+        if self._reaper:
+            self._reaper.cancel()
+            try:
+                await self._reaper
+            except asyncio.CancelledError:
+                pass
+            self._reaper = None
+        if self.checkpoints:
+            await self.checkpoints.stop()
+
+    async def get(self, user_id: int, touch: bool = True) -> Optional[PokemonGameLogic]:
+        game = self._games.get(user_id, touch)
+        # Фоновые чтения (touch=False: тик, WebSocket-пуш) идут без блокировки сессии -
+        # они не восстанавливают игры и не вытесняют чужие, это делают только запросы игрока
+        if game is None and touch and self.checkpoints:
+            # Игра могла остаться от перезапущенного воркера
+            game = await self.checkpoints.restore(user_id)
+            if game is not None:
+                await self._make_room(user_id)
+                self._games.put(user_id, game)
+        return game
+
+    async def save(self, user_id: int, game: PokemonGameLogic, touch: bool = True):
+        if touch and user_id not in self._games:
+            await self._make_room(user_id)
+        self._games.put(user_id, game, touch)
+
+    async def delete(self, user_id: int):
+        self._games.pop(user_id)
+        if self.checkpoints:
+            await self.checkpoints.delete(user_id)
+
+    async def active_ids(self) -> List[int]:
+        return self._games.ids()
+
+    async def _run_reaper(self):
+        while True:
+            await asyncio.sleep(self.reaper_interval)
+            try:
+                await self.reap()
+            except Exception as e:
+                print(f"❌ Idle game sessions reaper failed: {e}")
+
+    async def reap(self) -> int:
+        """Завершает игры без запросов игрока дольше idle_timeout"""
+        count = 0
+        for user_id in self._games.idle(self.idle_timeout):
+            if await self._evict(user_id, "idle"):
+                self.evicted_idle += 1
+                count += 1
+        return count
+
+    async def _make_room(self, user_id: int):
+        """Перед добавлением новой игры вытесняет давно не активные сверх max_live"""
+        if not self._games.full:
+            return
+        for victim in self._games.least_recent():
+            if victim != user_id and await self._evict(victim, "memory limit"):
+                self.evicted_lru += 1
+                if not self._games.full:
+                    return
+        print(f"⚠️ Live game sessions over the limit: {len(self._games)}")
+
+    async def _evict(self, user_id: int, reason: str) -> bool:
+        """
+        Убирает игру из памяти и ставит ее результат в очередь записи.
+        Игры, занятые запросом или тиком, пропускаются - значит, они еще нужны.
+        """
+        try:
+            async with self.lock(user_id, timeout=0):
+                game = self._games.pop(user_id)
+                if game is None:
+                    return False
+                if self.checkpoints and not await self.checkpoints.owns(user_id):
+                    # Игру уже восстановил другой воркер - засчитывает ее только он
+                    self.dropped_stale += 1
+                    print(f"⚠️ Stale copy of game {user_id} dropped: owned by another worker")
+                    return True
+                # Чекпоинт удаляется до записи результата, иначе игру можно восстановить и засчитать дважды
+                if self.checkpoints:
+                    await self.checkpoints.delete(user_id)
+                await self._finalize(user_id, game, reason)
+                return True
+        except SessionLockTimeout:
+            return False
+
+    async def _finalize(self, user_id: int, game: PokemonGameLogic, reason: str):
+        try:
+            result = game.get_game_result()
+            await result_queue.put(user_id, schemas.GameResult(**result), game.get_replay())
+        except Exception as e:
+            self.finalize_failures += 1
+            print(f"❌ Failed to finalize game of user {user_id} ({reason}): {e}")
+            return
+        self.finalized += 1
+        print(f"🧹 Game of user {user_id} finalized ({reason}). Coins earned: {result['poke_coins_earned']}")
+
+    @property
+    def metrics(self) -> Dict:
+        return {
+            "backend": "memory",
+            "live": len(self._games),
+            "max_live": self._games.max_live,
+            "idle_timeout": self.idle_timeout,
+            "reaper_running": self._reaper is not None and not self._reaper.done(),
+            "evicted_idle": self.evicted_idle,
+            "evicted_lru": self.evicted_lru,
+            "finalized": self.finalized,
+            "finalize_failures": self.finalize_failures,
+            "dropped_stale": self.dropped_stale,
+        }
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Игры хранятся в Redis снимками через RedisClient.set_game/get_game.
+    Блокировка двухуровневая: локальный asyncio.Lock + распределенный SET NX в Redis,
+    чтобы параллельные действия одного игрока на разных воркерах не теряли обновления.
+    """
+
+    LOCK_TTL_MS = 10000  # страховка на случай падения воркера с захваченной блокировкой
+    LOCK_RETRY_DELAY = 0.01
+
+    def __init__(self, client=redis_client):
+        super().__init__()
+        self.client = client
+
+    @asynccontextmanager
+    async def lock(self, user_id: int, timeout: Optional[float] = None):
+        if timeout is None:
+            timeout = settings.SESSION_LOCK_TIMEOUT
+        async with super().lock(user_id, timeout):
+            name = f"game:{user_id}"
+            token = uuid.uuid4().hex
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            while not await self.client.acquire_lock(name, token, self.LOCK_TTL_MS):
+                if loop.time() >= deadline:
+                    raise SessionLockTimeout(f"Game session {user_id} is busy")
+                await asyncio.sleep(self.LOCK_RETRY_DELAY)
+            try:
+                yield
+            finally:
+                await self.client.release_lock(name, token)
+
+    @asynccontextmanager
+    async def lock_many(self, user_ids: List[int]):
+        # Распределенные блокировки всей пачки - одним конвейером и одним скриптом снятия,
+        # а не парой запросов к Redis на каждую игру
+        async with SessionStore.lock_many(self, user_ids) as local:
+            token = uuid.uuid4().hex
+            names = [f"game:{user_id}" for user_id in local]
+            acquired = await self.client.acquire_locks(names, token, self.LOCK_TTL_MS)
+            try:
+                yield [user_id for user_id, ok in zip(local, acquired) if ok]
+            finally:
+                await self.client.release_locks([name for name, ok in zip(names, acquired) if ok], token)
+
+    @staticmethod
+    def _decode(user_id: int, data: Optional[bytes]) -> Optional[PokemonGameLogic]:
+        if not data:
+            return None
+        if not is_snapshot(data):
+            # Сессия, сохраненная в JSON до перехода на снимки
+            return PokemonGameLogic.from_dict(json.loads(data))
+        try:
+            return decode_game(data)
+        except SnapshotError as e:
+            # Снимок прежнего формата или битый - игру не восстановить, как и истекшую
+            print(f"⚠️ Dropped unreadable game session {user_id}: {e}")
+            return None
+
+    async def get(self, user_id: int, touch: bool = True) -> Optional[PokemonGameLogic]:
+        return self._decode(user_id, await self.client.get_game(user_id))
+
+    async def get_many(self, user_ids: List[int]) -> Dict[int, Optional[PokemonGameLogic]]:
+        snapshots = await self.client.get_games(user_ids)
+        return {user_id: self._decode(user_id, data) for user_id, data in zip(user_ids, snapshots)}
+
+    async def save(self, user_id: int, game: PokemonGameLogic, touch: bool = True):
+        # Простой брошенной игры ограничен TTL ключа в Redis
+        await self.client.set_game(user_id, encode_game(game))
+        await self.client.add_active_game(user_id)
+
+    async def save_many(self, games: Dict[int, PokemonGameLogic]):
+        # Игры тика уже в списке активных - только снимки
+        await self.client.set_games({user_id: encode_game(game) for user_id, game in games.items()})
+
+    async def delete(self, user_id: int):
+        await self.client.delete_game(user_id)
+        await self.client.remove_active_game(user_id)
+
+    async def active_ids(self) -> List[int]:
+        return await self.client.get_active_games()
+
+    async def acquire_scheduler_lease(self, token: str, ttl_ms: int) -> bool:
+        # Игры общие для всех воркеров - тикает только один воркер-лидер
+        if await self.client.renew_lock("scheduler", token, ttl_ms):
+            return True
+        return await self.client.acquire_lock("scheduler", token, ttl_ms)
+
+    @property
+    def metrics(self) -> Dict:
+        return {"backend": "redis"}
+
+
+def create_session_store() -> SessionStore:
+    if settings.session_backend == "redis":
+        return RedisSessionStore()
+    if settings.session_backend == "memory":
+        return InMemorySessionStore(
+            checkpointer if settings.SESSION_CHECKPOINT_INTERVAL > 0 else None,
+            idle_timeout=settings.SESSION_IDLE_TIMEOUT,
+            reaper_interval=settings.SESSION_REAPER_INTERVAL,
+            max_live=settings.SESSION_MAX_LIVE,
+        )
+    raise ValueError(f"Unknown SESSION_BACKEND: {settings.session_backend}")
+
+
+# Глобальное хранилище сессий воркера
+session_store = create_session_store()
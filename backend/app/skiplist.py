@@ -0,0 +1,125 @@
+"""
+Индексируемый skip list - упорядоченное множество (score, member) с поиском ранга за O(log N).
+
+Та же структура, что у sorted set в Redis: элементы упорядочены по score, при равных
+score - по member. Каждая ссылка хранит ширину (сколько элементов она перепрыгивает),
+поэтому ранг элемента и элемент по рангу находятся спуском по уровням, без обхода списка.
+Используется локальной заменой Redis (LocalRedis) для команд ZADD / ZREVRANK / ZREVRANGE.
+"""
+import random
+from typing import Iterator, List, Optional, Tuple
+
+MAX_LEVEL = 32
+P = 0.25  # как в Redis
+
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key: Optional[Tuple], level: int):
+        self.key = key
+        self.next: List[Optional["_Node"]] = [None] * level
+        self.width: List[int] = [1] * level
+
+
+class SortedScoreSet:
+    def __init__(self):
+        self._head = _Node(None, MAX_LEVEL)
+        self._level = 1
+        self._size = 0
+        # Уровни узлов не влияют на результат, только на скорость - отдельный генератор
+        self._random = random.Random(0)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < MAX_LEVEL and self._random.random() < P:
+            level += 1
+        return level
+
+    def _path(self, key: Tuple) -> Tuple[List[_Node], List[int]]:
+        """Последний узел меньше key на каждом уровне и его позиция (число элементов до него)"""
+        update = [self._head] * MAX_LEVEL
+        positions = [0] * MAX_LEVEL
+        node, position = self._head, 0
+        for level in range(self._level - 1, -1, -1):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+            update[level] = node
+            positions[level] = position
+        return update, positions
+
+    def add(self, score: float, member: str):
+        """Добавляет элемент (вызывающий код гарантирует, что member еще нет в множестве)"""
+        key = (score, member)
+        update, positions = self._path(key)
+        level = self._random_level()
+        if level > self._level:
+            for extra in range(self._level, level):
+                update[extra] = self._head
+                positions[extra] = 0
+                self._head.width[extra] = self._size + 1
+            self._level = level
+
+        node = _Node(key, level)
+        rank = positions[0] + 1  # позиция нового узла, считая с 1
+        for i in range(level):
+            previous = update[i]
+            node.next[i] = previous.next[i]
+            previous.next[i] = node
+            # Ширина старой ссылки делится между предыдущим и новым узлом
+            node.width[i] = previous.width[i] - (rank - positions[i]) + 1
+            previous.width[i] = rank - positions[i]
+        for i in range(level, self._level):
+            update[i].width[i] += 1
+        self._size += 1
+
+    def remove(self, score: float, member: str) -> bool:
+        key = (score, member)
+        update, _ = self._path(key)
+        node = update[0].next[0]
+        if node is None or node.key != key:
+            return False
+
+        for i in range(self._level):
+            if update[i].next[i] is node:
+                update[i].width[i] += node.width[i] - 1
+                update[i].next[i] = node.next[i]
+            else:
+                update[i].width[i] -= 1
+        while self._level > 1 and self._head.next[self._level - 1] is None:
+            self._level -= 1
+        self._size -= 1
+        return True
+
+    def rank(self, score: float, member: str) -> Optional[int]:
+        """Ранг элемента по возрастанию, с 0"""
+        key = (score, member)
+        node, position = self._head, 0
+        for level in range(self._level - 1, -1, -1):
+            while node.next[level] is not None and node.next[level].key <= key:
+                position += node.width[level]
+                node = node.next[level]
+            if node.key == key:
+                return position - 1
+        return None
+
+    def _node_at(self, rank: int) -> Optional[_Node]:
+        node, position = self._head, -1
+        for level in range(self._level - 1, -1, -1):
+            while node.next[level] is not None and position + node.width[level] <= rank:
+                position += node.width[level]
+                node = node.next[level]
+        return node if position == rank else None
+
+    def slice(self, start: int, stop: int) -> Iterator[Tuple[float, str]]:
+        """Элементы с рангами start..stop включительно, по возрастанию"""
+        if start < 0 or start > stop or start >= self._size:
+            return
+        node = self._node_at(start)
+        for _ in range(min(stop, self._size - 1) - start + 1):
+            yield node.key
+            node = node.next[0]
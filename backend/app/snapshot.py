@@ -0,0 +1,63 @@
+"""
+Снимок игры (PokemonGameLogic) для чекпоинтов и хранилища сессий.
+
+Снимок - это to_dict(), закодированный orjson (без orjson - компактный json.dumps)
+и сжатый zlib: имена покемонов, стихии и ключи юнитов повторяются и хорошо сжимаются.
+Отдельного двоичного формата нет, поэтому новое поле игры достаточно добавить
+в to_dict/from_dict, а старые снимки проходят через те же обновления (_upgrade_*).
+
+Формат:
+    "PTDS" | версия снимка (B) | zlib(JSON to_dict())
+"""
+import json
+import struct
+import zlib
+
+from .game_logic import PokemonGameLogic
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+MAGIC = b"PTDS"
+# Версия 1 - прежний построчный двоичный формат, больше не читается
+SNAPSHOT_VERSION = 2
+COMPRESS_LEVEL = 1  # снимки пишутся на каждом тике: быстрое сжатие важнее степени
+
+_HEADER = struct.Struct("<4sB")
+
+
+class SnapshotError(ValueError):
+    """Снимок поврежден или другого формата"""
+
+
+def _dumps(state: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(state)
+    return json.dumps(state, separators=(",", ":")).encode("utf-8")
+
+
+def _loads(data: bytes) -> dict:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def encode_game(game: PokemonGameLogic) -> bytes:
+    return _HEADER.pack(MAGIC, SNAPSHOT_VERSION) + zlib.compress(_dumps(game.to_dict()), COMPRESS_LEVEL)
+
+
+def decode_game(data: bytes) -> PokemonGameLogic:
+    if not is_snapshot(data) or len(data) < _HEADER.size:
+        raise SnapshotError("Not a game snapshot")
+    _, version = _HEADER.unpack_from(data)
+    if version != SNAPSHOT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot version: {version}")
+    try:
+        state = _loads(zlib.decompress(data[_HEADER.size:]))
+    except (zlib.error, ValueError) as e:
+        raise SnapshotError(f"Corrupted game snapshot: {e}")
+    return PokemonGameLogic.from_dict(state)
+
+
+def is_snapshot(data) -> bool:
+    return isinstance(data, (bytes, bytearray)) and data[:4] == MAGIC
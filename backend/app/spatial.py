@@ -0,0 +1,81 @@
+"""
+Равномерная сетка для поиска юнитов рядом с точкой.
+
+Поле делится на клетки CELL_SIZE × CELL_SIZE (по радиусу атаки покемона), поэтому
+запрос в радиусе атаки смотрит не больше 3×3 соседних клеток вместо всех врагов.
+Индекс пересобирается каждый тик после движения врагов (O(E)), убитые враги
+удаляются из него сразу.
+
+Поиск ближайшего дает ту же цель, что и полный перебор списка: расстояние
+считается той же формулой, а при равных расстояниях побеждает юнит, стоящий
+в исходном списке раньше.
+"""
+import math
+from typing import Dict, List, Optional, Tuple
+
+CELL_SIZE = 120  # = attack_range покемона
+
+
+class UniformGrid:
+    """Индекс юнитов (с атрибутами x и y) по клеткам; юниты адресуются индексом в units"""
+
+    def __init__(self, units: List[Dict], cell_size: float = CELL_SIZE):
+        self.cell_size = cell_size
+        self.units = list(units)
+        self.cells: Dict[Tuple[int, int], List[int]] = {}
+        self._unit_cells: List[Tuple[int, int]] = []
+
+        for index, unit in enumerate(self.units):
+            cell = self._cell(unit.x, unit.y)
+            self._unit_cells.append(cell)
+            self.cells.setdefault(cell, []).append(index)
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def _candidates(self, min_x: float, min_y: float, max_x: float, max_y: float):
+        """Индексы юнитов из клеток, пересекающих прямоугольник"""
+        min_cx, min_cy = self._cell(min_x, min_y)
+        max_cx, max_cy = self._cell(max_x, max_y)
+        cells = self.cells
+        for cx in range(min_cx, max_cx + 1):
+            for cy in range(min_cy, max_cy + 1):
+                bucket = cells.get((cx, cy))
+                if bucket:
+                    yield from bucket
+
+    def remove(self, index: int):
+        """Убирает юнит из индекса (например, убитого врага)"""
+        bucket = self.cells.get(self._unit_cells[index])
+        if bucket and index in bucket:
+            bucket.remove(index)
+
+    def nearest(self, x: float, y: float, radius: float) -> Optional[int]:
+        """Индекс ближайшего юнита на расстоянии строго меньше radius или None"""
+        best = None
+        best_distance = float('inf')
+        units = self.units
+
+        for index in self._candidates(x - radius, y - radius, x + radius, y + radius):
+            unit = units[index]
+            # sqrt(dx*dx + dy*dy) округляется одинаково в Python и NumPy (в отличие от ** 0.5)
+            dx = x - unit.x
+            dy = y - unit.y
+            distance = math.sqrt(dx * dx + dy * dy)
+            if distance >= radius:
+                continue
+            # Клетки обходятся не в порядке списка, поэтому при равенстве сравниваем индексы
+            if distance < best_distance or (distance == best_distance and index < best):
+                best = index
+                best_distance = distance
+
+        return best
+
+    def any_in_box(self, x: float, y: float, half_width: float, half_height: float) -> bool:
+        """Есть ли юнит с |ux - x| < half_width и |uy - y| < half_height"""
+        units = self.units
+        for index in self._candidates(x - half_width, y - half_height, x + half_width, y + half_height):
+            unit = units[index]
+            if abs(unit.x - x) < half_width and abs(unit.y - y) < half_height:
+                return True
+        return False
@@ -0,0 +1,103 @@
+"""
+Дельта-сжатие состояния игры для WebSocket-канала.
+
+Клиенту отправляются только изменения с прошлого кадра:
+- player - изменившиеся скалярные поля (здоровье, очки, волна, ...);
+- hand - рука целиком, если она изменилась (она маленькая);
+- field / enemies - {"upsert": [...], "remove": [id, ...]}, где для уже известных
+  клиенту сущностей передаются только изменившиеся поля (позиция, здоровье, ...).
+
+Каждые keyframe_interval кадров отправляется полный ключевой кадр, чтобы клиент
+мог восстановиться после потерянного или неверно примененного кадра.
+
+Кодировщик хранит словари сущностей из переданного состояния без копирования:
+client_state() собирает их заново на каждый вызов (to_wire юнитов).
+"""
+from typing import Dict, List, Optional
+
+ENTITY_LISTS = ("field", "enemies")
+
+
+class StateDeltaEncoder:
+    def __init__(self, keyframe_interval: int = 50):
+        self.keyframe_interval = keyframe_interval
+        self.seq = 0
+        self._frames_since_keyframe = 0
+        self._player: Optional[Dict] = None
+        self._hand: Optional[List] = None
+        self._entities: Dict[str, Dict[int, Dict]] = {}
+
+    def reset(self):
+        """Следующий кадр будет ключевым"""
+        self._player = None
+
+    def encode(self, state: Dict) -> Optional[Dict]:
+        """Кадр для отправки клиенту или None, если с прошлого кадра ничего не изменилось"""
+        if self._player is None or self._frames_since_keyframe >= self.keyframe_interval:
+            return self._keyframe(state)
+
+        frame = {}
+
+        player = {key: value for key, value in state.items() if key not in ENTITY_LISTS and key != "hand"}
+        changed = {key: value for key, value in player.items() if self._player.get(key) != value}
+        if changed:
+            frame["player"] = changed
+        self._player = player
+
+        if state["hand"] != self._hand:
+            frame["hand"] = state["hand"]
+            self._hand = list(state["hand"])
+
+        for name in ENTITY_LISTS:
+            entity_delta = self._diff_entities(name, state[name])
+            if entity_delta:
+                frame[name] = entity_delta
+
+        self._frames_since_keyframe += 1
+        if not frame:
+            return None
+
+        self.seq += 1
+        frame["type"] = "delta"
+        frame["seq"] = self.seq
+        return frame
+
+    def _keyframe(self, state: Dict) -> Dict:
+        self._player = {key: value for key, value in state.items() if key not in ENTITY_LISTS and key != "hand"}
+        self._hand = list(state["hand"])
+        self._entities = {
+            name: {entity["id"]: entity for entity in state[name]}
+            for name in ENTITY_LISTS
+        }
+        self._frames_since_keyframe = 0
+        self.seq += 1
+        return {"type": "keyframe", "seq": self.seq, "state": state}
+
+    def _diff_entities(self, name: str, entities: List[Dict]) -> Optional[Dict]:
+        previous = self._entities.get(name, {})
+        current = {}
+        upsert = []
+
+        for entity in entities:
+            entity_id = entity["id"]
+            current[entity_id] = entity
+            known = previous.get(entity_id)
+            if known is None:
+                upsert.append(entity)
+                continue
+            changed = {key: value for key, value in entity.items() if known.get(key) != value}
+            if changed:
+                changed["id"] = entity_id
+                upsert.append(changed)
+
+        removed = [entity_id for entity_id in previous if entity_id not in current]
+        self._entities[name] = current
+
+        if not upsert and not removed:
+            return None
+        delta = {}
+        if upsert:
+            delta["upsert"] = upsert
+        if removed:
+            delta["remove"] = removed
+        return delta
@@ -0,0 +1,148 @@
+"""
+Компактный двоичный кадр состояния игры для /game/state (Accept: application/x-poketd-frame).
+
+В JSON каждый юнит повторяет ключи ("current_health", "attack_cooldown", ...), а имена
+и стихии - строками. В кадре ключей нет: состав и типы колонок задает схема, которую
+клиент один раз получает с /game/state/schema и по которой строит декодер
+(frontend/static/js/game.js, StateFrameDecoder). Кадр несет номер версии схемы -
+при расхождении клиент перезапрашивает схему.
+
+Формат версии 2 (little-endian):
+    B версия схемы | B точность дробных полей | H число строк
+    строки: B длина + UTF-8 (имена и стихии, каждая один раз)
+    строка игрока по PLAYER
+    для hand, field, enemies: H число юнитов + строки по схеме списка
+
+Типы колонок:
+    i - int32, f - float32 (клиент округляет до точности), d - float64, B - uint8, H - uint16,
+    ? - bool, s - строка (uint16-индекс в таблице строк), n - int32 или null (-1)
+
+Колонки из COMPUTED не читаются из юнита, а вычисляются игрой (скорости, время кадра)
+и всегда стоят в конце схемы.
+
+Значение, не помещающееся в тип колонки, - ошибка схемы (FrameSchemaError), а не повод
+молча ответить JSON: колонку нужно расширить и поднять FRAME_VERSION.
+
+Те же кадры уходят по WebSocket (/game/ws?format=frame) двоичными сообщениями.
+"""
+import struct
+import time
+from operator import attrgetter, itemgetter
+from typing import Dict, List
+
+from .config import settings
+from .game_logic import ENEMY_BASE_Y, PLAYER_BASE_Y, PokemonGameLogic
+
+FRAME_MEDIA_TYPE = "application/x-poketd-frame"
+FRAME_VERSION = 2
+
+PLAYER = (
+    ("player_health", "i"), ("player_level", "i"), ("player_exp", "i"), ("player_max_exp", "i"),
+    ("pokeballs", "i"), ("poke_coins", "i"), ("wave", "i"), ("score", "i"),
+    ("game_over", "?"), ("victory", "?"), ("time", "d"), ("server_time", "d"),
+)
+HAND = (
+    ("id", "i"), ("name", "s"), ("element", "s"), ("element_code", "B"),
+    ("health", "f"), ("attack", "f"), ("speed", "f"),
+)
+FIELD = HAND + (
+    ("x", "f"), ("y", "f"), ("current_health", "f"), ("max_health", "f"),
+    ("attack_cooldown", "f"), ("attack_range", "f"), ("is_moving", "?"), ("target", "n"),
+    ("reached_enemy_base", "?"), ("base_damage_timer", "f"), ("vy", "f"),
+)
+ENEMIES = HAND + (("x", "f"), ("y", "f"), ("current_health", "f"), ("vy", "f"))
+COMPUTED = ("time", "server_time", "vy")
+
+STRUCT_CODES = {"i": "i", "f": "f", "d": "d", "B": "B", "H": "H", "?": "?", "s": "H", "n": "i"}
+
+_header = struct.Struct("<BBH")
+_count = struct.Struct("<H")
+
+
+class FrameSchemaError(ValueError):
+    """Значение не помещается в колонку схемы кадра"""
+
+
+class FrameSchema:
+    """Упаковка строк одного списка по схеме колонок"""
+
+    def __init__(self, columns, getter):
+        self.columns = columns
+        self.row = struct.Struct("<" + "".join(STRUCT_CODES[kind] for _, kind in columns))
+        self.get = getter(*(name for name, _ in columns if name not in COMPUTED))
+        self.strings = [index for index, (_, kind) in enumerate(columns) if kind == "s"]
+        self.nullable = [index for index, (_, kind) in enumerate(columns) if kind == "n"]
+        self.floats = [index for index, (_, kind) in enumerate(columns) if kind == "f"]
+
+    def pack(self, item, strings: Dict[str, int], digits: int, *computed) -> bytes:
+        values = [*self.get(item), *computed]
+        # Округление как в JSON-ответе: клиент лишь убирает погрешность float32
+        for index in self.floats:
+            value = values[index]
+            if value.__class__ is float:
+                values[index] = round(value, digits)
+        for index in self.strings:
+            value = values[index]
+            code = strings.get(value)
+            if code is None:
+                code = strings[value] = len(strings)
+            values[index] = code
+        for index in self.nullable:
+            if values[index] is None:
+                values[index] = -1
+        try:
+            return self.row.pack(*values)
+        except struct.error as e:
+            raise FrameSchemaError(self._overflow(values, e))
+
+    def _overflow(self, values, error) -> str:
+        for (name, kind), value in zip(self.columns, values):
+            try:
+                struct.pack("<" + STRUCT_CODES[kind], value)
+            except struct.error:
+                return f"Column {name!r} ({kind}) does not fit {value!r}"
+        return str(error)
+
+
+_player = FrameSchema(PLAYER, attrgetter)
+_hand = FrameSchema(HAND, itemgetter)
+_field = FrameSchema(FIELD, attrgetter)
+_enemies = FrameSchema(ENEMIES, attrgetter)
+
+
+def frame_schema() -> Dict:
+    """Схема для клиента (GET /game/state/schema) и линии баз, которых нет в состоянии"""
+    return {
+        "version": FRAME_VERSION,
+        "media_type": FRAME_MEDIA_TYPE,
+        "lanes": {"player_base_y": PLAYER_BASE_Y, "enemy_base_y": ENEMY_BASE_Y},
+        "player": [list(column) for column in PLAYER],
+        "hand": [list(column) for column in HAND],
+        "field": [list(column) for column in FIELD],
+        "enemies": [list(column) for column in ENEMIES],
+    }
+
+
+def encode_frame(game: PokemonGameLogic) -> bytes:
+    digits = settings.GAME_STATE_PRECISION
+    strings: Dict[str, int] = {}
+    body: List[bytes] = [_player.pack(game, strings, digits, game.state_time(), time.time())]
+
+    body.append(_count.pack(len(game.hand)))
+    body.extend(_hand.pack(card, strings, digits) for card in game.hand)
+    body.append(_count.pack(len(game.field)))
+    body.extend(_field.pack(pokemon, strings, digits, game.pokemon_velocity(pokemon)) for pokemon in game.field)
+    body.append(_count.pack(len(game.enemies)))
+    body.extend(_enemies.pack(enemy, strings, digits, game.enemy_velocity(enemy)) for enemy in game.enemies)
+
+    table = []
+    for value in strings:
+        data = value.encode("utf-8")
+        if len(data) > 255:
+            raise FrameSchemaError(f"String {value[:32]!r}... is longer than 255 bytes")
+        table.append(bytes((len(data),)) + data)
+    return b"".join((_header.pack(FRAME_VERSION, digits, len(strings)), *table, *body))
+
+
+def accepts_frame(accept: str) -> bool:
+    return FRAME_MEDIA_TYPE in (accept or "")
@@ -0,0 +1,82 @@
+"""
+Быстрый ответ с состоянием игры для /game/state и /game/update.
+
+Клиент опрашивает состояние до 60 раз в секунду, поэтому ответ собирается без
+jsonable_encoder и стандартного json:
+- client_state() берет поля прямо из игры и юнитов, а не из get_state();
+- координаты, здоровье и таймеры юнитов округляются до GAME_STATE_PRECISION знаков -
+  клиенту не нужны доли пикселя, а короткие числа быстрее кодируются и меньше весят;
+- player_base_y / enemy_base_y не меняются за игру - клиент берет их из /game/state/schema;
+- скорости юнитов (vy) и время состояния (time, server_time) - как в get_state(), для
+  экстраполяции позиций на клиенте между редкими кадрами;
+- GameStateResponse кодирует словарь через orjson (без orjson - компактный json.dumps).
+
+Из client_state() строятся и JSON-кадры WebSocket (state_delta), тоже через dumps().
+"""
+import json
+import time
+from typing import Dict
+
+from fastapi.responses import Response
+
+from .config import settings
+from .game_logic import PokemonGameLogic
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Поля юнитов, которые меняются каждый шаг симуляции и могут быть дробными
+ROUNDED_FIELDS = ("x", "y", "current_health", "attack_cooldown", "base_damage_timer")
+
+
+def _round_units(units, velocity, digits: int):
+    wire = []
+    for unit in units:
+        data = unit.to_wire()
+        for name in ROUNDED_FIELDS:
+            value = data.get(name)
+            if value.__class__ is float:
+                data[name] = round(value, digits)
+        data["vy"] = velocity(unit)
+        wire.append(data)
+    return wire
+
+
+def client_state(game: PokemonGameLogic, digits: int = None) -> Dict:
+    """Состояние для клиента: как get_state(), но с округлением и без статических полей"""
+    if digits is None:
+        digits = settings.GAME_STATE_PRECISION
+    return {
+        "player_health": game.player_health,
+        "player_level": game.player_level,
+        "player_exp": game.player_exp,
+        "player_max_exp": game.player_max_exp,
+        "pokeballs": game.pokeballs,
+        "poke_coins": game.poke_coins,
+        "hand": game.hand,
+        "field": _round_units(game.field, game.pokemon_velocity, digits),
+        "enemies": _round_units(game.enemies, game.enemy_velocity, digits),
+        "wave": game.wave,
+        "score": game.score,
+        "game_over": game.game_over,
+        "victory": game.victory,
+        "time": round(game.state_time(), 3),
+        "server_time": round(time.time(), 3),
+    }
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, separators=(",", ":")).encode("utf-8")
+
+
+class GameStateResponse(Response):
+    """JSON-ответ без jsonable_encoder: словарь уже состоит из простых типов"""
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
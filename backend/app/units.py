@@ -0,0 +1,88 @@
+"""
+Юниты на поле боя: покемоны игрока и враги.
+
+Классы со __slots__ вместо словарей: у юнита нет __dict__, поля лежат в
+фиксированных слотах, поэтому экземпляр в несколько раз меньше словаря с теми же
+ключами, а чтение поля в горячем цикле - обычный доступ к атрибуту без хэширования строки.
+
+Формат для клиента и хранилища (to_wire / from_wire) совпадает с прежними
+словарями юнитов, поэтому ни фронтенд, ни сохраненные сессии не меняются.
+"""
+from operator import attrgetter
+from typing import Dict
+
+# Пикселей в секунду на единицу speed покемона (у врагов speed уже в пикселях в секунду)
+POKEMON_SPEED_SCALE = 30
+
+
+class Pokemon:
+    __slots__ = (
+        "id", "name", "element", "element_code", "health", "attack", "speed",
+        "x", "y", "current_health", "max_health", "attack_cooldown", "attack_range",
+        "is_moving", "target", "reached_enemy_base", "base_damage_timer",
+    )
+
+    def __init__(self, card: Dict, x: float, y: float):
+        """Покемон, выставленный на поле из карты руки"""
+        self.id = card["id"]
+        self.name = card["name"]
+        self.element = card["element"]
+        self.element_code = card["element_code"]
+        self.health = card["health"]
+        self.attack = card["attack"]
+        self.speed = card.get("speed", 1.5)
+        self.x = x
+        self.y = y
+        self.current_health = card["health"]
+        self.max_health = card["health"]
+        self.attack_cooldown = 0
+        self.attack_range = 120
+        self.is_moving = False
+        self.target = None
+        self.reached_enemy_base = False
+        self.base_damage_timer = 0
+
+    @classmethod
+    def from_wire(cls, data: Dict) -> "Pokemon":
+        pokemon = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(pokemon, name, data[name])
+        return pokemon
+
+    def to_wire(self) -> Dict:
+        return dict(zip(self.__slots__, _get_pokemon_fields(self)))
+
+
+class Enemy:
+    __slots__ = (
+        "id", "name", "element", "element_code", "health", "attack", "speed",
+        "x", "y", "current_health",
+    )
+
+    def __init__(self, template: Dict, entity_id: int, x: float, y: float):
+        """Враг, вышедший на поле из очереди волны"""
+        self.id = entity_id
+        self.name = template["name"]
+        self.element = template["element"]
+        self.element_code = template["element_code"]
+        self.health = template["health"]
+        self.attack = template["attack"]
+        self.speed = template.get("speed", 50)
+        self.x = x
+        self.y = y
+        self.current_health = template["health"]
+
+    @classmethod
+    def from_wire(cls, data: Dict) -> "Enemy":
+        enemy = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(enemy, name, data[name])
+        return enemy
+
+    def to_wire(self) -> Dict:
+        return dict(zip(self.__slots__, _get_enemy_fields(self)))
+
+
+# Все поля юнита одним вызовом C-кода
+_get_pokemon_fields = attrgetter(*Pokemon.__slots__)
+_get_enemy_fields = attrgetter(*Enemy.__slots__)
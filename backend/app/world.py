@@ -0,0 +1,78 @@
+"""
+Мир симуляции: много игровых сессий, продвигаемых одним пакетным шагом.
+
+Вместо цикла "для каждой игры - свой шаг движка" юниты всех игр с движком numpy
+раскладываются в общие массивы с номером сессии и считаются за один вызов
+combat_numpy.step_units. Накладные расходы Python на тик растут с числом юнитов,
+а не с числом сессий × фаз движка.
+
+Сами игры остаются обычными PokemonGameLogic: get_state(), get_game_result()
+и действия игрока работают с ними как раньше, мир только продвигает время.
+"""
+from typing import Dict, Iterable, List
+
+from . import combat_numpy
+from .game_logic import PokemonGameLogic
+
+
+def step_games(games: Iterable[PokemonGameLogic], delta_time: float):
+    """Один шаг симуляции сразу для всех games (тот же порядок фаз, что и PokemonGameLogic.step)"""
+    games = [game for game in games if not game.game_over]
+    if not games:
+        return
+
+    for game in games:
+        game.begin_step(delta_time)
+
+    batched = [game for game in games if game.engine == "numpy"]
+    if batched:
+        combat_numpy.step_units(batched, delta_time)
+    for game in games:
+        if game.engine != "numpy":
+            game.step_units(delta_time)
+
+    for game in games:
+        game.check_victory()
+
+
+class SimulationWorld:
+    """Контейнер сессий одного воркера (user_id -> игра)"""
+
+    def __init__(self, sessions: Dict[int, PokemonGameLogic] = None):
+        self.sessions: Dict[int, PokemonGameLogic] = dict(sessions or {})
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def add(self, user_id: int, game: PokemonGameLogic):
+        self.sessions[user_id] = game
+
+    def remove(self, user_id: int):
+        self.sessions.pop(user_id, None)
+
+    def view(self, user_id: int) -> PokemonGameLogic:
+        """Игра отдельной сессии для get_state() / get_game_result() / действий игрока"""
+        return self.sessions.get(user_id)
+
+    def step(self, delta_time: float):
+        step_games(self.sessions.values(), delta_time)
+
+    def advance(self, now: float, step: float, max_steps: int) -> Dict[int, int]:
+        """
+        Продвигает все сессии до момента now фиксированными шагами step.
+        Сессии, которым нужно одинаковое число шагов, идут общими пакетами:
+        k-й пакетный шаг включает все игры, которым нужно больше k шагов.
+        Возвращает {user_id: число шагов} для сессий, которые сдвинулись.
+        """
+        pending = {
+            user_id: game.pending_steps(now, step, max_steps)
+            for user_id, game in self.sessions.items()
+        }
+        pending = {user_id: steps for user_id, steps in pending.items() if steps}
+
+        for k in range(max(pending.values(), default=0)):
+            batch: List[PokemonGameLogic] = [
+                self.sessions[user_id] for user_id, steps in pending.items() if steps > k
+            ]
+            step_games(batch, step)
+        return pending
@@ -0,0 +1,121 @@
+"""
+Бенчмарк памяти юнитов: словари (прежний формат) против классов со __slots__ (app/units.py).
+
+Запуск из каталога backend:
+    python benchmarks/bench_memory.py [sessions]
+
+Строит заданное число сессий (по умолчанию 1000) с заполненным полем и волной
+врагов и через tracemalloc сравнивает:
+- память, занятую юнитами всех сессий;
+- объем памяти, выделяемой на кадр состояния для клиента по всем сессиям: сборка
+  field / enemies в get_state плюс снимок, который хранит кодировщик дельт
+  (раньше он копировал каждую сущность, потому что get_state отдавал живые словари врагов).
+"""
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.game_logic import PokemonGameLogic  # noqa: E402
+
+POKEMONS_PER_SESSION = 8
+ENEMIES_PER_SESSION = 10
+
+
+def make_session(user_id: int) -> PokemonGameLogic:
+    game = PokemonGameLogic(user_id, engine="python")
+    game.pokeballs = POKEMONS_PER_SESSION
+    for i in range(POKEMONS_PER_SESSION):
+        game.open_pokeball()
+        game.play_card(game.hand[-1]["id"], 60 + i * 85)
+    # Враги выходят из волны и расходятся по полю
+    while len(game.enemies) < ENEMIES_PER_SESSION:
+        game.wave_data = game.wave_data or game.generate_wave(game.wave)
+        game.spawn_enemies(game.enemy_spawn_interval)
+    for pokemon in game.field:
+        pokemon.y = random.uniform(150, 400)
+    for enemy in game.enemies:
+        enemy.y = random.uniform(100, 400)
+    return game
+
+
+def legacy_frame(game_field, enemies):
+    """Кадр поля так, как его собирали get_state со словарями юнитов и кодировщик дельт"""
+    state = {
+        "field": [
+            {
+                **pokemon,
+                "is_moving": pokemon.get("is_moving", False),
+                "target": pokemon.get("target"),
+                "speed": pokemon.get("speed", 1.5),
+                "reached_enemy_base": pokemon.get("reached_enemy_base", False),
+                "max_health": pokemon.get("max_health", pokemon["health"])
+            }
+            for pokemon in game_field
+        ],
+        "enemies": enemies,
+    }
+    snapshot = {name: {entity["id"]: dict(entity) for entity in state[name]} for name in ("field", "enemies")}
+    return state, snapshot
+
+
+def frame(game):
+    state = {
+        "field": [pokemon.to_wire() for pokemon in game.field],
+        "enemies": [enemy.to_wire() for enemy in game.enemies],
+    }
+    snapshot = {name: {entity["id"]: entity for entity in state[name]} for name in ("field", "enemies")}
+    return state, snapshot
+
+
+def measure(build):
+    """Байты, оставшиеся занятыми после build(), и пик выделений во время него"""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current - before, peak - before
+
+
+def main():
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    random.seed(1)
+    games = [make_session(user_id) for user_id in range(sessions)]
+    units = sum(len(game.field) + len(game.enemies) for game in games)
+
+    # Те же юниты в прежнем формате словарей
+    legacy, dict_bytes, _ = measure(lambda: [
+        ([pokemon.to_wire() for pokemon in game.field], [enemy.to_wire() for enemy in game.enemies])
+        for game in games
+    ])
+    slotted, slots_bytes, _ = measure(lambda: [
+        ([pokemon_copy(pokemon) for pokemon in game.field], [enemy_copy(enemy) for enemy in game.enemies])
+        for game in games
+    ])
+
+    _, _, legacy_frame_peak = measure(lambda: [legacy_frame(field, enemies) for field, enemies in legacy])
+    _, _, frame_peak = measure(lambda: [frame(game) for game in games])
+
+    print(f"sessions: {sessions}, units: {units}")
+    print(f"{'':>24} {'dict':>12} {'__slots__':>12} {'ratio':>7}")
+    print(f"{'units resident, KiB':>24} {dict_bytes / 1024:>12.1f} {slots_bytes / 1024:>12.1f} "
+          f"{dict_bytes / slots_bytes:>6.1f}x")
+    print(f"{'bytes per unit':>24} {dict_bytes / units:>12.0f} {slots_bytes / units:>12.0f}")
+    print(f"{'state frame alloc, KiB':>24} {legacy_frame_peak / 1024:>12.1f} {frame_peak / 1024:>12.1f} "
+          f"{legacy_frame_peak / frame_peak:>6.1f}x")
+
+
+def pokemon_copy(pokemon):
+    return type(pokemon).from_wire(pokemon.to_wire())
+
+
+def enemy_copy(enemy):
+    return type(enemy).from_wire(enemy.to_wire())
+
+
+if __name__ == "__main__":
+    main()
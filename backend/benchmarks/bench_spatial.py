@@ -0,0 +1,103 @@
+"""
+Бенчмарк поиска целей: полный перебор врагов против равномерной сетки (app/spatial.py).
+
+Запуск из каталога backend:
+    python benchmarks/bench_spatial.py
+
+Для каждого размера поля проверяет, что сетка выбирает те же цели, что и перебор
+(включая равные расстояния), и печатает время поиска целей и полного шага юнитов.
+"""
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.game_logic import PokemonGameLogic  # noqa: E402
+from app.spatial import UniformGrid  # noqa: E402
+from app.units import Enemy, Pokemon  # noqa: E402
+
+SIZES = [(10, 10), (50, 100), (100, 500), (200, 2000), (500, 5000)]
+REPEATS = 5
+
+
+def brute_force_nearest(pokemon, enemies):
+    """Исходный алгоритм: перебор всех врагов"""
+    nearest_enemy = None
+    nearest_distance = float('inf')
+    for enemy in enemies:
+        dx = pokemon.x - enemy.x
+        dy = pokemon.y - enemy.y
+        distance = math.sqrt(dx * dx + dy * dy)
+        if distance < pokemon.attack_range and distance < nearest_distance:
+            nearest_enemy = enemy
+            nearest_distance = distance
+    return nearest_enemy
+
+
+def make_game(pokemons: int, enemies: int, seed: int = 1) -> PokemonGameLogic:
+    random.seed(seed)
+    game = PokemonGameLogic(1, engine="python")
+    game.player_health = 10 ** 9
+    for i in range(pokemons):
+        card = {"id": game.new_entity_id(), "name": "Pikachu", "element": "electric", "element_code": 3,
+                "health": 10 ** 6, "attack": 18, "speed": 0.0}
+        game.field.append(Pokemon(card, random.randint(50, 750), random.randint(150, 400)))
+    for i in range(enemies):
+        template = {"name": "Rattata", "element": "normal", "element_code": 17,
+                    "health": 10 ** 9, "attack": 9, "speed": 0.0}
+        # Координаты на сетке с шагом 10 дают много равных расстояний
+        game.enemies.append(Enemy(template, game.new_entity_id(), random.randint(5, 75) * 10, random.randint(10, 45) * 10))
+    return game
+
+
+def check_ties():
+    """Равные расстояния в разных клетках: побеждает враг, стоящий в списке раньше"""
+    card = {"id": 1, "name": "Pikachu", "element": "electric", "element_code": 3, "health": 45, "attack": 18}
+    template = {"name": "Rattata", "element": "normal", "element_code": 17, "health": 29, "attack": 9}
+    pokemon = Pokemon(card, 120.0, 240.0)
+    enemies = [Enemy(template, 2, 150.0, 240.0), Enemy(template, 3, 90.0, 240.0), Enemy(template, 4, 120.0, 210.0)]
+    assert brute_force_nearest(pokemon, enemies) is enemies[0]
+    assert UniformGrid(enemies).nearest(pokemon.x, pokemon.y, 120) == 0
+    enemies.reverse()
+    assert brute_force_nearest(pokemon, enemies) is enemies[0]
+    assert UniformGrid(enemies).nearest(pokemon.x, pokemon.y, 120) == 0
+
+
+def best_ms(func) -> float:
+    best = float('inf')
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        func()
+        best = min(best, (time.perf_counter() - started) * 1000)
+    return best
+
+
+def main():
+    check_ties()
+    print(f"{'pokemons':>8} {'enemies':>8} {'scan ms':>9} {'grid ms':>9} {'speedup':>8} {'tick ms':>9}")
+
+    for pokemons, enemies in SIZES:
+        game = make_game(pokemons, enemies)
+
+        def scan():
+            return [brute_force_nearest(pokemon, game.enemies) for pokemon in game.field]
+
+        def grid():
+            index = UniformGrid(game.enemies)
+            return [index.nearest(pokemon.x, pokemon.y, pokemon.attack_range) for pokemon in game.field]
+
+        expected = scan()
+        found = [game.enemies[i] if i is not None else None for i in grid()]
+        assert all(a is b for a, b in zip(expected, found)), "grid target differs from brute-force scan"
+
+        scan_ms = best_ms(scan)
+        grid_ms = best_ms(grid)
+        tick_ms = best_ms(lambda: game.step_units(0.05))
+        print(f"{pokemons:>8} {enemies:>8} {scan_ms:>9.3f} {grid_ms:>9.3f} {scan_ms / grid_ms:>7.1f}x {tick_ms:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Бенчмарк ответа /game/state: прежний путь FastAPI против app/state_json.py и app/state_frame.py.
+
+Запуск из каталога backend:
+    python benchmarks/bench_state_json.py [iterations]
+
+Состояние - игра с полной волной врагов (10) и заполненным полем покемонов
+после нескольких шагов симуляции, чтобы координаты и здоровье были дробными.
+Сравниваются:
+- fastapi - get_state() -> jsonable_encoder -> JSONResponse (json.dumps), как при возврате словаря;
+- state_json - client_state() -> GameStateResponse (orjson);
+- state_json (stdlib) - то же без orjson, компактный json.dumps;
+- state_frame - двоичный кадр (Accept: application/x-poketd-frame).
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from app import state_json  # noqa: E402
+from app.game_logic import PokemonGameLogic  # noqa: E402
+from app.state_frame import encode_frame  # noqa: E402
+from app.state_json import GameStateResponse, client_state  # noqa: E402
+
+POKEMONS = 8
+FULL_WAVE = 10
+STEPS = 37
+
+
+def make_game() -> PokemonGameLogic:
+    game = PokemonGameLogic(1, engine="python", seed=1)
+    game.player_health = 10 ** 9
+    game.wave = 7
+    game.wave_data = game.generate_wave(game.wave)
+    game.pokeballs = POKEMONS
+    for i in range(POKEMONS):
+        game.open_pokeball()
+        game.play_card(game.hand[-1]["id"], 60 + i * 85)
+    while len(game.enemies) < FULL_WAVE:
+        game.spawn_enemies(game.enemy_spawn_interval)
+    game.enemy_spawn_interval = 10 ** 9
+    for _ in range(STEPS):
+        game.step(0.05)
+    return game
+
+
+def fastapi_path(game):
+    return JSONResponse(jsonable_encoder(game.get_state())).body
+
+
+def state_json_path(game):
+    return GameStateResponse(client_state(game)).body
+
+
+def measure(path, game, iterations: int) -> float:
+    path(game)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        path(game)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    game = make_game()
+    print(f"pokemons: {len(game.field)}, enemies: {len(game.enemies)}, iterations: {iterations}")
+
+    results = [("fastapi", measure(fastapi_path, game, iterations), len(fastapi_path(game)))]
+    if state_json.orjson is not None:
+        results.append(("state_json", measure(state_json_path, game, iterations), len(state_json_path(game))))
+    orjson, state_json.orjson = state_json.orjson, None
+    try:
+        results.append(("state_json (stdlib)", measure(state_json_path, game, iterations),
+                        len(state_json_path(game))))
+    finally:
+        state_json.orjson = orjson
+    results.append(("state_frame", measure(encode_frame, game, iterations), len(encode_frame(game))))
+
+    baseline = results[0][1]
+    print(f"{'':>20} {'us/response':>12} {'bytes':>8} {'speedup':>8}")
+    for name, micros, size in results:
+        print(f"{name:>20} {micros:>12.1f} {size:>8} {baseline / micros:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+Набор бенчмарков симуляции и проверка регрессий производительности.
+
+Бенчмарки вызывают PokemonGameLogic напрямую, без сервера:
+- tick_rate - шагов симуляции в секунду для одной сессии;
+- sessions_per_core - сколько сессий одно ядро продвигает с частотой
+  SIMULATION_TICK_RATE через пакетный SimulationWorld;
+- get_state_us / to_dict_us - стоимость сборки состояния для клиента и снимка для хранилища;
+- snapshot_encode_us / snapshot_decode_us / snapshot_bytes - снимок игры (app/snapshot.py: to_dict через orjson + zlib)
+  в сравнении с json_encode_us / json_decode_us / json_bytes для to_dict();
+- generate_wave_us - генерация волны;
+- replay_steps_per_sec - повтор записанных игр (если передан --replays).
+
+Сценарии параметризуются числом юнитов (покемонов × врагов) и номером волны
+и собираются детерминированно из зерна, поэтому одинаковы от запуска к запуску.
+
+Запуск из каталога backend:
+    python benchmarks/suite.py                      # результаты в benchmarks/results.json
+    python benchmarks/suite.py --save-baseline      # записать benchmarks/baseline.json
+    python benchmarks/suite.py --tolerance 0.25     # сравнить с базой, код выхода 1 при регрессии
+
+База зависит от машины: сохраняйте ее на той же машине (или CI-раннере), где проверяете.
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from app.config import settings  # noqa: E402
+from app.elements import with_element_code  # noqa: E402
+from app.game_logic import PokemonGameLogic  # noqa: E402
+from app.replay import load_replay, replay  # noqa: E402
+from app.snapshot import decode_game, encode_game  # noqa: E402
+from app.units import Enemy, Pokemon  # noqa: E402
+from app.world import SimulationWorld  # noqa: E402
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, "results.json")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+
+# (покемонов, врагов) на сессию; текущая игра держит до 10 врагов в волне
+UNIT_COUNTS = [(5, 10), (20, 100), (50, 500)]
+WAVES = [1, 5, 20]
+WORLD_SESSIONS = 200
+STEP = 1.0 / settings.SIMULATION_TICK_RATE
+
+POKEMON_CARDS = [
+    {"name": "Pikachu", "element": "electric", "health": 45, "attack": 18, "speed": 2.5},
+    {"name": "Psyduck", "element": "water", "health": 55, "attack": 12, "speed": 1.5},
+    {"name": "Growlithe", "element": "fire", "health": 60, "attack": 14, "speed": 2.0},
+    {"name": "Abra", "element": "psychic", "health": 40, "attack": 20, "speed": 1.8},
+    {"name": "Machop", "element": "fighting", "health": 70, "attack": 16, "speed": 1.4},
+]
+
+
+def build_session(pokemons: int, enemies: int, engine: str, seed: int = 1, wave: int = 3) -> Dict:
+    """
+    Снимок (to_dict) игры с заданным числом юнитов в установившемся бою:
+    враги с большим запасом здоровья, без спавна и без конца игры.
+    """
+    game = PokemonGameLogic(seed, engine=engine, seed=seed)
+    rng = game.rng
+    game.wave = wave
+    game.player_health = 10 ** 9
+    game.enemy_spawn_interval = 10 ** 9
+    game.action_log = None
+
+    for _ in range(pokemons):
+        card = with_element_code(dict(rng.choice(POKEMON_CARDS), id=game.new_entity_id(), health=10 ** 6))
+        game.field.append(Pokemon(card, rng.randint(50, 750), rng.randint(200, 400)))
+    templates = game.generate_wave(wave)
+    for _ in range(enemies):
+        template = dict(rng.choice(templates), health=10 ** 9, speed=1)
+        game.enemies.append(Enemy(template, game.new_entity_id(), rng.randint(50, 750), rng.randint(100, 350)))
+    return game.to_dict()
+
+
+def best_time(func: Callable[[], None], repeats: int) -> float:
+    """Лучшее время func() в секундах из repeats запусков"""
+    best = float('inf')
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def bench_tick_rate(engine: str, pokemons: int, enemies: int, steps: int, repeats: int) -> float:
+    snapshot = build_session(pokemons, enemies, engine)
+    games: List[PokemonGameLogic] = []
+
+    def run():
+        game = games.pop()
+        for _ in range(steps):
+            game.step(STEP)
+
+    # Каждый повтор стартует с одного и того же снимка
+    games.extend(PokemonGameLogic.from_dict(snapshot) for _ in range(repeats))
+    return steps / best_time(run, repeats)
+
+
+def bench_sessions_per_core(engine: str, pokemons: int, enemies: int, repeats: int) -> float:
+    snapshots = [build_session(pokemons, enemies, engine, seed=seed) for seed in range(WORLD_SESSIONS)]
+    worlds: List[SimulationWorld] = []
+
+    def run():
+        worlds.pop().step(STEP)
+
+    worlds.extend(
+        SimulationWorld({index: PokemonGameLogic.from_dict(snapshot) for index, snapshot in enumerate(snapshots)})
+        for _ in range(repeats)
+    )
+    tick_seconds = best_time(run, repeats)
+    return WORLD_SESSIONS / (tick_seconds * settings.SIMULATION_TICK_RATE)
+
+
+def bench_per_call_us(func: Callable[[], object], calls: int, repeats: int) -> float:
+    def run():
+        for _ in range(calls):
+            func()
+
+    return best_time(run, repeats) / calls * 1e6
+
+
+def run_suite(quick: bool, replay_paths: List[str]) -> Dict[str, Dict]:
+    repeats = 3 if quick else 7
+    steps = 20 if quick else 100
+    engines = ["python"] + (["numpy"] if numpy is not None else [])
+    results: Dict[str, Dict] = {}
+
+    def record(name: str, value: float, unit: str, better: str):
+        results[name] = {"value": round(value, 3), "unit": unit, "better": better}
+        print(f"  {name:<44} {value:>14,.1f} {unit}")
+
+    print("Simulation")
+    for engine in engines:
+        for pokemons, enemies in UNIT_COUNTS:
+            params = f"{engine}.p{pokemons}.e{enemies}"
+            record(f"tick_rate.{params}", bench_tick_rate(engine, pokemons, enemies, steps, repeats),
+                   "steps/s", "higher")
+            record(f"sessions_per_core.{params}", bench_sessions_per_core(engine, pokemons, enemies, repeats),
+                   "sessions", "higher")
+
+    print("Serialization")
+    for pokemons, enemies in UNIT_COUNTS:
+        game = PokemonGameLogic.from_dict(build_session(pokemons, enemies, "python"))
+        calls = 50 if quick else 200
+        record(f"get_state_us.p{pokemons}.e{enemies}", bench_per_call_us(game.get_state, calls, repeats),
+               "us", "lower")
+        record(f"to_dict_us.p{pokemons}.e{enemies}", bench_per_call_us(game.to_dict, calls, repeats),
+               "us", "lower")
+
+        snapshot = encode_game(game)
+        encoded_json = json.dumps(game.to_dict())
+        record(f"snapshot_encode_us.p{pokemons}.e{enemies}", bench_per_call_us(lambda: encode_game(game), calls, repeats),
+               "us", "lower")
+        record(f"snapshot_decode_us.p{pokemons}.e{enemies}", bench_per_call_us(lambda: decode_game(snapshot), calls, repeats),
+               "us", "lower")
+        record(f"snapshot_bytes.p{pokemons}.e{enemies}", len(snapshot), "bytes", "lower")
+        record(f"json_encode_us.p{pokemons}.e{enemies}",
+               bench_per_call_us(lambda: json.dumps(game.to_dict()), calls, repeats), "us", "lower")
+        record(f"json_decode_us.p{pokemons}.e{enemies}",
+               bench_per_call_us(lambda: PokemonGameLogic.from_dict(json.loads(encoded_json)), calls, repeats),
+               "us", "lower")
+        record(f"json_bytes.p{pokemons}.e{enemies}", len(encoded_json), "bytes", "lower")
+
+    print("Waves")
+    game = PokemonGameLogic(0, seed=1)
+    for wave in WAVES:
+        record(f"generate_wave_us.w{wave}", bench_per_call_us(lambda: game.generate_wave(wave), 500, repeats),
+               "us", "lower")
+
+    if replay_paths:
+        print("Replays")
+        records = [load_replay(path) for path in replay_paths]
+        replay_steps = sum(entry[3] for record_ in records for entry in record_["log"] if entry[1] == "step")
+        seconds = best_time(lambda: [replay(record_) for record_ in records], repeats)
+        record("replay_steps_per_sec", replay_steps / seconds, "steps/s", "higher")
+
+    return results
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[Tuple[str, float]]:
+    """Метрики, которые ухудшились сильнее tolerance (доля), с их изменением"""
+    regressions = []
+    print(f"\nCompared with baseline (tolerance {tolerance:.0%})")
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None or not base["value"]:
+            continue
+        change = result["value"] / base["value"] - 1
+        # Для "lower" рост значения - ухудшение, для "higher" - падение
+        worse = change if result["better"] == "lower" else -change
+        status = "REGRESSION" if worse > tolerance else "ok"
+        print(f"  {name:<44} {change:>+8.1%}  {status}")
+        if worse > tolerance:
+            regressions.append((name, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PokeTD simulation benchmarks")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="where to write results JSON")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown, fraction (0.2 = 20%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="store results as the new baseline")
+    parser.add_argument("--quick", action="store_true", help="fewer steps and repeats (smoke run)")
+    parser.add_argument("--replays", help="directory with recorded games (REPLAY_DIR) to replay")
+    args = parser.parse_args()
+
+    replay_paths = sorted(glob.glob(os.path.join(args.replays, "*.json"))) if args.replays else []
+    results = run_suite(args.quick, replay_paths)
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": numpy.__version__ if numpy is not None else None,
+        "quick": args.quick,
+        "results": results,
+    }
+
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save-baseline to create one")
+        return
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)["results"]
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n❌ {len(regressions)} benchmark(s) regressed beyond {args.tolerance:.0%}")
+        raise SystemExit(1)
+    print("\n✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Общие настройки тестов. Запуск из каталога backend:
+    python -m pytest -q tests
+
+Тесты работают без внешних сервисов: Redis - LocalRedis, БД - временная копия
+game.db4 (сама game.db4 не меняется), чекпоинты и повторы - во временном каталоге.
+Окружение задается до импорта app, потому что настройки и движок БД создаются при импорте.
+"""
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DIR = tempfile.mkdtemp(prefix="poketd-tests-")
+
+shutil.copy(os.path.join(BACKEND_DIR, "game.db4"), os.path.join(TEST_DIR, "test.db"))
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(TEST_DIR, "test.db")
+os.environ["SESSION_CHECKPOINT_DIR"] = os.path.join(TEST_DIR, "checkpoints")
+os.environ["RESULT_QUEUE_SPILL_FILE"] = os.path.join(TEST_DIR, "pending_results.jsonl")
+os.environ.pop("REDIS_URL", None)
+os.environ.pop("REPLAY_DIR", None)
+sys.path.insert(0, BACKEND_DIR)
+
+import pytest  # noqa: E402
+
+from app import models  # noqa: E402,F401 - таблицы регистрируются в Base.metadata при импорте
+from app.database import Base, async_engine, engine  # noqa: E402
+
+
+def run_coroutine(coroutine):
+    """
+    Выполняет корутину в новом event loop. Соединения aiosqlite привязаны к своему циклу,
+    поэтому после каждого запуска пул асинхронного движка сбрасывается
+    """
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            await async_engine.dispose()
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def run():
+    return run_coroutine
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    # Таблицы, появившиеся после game.db4 (user_stats, агрегаты аналитики)
+    Base.metadata.create_all(engine)
+    yield
+    engine.dispose()
+    shutil.rmtree(TEST_DIR, ignore_errors=True)
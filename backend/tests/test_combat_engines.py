@@ -0,0 +1,64 @@
+"""Векторизованный движок боя (combat_numpy) совпадает с эталонным на словарях"""
+import pytest
+
+from app.game_logic import PokemonGameLogic
+from app.world import SimulationWorld
+
+pytest.importorskip("numpy")
+
+STEPS = 600
+STEP = 0.05
+
+
+def make_game(user_id: int, engine: str, crowded: bool) -> PokemonGameLogic:
+    game = PokemonGameLogic(user_id, engine=engine, seed=user_id)
+    game.pokeballs = 30
+    game.player_health = 10 ** 6 if user_id % 3 else 300
+    if crowded:
+        # Волна в 8 раз больше обычной и частый спавн - много целей и атак одновременно
+        game.wave_data = game.generate_wave(1) * 8
+        game.enemy_spawn_interval = 0.05
+    return game
+
+
+def act(game: PokemonGameLogic, step: int):
+    if step % 15 == 0 and game.pokeballs > 0 and not game.game_over:
+        game.open_pokeball()
+    if step % 7 == 0 and game.hand:
+        game.play_card(game.hand[0]["id"], 50 + (step * 37 + game.user_id * 13) % 700)
+
+
+def comparable(game: PokemonGameLogic) -> dict:
+    state = game.to_dict()
+    for key in ("engine", "start_time", "last_tick_at", "action_log"):
+        state.pop(key)
+    return state
+
+
+@pytest.mark.parametrize("crowded", [False, True])
+@pytest.mark.parametrize("user_id", [1, 2, 3])
+def test_single_game_engines_match(user_id, crowded):
+    python = make_game(user_id, "python", crowded)
+    numpy = make_game(user_id, "numpy", crowded)
+    for step in range(STEPS):
+        act(python, step)
+        act(numpy, step)
+        python.step(STEP)
+        numpy.step(STEP)
+        assert comparable(numpy) == comparable(python), f"engines diverged at step {step}"
+
+
+@pytest.mark.parametrize("crowded", [False, True])
+def test_batched_world_matches_python(crowded):
+    reference = [make_game(user_id, "python", crowded) for user_id in range(12)]
+    batched = [make_game(user_id, "numpy", crowded) for user_id in range(12)]
+    world = SimulationWorld({game.user_id: game for game in batched})
+    for step in range(STEPS):
+        for game in reference:
+            act(game, step)
+            game.step(STEP)
+        for game in batched:
+            act(game, step)
+        world.step(STEP)
+    for python, numpy in zip(reference, batched):
+        assert comparable(numpy) == comparable(python)
@@ -0,0 +1,99 @@
+"""Запись результатов игр (crud.create_game_sessions): одна транзакция на пакет"""
+import uuid
+
+import pytest
+from sqlalchemy import event, func, select
+from sqlalchemy.exc import IntegrityError
+
+from app import crud, models, schemas
+from app.database import AsyncSessionLocal, async_engine
+
+
+def game_result(**fields) -> schemas.GameResult:
+    values = dict(victory=False, score=0, poke_coins_earned=0, waves_completed=0,
+                  pokemons_caught=0, enemies_defeated=0, game_duration=1.0)
+    values.update(fields)
+    return schemas.GameResult(**values)
+
+
+async def create_user(db) -> models.User:
+    name = "t" + uuid.uuid4().hex[:10]
+    user = schemas.UserCreate(username=name, email=f"{name}@example.com", password="secret1")
+    return await crud.create_user(db, user, "hash")
+
+
+@pytest.fixture
+def commits():
+    counter = []
+    listener = lambda connection: counter.append(connection)  # noqa: E731
+    event.listen(async_engine.sync_engine, "commit", listener)
+    yield counter
+    event.remove(async_engine.sync_engine, "commit", listener)
+
+
+def test_batch_saved_in_one_transaction(run, commits):
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            first, second = await create_user(db), await create_user(db)
+            coins = {first.id: first.poke_coins, second.id: second.poke_coins}
+
+        results = [
+            (first.id, game_result(victory=True, score=50, poke_coins_earned=60, waves_completed=3, enemies_defeated=9)),
+            (second.id, game_result(score=20, poke_coins_earned=2, waves_completed=1, pokemons_caught=4)),
+            (first.id, game_result(score=80, poke_coins_earned=5, waves_completed=2, enemies_defeated=1)),
+        ]
+        commits.clear()
+        async with AsyncSessionLocal() as db:
+            session_ids = await crud.create_game_sessions(db, results)
+        assert len(commits) == 1
+        assert len(session_ids) == 3 and session_ids == sorted(session_ids)
+
+        async with AsyncSessionLocal() as db:
+            users = {user.id: user for user in await db.scalars(
+                select(models.User).where(models.User.id.in_(coins)))}
+            assert users[first.id].poke_coins == coins[first.id] + 65
+            assert users[second.id].poke_coins == coins[second.id] + 2
+
+            board = await db.scalar(select(models.Leaderboard).where(models.Leaderboard.user_id == first.id))
+            assert (board.high_score, board.total_waves, board.total_enemies) == (80, 5, 10)
+
+            stats = await db.scalar(select(models.UserStats).where(models.UserStats.user_id == first.id))
+            assert (stats.total_games, stats.wins, stats.losses) == (2, 1, 1)
+            assert (stats.total_score, stats.high_score, stats.total_coins_earned) == (130, 80, 65)
+            # Последние игры - новые первыми
+            assert [game["id"] for game in stats.recent_games] == [session_ids[2], session_ids[0]]
+
+            sessions = await db.scalar(
+                select(func.count()).select_from(models.GameSession).where(models.GameSession.id.in_(session_ids)))
+            assert sessions == 3
+
+    run(scenario())
+
+
+def test_failed_batch_rolls_back_everything(run):
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            user = await create_user(db)
+            coins = user.poke_coins
+
+        # Отрицательный счет в обход валидации: CHECK в user_stats срабатывает последним
+        # запросом транзакции, когда сессии, монеты и лидерборд уже записаны
+        broken = schemas.GameResult.model_construct(**game_result().model_dump())
+        broken.score = -100
+        async with AsyncSessionLocal() as db:
+            with pytest.raises(IntegrityError):
+                await crud.create_game_sessions(db, [
+                    (user.id, game_result(score=30, poke_coins_earned=9)),
+                    (user.id, broken),
+                ])
+
+        async with AsyncSessionLocal() as db:
+            assert (await crud.get_user(db, user.id)).poke_coins == coins
+            board = await db.scalar(select(models.Leaderboard).where(models.Leaderboard.user_id == user.id))
+            assert board.high_score == 0
+            assert await db.scalar(select(models.UserStats).where(models.UserStats.user_id == user.id)) is None
+            sessions = await db.scalar(
+                select(func.count()).select_from(models.GameSession).where(models.GameSession.user_id == user.id))
+            assert sessions == 0
+
+    run(scenario())
@@ -0,0 +1,98 @@
+"""Лидерборд: индекс мест (LocalRedis на skip list), keyset-пагинация по курсору"""
+import uuid
+
+from fastapi import HTTPException
+import pytest
+from sqlalchemy import desc, select, update
+
+from app import crud, models, schemas
+from app.database import AsyncSessionLocal
+from app.leaderboard import leaderboard_index
+from app.redis_client import LocalRedis, redis_client
+from app.routers.leaderboard import load_page
+
+
+@pytest.fixture(autouse=True)
+def local_redis():
+    # Без REDIS_URL индекс и кэш страниц живут в LocalRedis воркера
+    redis_client.redis = redis_client.binary = LocalRedis()
+    yield
+    redis_client.redis = redis_client.binary = None
+
+
+async def add_players(db, scores):
+    """Игроки с заданными лучшими счетами (одинаковые счета упорядочиваются по user_id)"""
+    for score in scores:
+        name = "lb" + uuid.uuid4().hex[:10]
+        user = await crud.create_user(db, schemas.UserCreate(
+            username=name, email=f"{name}@example.com", password="secret1"), "hash")
+        await db.execute(update(models.Leaderboard)
+                         .where(models.Leaderboard.user_id == user.id).values(high_score=score))
+    await db.commit()
+
+
+async def expected_order(db):
+    board = models.Leaderboard
+    result = await db.execute(
+        select(board.username, board.high_score).order_by(desc(board.high_score), desc(board.user_id)))
+    return [(username, high_score, rank) for rank, (username, high_score) in enumerate(result, start=1)]
+
+
+def test_cursor_pages_continue_ranks(run):
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            await add_players(db, [5, 40, 40, 12, 0, 33, 40, 7, 19, 12, 1, 25])
+            await leaderboard_index.rebuild(db)
+            expected = await expected_order(db)
+            pages, cursor = [], None
+            while True:
+                entries, cursor = await load_page(db, 0, 7, cursor)
+                pages.extend((entry["username"], entry["high_score"], entry["rank"]) for entry in entries)
+                if not cursor:
+                    break
+            assert pages == expected
+
+            # Первая страница по skip продолжается курсором с правильных мест
+            entries, cursor = await load_page(db, 3, 4, None)
+            assert [entry["rank"] for entry in entries] == [4, 5, 6, 7]
+            entries, _ = await load_page(db, 0, 2, cursor)
+            assert [(entry["username"], entry["rank"]) for entry in entries] == [row[::2] for row in expected[7:9]]
+
+    run(scenario())
+
+
+def test_index_follows_results(run):
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            await add_players(db, [3, 30, 18, 18, 9])
+            await leaderboard_index.rebuild(db)
+            user = await crud.get_user_by_username(db, (await expected_order(db))[-1][0])
+
+            # Результат игры поднимает игрока в индексе без перестройки
+            await crud.create_game_sessions(db, [(user.id, schemas.GameResult(
+                victory=False, score=10 ** 6, poke_coins_earned=0, waves_completed=1,
+                pokemons_caught=0, enemies_defeated=0, game_duration=1.0))])
+
+        async with AsyncSessionLocal() as db:
+            expected = await expected_order(db)
+            assert await leaderboard_index.total() == len(expected)
+            assert await leaderboard_index.rank(user.id) == 1
+            for username, _, rank in expected[::5]:
+                player = await crud.get_user_by_username(db, username)
+                assert await leaderboard_index.rank(player.id) == rank
+
+            rank, first_rank, window = await leaderboard_index.around(user.id, 2)
+            assert (rank, first_rank) == (1, 1)
+            assert [score for _, score in window] == [row[1] for row in expected[:3]]
+
+    run(scenario())
+
+
+@pytest.mark.parametrize("cursor", ["10-5", "x-1-2", "10-5-0"])
+def test_invalid_cursor(cursor, run):
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            with pytest.raises(HTTPException):
+                await load_page(db, 0, 10, cursor)
+
+    run(scenario())
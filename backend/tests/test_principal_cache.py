@@ -0,0 +1,64 @@
+"""Кэш аутентификации: сброс после начисления монет, рассылка сброса другим воркерам"""
+import asyncio
+import uuid
+from datetime import datetime
+
+from app import crud, schemas
+from app.database import AsyncSessionLocal
+from app.principal_cache import PrincipalCache, principal_cache
+from app.redis_client import RedisClient
+
+
+class ChannelClient(RedisClient):
+    """Канал pub/sub в памяти вместо общего Redis: сообщения получают все подписчики"""
+
+    def __init__(self, subscribers: list):
+        super().__init__()
+        self.redis = object()  # не LocalRedis - как у воркеров с общим Redis
+        self.subscribers = subscribers
+
+    async def publish_principal_invalidation(self, user_ids):
+        for queue in self.subscribers:
+            queue.put_nowait(list(user_ids))
+
+    async def principal_invalidations(self):
+        queue = asyncio.Queue()
+        self.subscribers.append(queue)
+        while True:
+            yield await queue.get()
+
+
+def test_result_drops_cached_coins(run):
+    async def scenario():
+        name = "p" + uuid.uuid4().hex[:10]
+        async with AsyncSessionLocal() as db:
+            user = await crud.create_user(
+                db, schemas.UserCreate(username=name, email=f"{name}@example.com", password="secret1"), "hash")
+            principal_cache.put(user)
+            await crud.create_game_sessions(db, [(user.id, schemas.GameResult(
+                victory=True, score=5, poke_coins_earned=7, waves_completed=1,
+                pokemons_caught=0, enemies_defeated=1, game_duration=1.0))])
+        assert principal_cache.get(name) is None
+
+    run(scenario())
+
+
+def test_invalidation_reaches_other_workers(run):
+    async def scenario():
+        subscribers = []
+        workers = [PrincipalCache(10, 60, ChannelClient(subscribers)) for _ in range(2)]
+        user = schemas.UserResponse(id=7, username="ash", email="ash@example.com",
+                                    poke_coins=10, is_active=True, created_at=datetime.now())
+        for cache in workers:
+            cache.put(user)
+            cache.start()
+        while len(subscribers) < 2:
+            await asyncio.sleep(0)
+
+        await workers[0].invalidate_users([7])
+        await asyncio.sleep(0.01)
+        assert [cache.get("ash") for cache in workers] == [None, None]
+        for cache in workers:
+            await cache.stop()
+
+    run(scenario())
@@ -0,0 +1,65 @@
+"""Детерминированность игр: повтор по зерну и журналу дает тот же результат"""
+import json
+import random
+
+import pytest
+
+from app.game_logic import PokemonGameLogic
+from app.replay import replay, verify
+from app.world import SimulationWorld
+
+STEPS = 1500
+
+
+def comparable(game: PokemonGameLogic) -> dict:
+    state = game.to_dict()
+    for key in ("engine", "start_time", "last_tick_at", "action_log"):
+        state.pop(key)
+    return state
+
+
+def play_games(engine: str):
+    """Игры в пакетном мире со случайными действиями и переменным шагом, как на сервере"""
+    games = [PokemonGameLogic(user_id, engine=engine) for user_id in range(1, 9)]
+    world = SimulationWorld({game.user_id: game for game in games})
+    actions = random.Random(5)
+    for step in range(STEPS):
+        for game in games:
+            if actions.random() < 0.02:
+                game.open_pokeball()
+            if game.hand and actions.random() < 0.03:
+                game.play_card(game.hand[0]["id"], actions.randint(40, 760))
+        world.step(0.05 if step % 3 else 0.1)
+    return games
+
+
+@pytest.mark.parametrize("engine", ["python", "numpy"])
+def test_replay_reproduces_game(engine):
+    if engine == "numpy":
+        pytest.importorskip("numpy")
+    for game in play_games(engine):
+        # Запись проходит через JSON, как при сохранении в REPLAY_DIR
+        record = json.loads(json.dumps(game.get_replay()))
+        assert comparable(replay(record)) == comparable(game)
+        assert verify(record)["valid"]
+
+
+def test_replay_on_other_engine():
+    pytest.importorskip("numpy")
+    for game in play_games("python"):
+        assert verify(game.get_replay(), engine="numpy")["valid"]
+
+
+def test_verify_detects_tampered_result():
+    record = play_games("python")[0].get_replay()
+    record["result"]["score"] += 100
+    report = verify(record)
+    assert not report["valid"]
+    assert set(report["mismatches"]) == {"score"}
+
+
+def test_replay_requires_seed_and_log():
+    record = PokemonGameLogic(1, engine="python").get_replay()
+    record["seed"] = None
+    with pytest.raises(ValueError):
+        replay(record)
@@ -0,0 +1,75 @@
+"""Очередь отложенной записи результатов: плохая строка не роняет пакет, попытки переживают перезапуск"""
+import asyncio
+import json
+import uuid
+
+import pytest
+from sqlalchemy import func, select
+
+from app import crud, models, schemas
+from app.database import AsyncSessionLocal
+from app.result_queue import PendingResult, ResultWriteQueue
+
+
+def game_result(score: int) -> schemas.GameResult:
+    return schemas.GameResult(victory=False, score=score, poke_coins_earned=1, waves_completed=1,
+                              pokemons_caught=0, enemies_defeated=0, game_duration=1.0)
+
+
+def broken_result() -> schemas.GameResult:
+    # Проходит валидацию, но не помещается в INTEGER - запись в БД падает
+    return game_result(2 ** 70)
+
+
+async def create_user() -> int:
+    name = "q" + uuid.uuid4().hex[:10]
+    async with AsyncSessionLocal() as db:
+        user = await crud.create_user(
+            db, schemas.UserCreate(username=name, email=f"{name}@example.com", password="secret1"), "hash")
+        return user.id
+
+
+async def saved_games(user_id: int) -> int:
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(
+            select(func.count()).select_from(models.GameSession).where(models.GameSession.user_id == user_id))
+
+
+def test_bad_row_isolated_and_spilled(tmp_path, run):
+    async def scenario():
+        spill_file = str(tmp_path / "pending.jsonl")
+        queue = ResultWriteQueue(batch_size=10, flush_interval=1, max_attempts=2, spill_file=spill_file)
+        good, bad = await create_user(), await create_user()
+        waiter = asyncio.get_running_loop().create_future()
+        queue._pending = [
+            PendingResult(good, game_result(10)),
+            PendingResult(bad, broken_result(), future=waiter),
+            PendingResult(good, game_result(20)),
+        ]
+
+        # Пакет не записался - хорошие строки записаны по одной, плохая вернулась в очередь
+        with pytest.raises(Exception):
+            await queue.flush()
+        assert await saved_games(good) == 2
+        assert [(item.user_id, item.attempts) for item in queue._pending] == [(bad, 1)]
+        assert not waiter.done()
+
+        # Попытки кончились - строка уходит в файл вместе с их числом, ожидающий получает ошибку
+        with pytest.raises(Exception):
+            await queue.flush()
+        assert len(queue) == 0 and queue.spilled == 1
+        assert waiter.done() and waiter.exception() is not None
+        with open(spill_file) as file:
+            assert [json.loads(line)["attempts"] for line in file] == [2]
+
+        # После перезапуска число попыток не сбрасывается: одна попытка - и снова в файл
+        restarted = ResultWriteQueue(batch_size=10, flush_interval=1, max_attempts=2, spill_file=spill_file)
+        restarted._restore_spilled()
+        assert [item.attempts for item in restarted._pending] == [2]
+        restarted._pending.append(PendingResult(good, game_result(30)))
+        with pytest.raises(Exception):
+            await restarted.flush()
+        assert await saved_games(good) == 3 and len(restarted) == 0 and restarted.spilled == 1
+        assert await saved_games(bad) == 0
+
+    run(scenario())
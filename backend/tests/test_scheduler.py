@@ -0,0 +1,60 @@
+"""Тик планировщика: пачка сессий продвигается вместе, занятые запросами игроков пропускаются"""
+import asyncio
+import time
+
+import pytest
+
+from app.game_logic import PokemonGameLogic
+from app.redis_client import LocalRedis, RedisClient
+from app.scheduler import SimulationScheduler
+from app.session_store import InMemorySessionStore, RedisSessionStore
+
+
+def local_client() -> RedisClient:
+    client = RedisClient()
+    client.redis = client.binary = LocalRedis()
+    return client
+
+
+@pytest.fixture(params=["memory", "redis"])
+def store(request):
+    if request.param == "memory":
+        return InMemorySessionStore()
+    return RedisSessionStore(local_client())
+
+
+def test_tick_skips_busy_sessions(store, run):
+    async def scenario():
+        started = time.time() - 1
+        for user_id in (1, 2, 3):
+            game = PokemonGameLogic(user_id, engine="python", seed=user_id)
+            game.last_tick_at = started
+            await store.save(user_id, game)
+
+        scheduler = SimulationScheduler(store, tick_rate=20, max_catchup_steps=5, batch_size=2)
+        holder_ready, release = asyncio.Event(), asyncio.Event()
+
+        async def player_request():
+            async with store.lock(2):
+                holder_ready.set()
+                await release.wait()
+
+        task = asyncio.create_task(player_request())
+        await holder_ready.wait()
+        await scheduler.tick()
+        release.set()
+        await task
+
+        assert scheduler.last_sessions == 3 and scheduler.last_steps == 10
+        assert (await store.get(1)).last_tick_at > started
+        assert (await store.get(2)).last_tick_at == started
+        assert (await store.get(3)).last_tick_at > started
+
+        # Блокировки пачки сняты: сессии снова доступны запросам
+        for user_id in (1, 2, 3):
+            async with store.lock(user_id, timeout=0.05):
+                pass
+        if isinstance(store, RedisSessionStore):
+            assert await store.client.redis.get("lock:game:1") is None
+
+    run(scenario())
@@ -0,0 +1,234 @@
+"""Хранилища игровых сессий, блокировки и чекпоинты (без внешнего Redis - LocalRedis)"""
+import asyncio
+import os
+import time
+
+import pytest
+
+from app.checkpoint import SessionCheckpointer
+from app.game_logic import PokemonGameLogic
+from app.redis_client import LocalRedis, RedisClient
+from app.session_store import InMemorySessionStore, RedisSessionStore, SessionLockTimeout, SessionStore
+
+
+def local_client() -> RedisClient:
+    client = RedisClient()
+    client.redis = client.binary = LocalRedis()
+    return client
+
+
+def make_game(user_id: int) -> PokemonGameLogic:
+    game = PokemonGameLogic(user_id, engine="python", seed=user_id)
+    game.open_pokeball()
+    game.play_card(game.hand[-1]["id"], 300)
+    for _ in range(20):
+        game.step(0.05)
+    return game
+
+
+def comparable(game: PokemonGameLogic) -> dict:
+    state = game.to_dict()
+    for key in ("start_time", "last_tick_at"):
+        state.pop(key)
+    return state
+
+
+@pytest.fixture(params=["memory", "redis"])
+def store(request):
+    if request.param == "memory":
+        return InMemorySessionStore()
+    return RedisSessionStore(local_client())
+
+
+def test_save_get_delete(store, run):
+    async def scenario():
+        game = make_game(1)
+        await store.save(1, game)
+        loaded = await store.get(1)
+        assert comparable(loaded) == comparable(game)
+        assert await store.active_ids() == [1]
+
+        await store.delete(1)
+        assert await store.get(1) is None
+        assert await store.active_ids() == []
+
+    run(scenario())
+
+
+def test_lock_serializes_updates(store, run):
+    async def scenario():
+        await store.save(1, make_game(1))
+
+        async def add_coins():
+            async with store.lock(1):
+                game = await store.get(1)
+                coins = game.poke_coins
+                await asyncio.sleep(0.01)  # без блокировки второе чтение увидело бы старое значение
+                game.poke_coins = coins + 1
+                await store.save(1, game)
+
+        await asyncio.gather(*(add_coins() for _ in range(5)))
+        assert (await store.get(1)).poke_coins == 5
+        assert store._local_locks == {}
+
+    run(scenario())
+
+
+def test_lock_timeout(store, run):
+    async def scenario():
+        holder_ready = asyncio.Event()
+        release = asyncio.Event()
+
+        async def holder():
+            async with store.lock(1):
+                holder_ready.set()
+                await release.wait()
+
+        task = asyncio.create_task(holder())
+        await holder_ready.wait()
+        with pytest.raises(SessionLockTimeout):
+            async with store.lock(1, timeout=0.05):
+                pass
+        release.set()
+        await task
+
+        # После освобождения блокировка снова доступна
+        async with store.lock(1, timeout=0.05):
+            pass
+
+    run(scenario())
+
+
+def test_lock_timeout_with_queued_waiters(store, run):
+    async def scenario():
+        release = asyncio.Event()
+
+        async def waiter():
+            async with store.lock(1):
+                await release.wait()
+
+        async with store.lock(1):
+            task = asyncio.create_task(waiter())
+            await asyncio.sleep(0)  # waiter встал в очередь блокировки
+        # Блокировка уже отпущена, но ее ждет waiter - новый запрос ждет не дольше таймаута
+        # (страховка: без таймаута запрос дождался бы waiter, отпущенного через секунду)
+        asyncio.get_running_loop().call_later(1, release.set)
+        with pytest.raises(SessionLockTimeout):
+            async with store.lock(1, timeout=0.05):
+                pass
+        release.set()
+        await task
+
+    run(scenario())
+
+
+def test_store_interface_is_abstract():
+    with pytest.raises(TypeError):
+        SessionStore()
+
+
+def test_redis_lock_released(run):
+    async def scenario():
+        client = local_client()
+        store = RedisSessionStore(client)
+        async with store.lock(7):
+            assert await client.redis.get("lock:game:7") is not None
+        assert await client.redis.get("lock:game:7") is None
+
+        # Блокировку, взятую другим воркером, локальная блокировка не обходит
+        assert await client.acquire_lock("game:7", "other-worker", 10000)
+        with pytest.raises(SessionLockTimeout):
+            async with store.lock(7, timeout=0.05):
+                pass
+
+    run(scenario())
+
+
+def test_lru_eviction_finalizes_least_recent(run):
+    async def scenario():
+        store = InMemorySessionStore(max_live=2)
+        finalized = []
+
+        async def finalize(user_id, game, reason):
+            finalized.append((user_id, reason))
+        store._finalize = finalize
+
+        await store.save(1, make_game(1))
+        await store.save(2, make_game(2))
+        await store.get(1)  # игрок 1 активен, вытесняется игрок 2
+        await store.save(3, make_game(3))
+
+        assert sorted(await store.active_ids()) == [1, 3]
+        assert finalized == [(2, "memory limit")]
+
+        # Фоновые чтения не вытесняют игры и не считаются активностью
+        await store.get(3, touch=False)
+        assert next(store._games.least_recent()) == 1
+
+    run(scenario())
+
+
+def test_checkpoint_restore_only_from_dead_owner(tmp_path, run):
+    async def scenario():
+        game = make_game(1)
+        alive = SessionCheckpointer(100, str(tmp_path), 3600)
+        other = SessionCheckpointer(100, str(tmp_path), 3600)
+        alive.start(lambda: {1: game})
+        other.start(lambda: {})
+        await alive.checkpoint()
+
+        # Владелец жив: игру не забирает никто другой
+        assert await other.restore(1) is None
+        assert await alive.owns(1)
+
+        # Пульс владельца устарел - игру восстанавливает другой воркер, и только один раз
+        expired = time.time() - 2 * alive.owner_ttl
+        os.utime(alive._owner_path(alive.owner_id), (expired, expired))
+        restored = await other.restore(1)
+        assert comparable(restored) == comparable(game)
+        assert await other.restore(1) is None
+        assert not await alive.owns(1)
+
+        await alive.stop()
+        await other.stop()
+
+    run(scenario())
+
+
+def test_background_get_does_not_restore(tmp_path, run):
+    async def scenario():
+        writer = SessionCheckpointer(100, str(tmp_path), 3600)
+        writer.start(lambda: {1: make_game(1)})
+        await writer.checkpoint()
+        await writer.stop()  # корректная остановка снимает пульс владельца
+
+        store = InMemorySessionStore(SessionCheckpointer(100, str(tmp_path), 3600))
+        await store.start()
+        assert await store.get(1, touch=False) is None
+        assert await store.get(1) is not None
+        await store.stop()
+
+    run(scenario())
+
+
+def test_unreadable_redis_session_dropped(run):
+    async def scenario():
+        store = RedisSessionStore(local_client())
+        await store.save(1, make_game(1))
+        # Снимок прежнего двоичного формата (версия 1) не читается - игры как будто нет
+        await store.client.binary.set("game:1", b"PTDS\x01\x04old")
+        assert await store.get(1) is None
+        assert await store.get_many([1]) == {1: None}
+
+    run(scenario())
+
+
+def test_broken_checkpoint_dropped(tmp_path, run):
+    async def scenario():
+        checkpoints = SessionCheckpointer(100, str(tmp_path), 3600)
+        with open(checkpoints._path(5), "wb") as file:
+            file.write(b"PTDS broken")
+        assert await checkpoints.restore(5) is None
+        assert not os.path.exists(checkpoints._path(5))
+
+    run(scenario())
@@ -0,0 +1,72 @@
+"""Skip list и команды ZSET в LocalRedis против эталона на отсортированном списке"""
+import random
+
+from app.leaderboard import member
+from app.redis_client import LocalRedis
+from app.skiplist import SortedScoreSet
+
+
+def test_sorted_set_matches_sorted_list():
+    rng = random.Random(1)
+    index = SortedScoreSet()
+    reference = set()
+    for _ in range(3000):
+        key = (float(rng.randint(0, 50)), f"{rng.randint(0, 300):05d}")
+        if key in reference and rng.random() < 0.5:
+            assert index.remove(*key)
+            reference.remove(key)
+        elif key not in reference:
+            index.add(*key)
+            reference.add(key)
+
+        if rng.random() < 0.05:
+            expected = sorted(reference)
+            assert len(index) == len(expected)
+            assert list(index.slice(0, len(expected) - 1)) == expected
+            for rank, item in enumerate(expected[::37]):
+                assert index.rank(*item) == expected.index(item)
+            start = rng.randint(0, len(expected))
+            stop = start + rng.randint(0, 20)
+            assert list(index.slice(start, stop)) == expected[start:stop + 1]
+
+    assert not index.remove(1000.0, "missing")
+    assert index.rank(1000.0, "missing") is None
+
+
+def test_local_redis_zset_commands(run):
+    async def scenario():
+        redis = LocalRedis()
+        scores = {}
+        rng = random.Random(2)
+        for _ in range(500):
+            user_id, score = rng.randint(1, 120), rng.randint(0, 40)
+            await redis.zadd("scores", {member(user_id): score}, gt=True)
+            scores[user_id] = max(scores.get(user_id, score), score)
+
+        # Порядок как в SQL лидерборда: high_score DESC, user_id DESC
+        expected = sorted(scores.items(), key=lambda item: (item[1], item[0]), reverse=True)
+        assert await redis.zcard("scores") == len(expected)
+        ranked = await redis.zrevrange("scores", 0, -1, withscores=True)
+        assert [(int(user_id), int(score)) for user_id, score in ranked] == expected
+        for rank, (user_id, score) in enumerate(expected):
+            assert await redis.zrevrank("scores", member(user_id)) == rank
+            assert await redis.zscore("scores", member(user_id)) == score
+        window = await redis.zrevrange("scores", 10, 19)
+        assert [int(user_id) for user_id in window] == [user_id for user_id, _ in expected[10:20]]
+
+        # GT не понижает счет, NX не меняет существующий, обычный ZADD перезаписывает
+        top_user, top_score = expected[0]
+        await redis.zadd("scores", {member(top_user): top_score - 1}, gt=True)
+        await redis.zadd("scores", {member(top_user): top_score + 5}, nx=True)
+        assert await redis.zscore("scores", member(top_user)) == top_score
+        await redis.zadd("scores", {member(top_user): 0})
+        scores[top_user] = 0
+        expected = sorted(scores.items(), key=lambda item: (item[1], item[0]), reverse=True)
+        assert await redis.zrevrank("scores", member(top_user)) == expected.index((top_user, 0))
+
+        assert await redis.zrem("scores", member(top_user), "missing") == 1
+        assert await redis.zrevrank("scores", member(top_user)) is None
+        assert await redis.zcard("scores") == len(expected) - 1
+        assert await redis.zrevrange("missing", 0, -1) == []
+
+    run(scenario())
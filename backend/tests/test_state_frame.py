@@ -0,0 +1,76 @@
+"""Кадры состояния WebSocket (двоичные и JSON-дельты) и ошибка схемы при переполнении колонки"""
+import asyncio
+import json
+
+import pytest
+
+from app.game_logic import PokemonGameLogic
+from app.routers.game import push_game_frames
+from app.session_store import session_store
+from app.state_delta import StateDeltaEncoder
+from app.state_frame import FRAME_VERSION, FrameSchemaError, encode_frame, frame_schema
+from app.state_json import client_state
+
+
+class FrameSink:
+    """Принимает сообщения вместо WebSocket"""
+
+    def __init__(self):
+        self.messages = []
+        self.received = asyncio.Event()
+
+    async def send_bytes(self, data: bytes):
+        self.messages.append(data)
+        self.received.set()
+
+    async def send_text(self, data: str):
+        self.messages.append(data)
+        self.received.set()
+
+    async def send_json(self, data):
+        self.messages.append(data)
+        self.received.set()
+
+
+async def first_message(user_id: int, encoder) -> tuple:
+    game = PokemonGameLogic(user_id, engine="python", seed=1)
+    await session_store.save(user_id, game)
+    sink = FrameSink()
+    pusher = asyncio.create_task(push_game_frames(sink, user_id, encoder))
+    try:
+        await asyncio.wait_for(sink.received.wait(), 2)
+    finally:
+        pusher.cancel()
+        await session_store.delete(user_id)
+    return game, sink.messages[0]
+
+
+def test_ws_pushes_binary_frames(run):
+    async def scenario():
+        game, frame = await first_message(9101, None)
+        assert isinstance(frame, bytes) and frame[0] == FRAME_VERSION
+        assert len(frame) == len(encode_frame(game))
+
+    run(scenario())
+
+
+def test_overflow_is_schema_error():
+    game = PokemonGameLogic(1, engine="python", seed=1)
+    game.score = 2 ** 40
+    with pytest.raises(FrameSchemaError, match="score"):
+        encode_frame(game)
+
+
+def test_ws_json_frames_use_client_state(run):
+    async def scenario():
+        game, message = await first_message(9102, StateDeltaEncoder())
+        frame = json.loads(message)
+        assert frame["type"] == "keyframe"
+        expected = client_state(game)
+        assert frame["state"].keys() == expected.keys()
+        assert frame["state"]["hand"] == expected["hand"]
+        # Линии баз не повторяются в каждом кадре - клиент берет их из схемы
+        assert "player_base_y" not in frame["state"]
+        assert frame_schema()["lanes"] == {"player_base_y": game.player_base_y, "enemy_base_y": game.enemy_base_y}
+
+    run(scenario())
@@ -0,0 +1,49 @@
+"""Статистика /my-stats для игроков с играми, записанными до появления user_stats"""
+import uuid
+
+from sqlalchemy import select
+
+from app import crud, models, schemas
+from app.database import AsyncSessionLocal
+
+
+def game_result(**fields) -> schemas.GameResult:
+    values = dict(victory=False, score=0, poke_coins_earned=0, waves_completed=0,
+                  pokemons_caught=0, enemies_defeated=0, game_duration=1.0)
+    values.update(fields)
+    return schemas.GameResult(**values)
+
+
+async def create_user(db) -> models.User:
+    name = "s" + uuid.uuid4().hex[:10]
+    user = schemas.UserCreate(username=name, email=f"{name}@example.com", password="secret1")
+    return await crud.create_user(db, user, "hash")
+
+
+def test_stats_include_games_before_user_stats(run):
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            user = await create_user(db)
+            # Игры, записанные до появления user_stats: строки статистики нет
+            db.add_all([
+                models.GameSession(user_id=user.id, **game_result(score=40, poke_coins_earned=4, waves_completed=2).model_dump()),
+                models.GameSession(user_id=user.id, **game_result(victory=True, score=90, poke_coins_earned=50).model_dump()),
+            ])
+            await db.commit()
+
+        async with AsyncSessionLocal() as db:
+            body = await crud.get_user_stats(db, user.id)
+            assert body["leaderboard"]["high_score"] == 90
+            assert (body["stats"]["total_games"], body["stats"]["wins"], body["stats"]["total_score"]) == (2, 1, 130)
+            assert len(body["recent_games"]) == 2
+
+        async with AsyncSessionLocal() as db:
+            session_ids = await crud.create_game_sessions(db, [(user.id, game_result(score=10, waves_completed=1))])
+
+        async with AsyncSessionLocal() as db:
+            stats = await db.scalar(select(models.UserStats).where(models.UserStats.user_id == user.id))
+            assert (stats.total_games, stats.wins, stats.losses) == (3, 1, 2)
+            assert (stats.total_score, stats.high_score, stats.total_waves) == (140, 90, 3)
+            assert len(stats.recent_games) == 3 and stats.recent_games[0]["id"] == session_ids[0]
+
+    run(scenario())
@@ -1,3 +1,95 @@
+// Экстраполяция движения между кадрами сервера (vy юнитов и time/server_time состояния)
+const MAX_EXTRAPOLATION = 1.5;  // секунд: кадр старше этого считается устаревшим
+const CORRECTION_TIME = 0.1;    // секунд на сглаживание расхождения прогноза с новым кадром
+const STATE_CLOCK_FIELDS = ['time', 'server_time'];
+
+// Декодер двоичных кадров состояния /game/state и /game/ws (формат - backend/app/state_frame.py).
+// Колонки не зашиты в клиент: схема один раз запрашивается с /game/state/schema
+class StateFrameDecoder {
+    constructor(schema) {
+        this.version = schema.version;
+        this.mediaType = schema.media_type;
+        this.player = schema.player;
+        this.lists = ['hand', 'field', 'enemies'].map(name => [name, schema[name]]);
+        this.textDecoder = new TextDecoder();
+    }
+
+    // Состояние в том же виде, что и JSON-ответ, или null для кадра другой версии схемы
+    decode(buffer) {
+        const view = new DataView(buffer);
+        if (view.getUint8(0) !== this.version) {
+            return null;
+        }
+        const cursor = { view, offset: 4, scale: Math.pow(10, view.getUint8(1)), strings: [] };
+
+        const stringCount = view.getUint16(2, true);
+        for (let i = 0; i < stringCount; i++) {
+            const length = view.getUint8(cursor.offset);
+            cursor.strings.push(this.textDecoder.decode(new Uint8Array(buffer, cursor.offset + 1, length)));
+            cursor.offset += 1 + length;
+        }
+
+        const state = this.readRow(cursor, this.player);
+        this.lists.forEach(([name, columns]) => {
+            const count = view.getUint16(cursor.offset, true);
+            cursor.offset += 2;
+            const items = [];
+            for (let i = 0; i < count; i++) {
+                items.push(this.readRow(cursor, columns));
+            }
+            state[name] = items;
+        });
+        return state;
+    }
+
+    readRow(cursor, columns) {
+        const { view } = cursor;
+        const row = {};
+        for (const [name, type] of columns) {
+            switch (type) {
+                case 'i':
+                    row[name] = view.getInt32(cursor.offset, true);
+                    cursor.offset += 4;
+                    break;
+                case 'n': {
+                    const value = view.getInt32(cursor.offset, true);
+                    row[name] = value === -1 ? null : value;
+                    cursor.offset += 4;
+                    break;
+                }
+                case 'f':
+                    // float32 -> число с той же точностью, что и в JSON-ответе
+                    row[name] = Math.round(view.getFloat32(cursor.offset, true) * cursor.scale) / cursor.scale;
+                    cursor.offset += 4;
+                    break;
+                case 'd':
+                    row[name] = view.getFloat64(cursor.offset, true);
+                    cursor.offset += 8;
+                    break;
+                case 'B':
+                    row[name] = view.getUint8(cursor.offset);
+                    cursor.offset += 1;
+                    break;
+                case '?':
+                    row[name] = view.getUint8(cursor.offset) !== 0;
+                    cursor.offset += 1;
+                    break;
+                case 'H':
+                    row[name] = view.getUint16(cursor.offset, true);
+                    cursor.offset += 2;
+                    break;
+                case 's':
+                    row[name] = cursor.strings[view.getUint16(cursor.offset, true)];
+                    cursor.offset += 2;
+                    break;
+                default:
+                    throw new Error(`Unknown frame column type: ${type}`);
+            }
+        }
+        return row;
+    }
+}
+
 // Игровой клиент
 class GameClient {
     constructor() {
@@ -12,6 +104,24 @@ class GameClient {
         this.canvasScale = 1;
         this.canvasOffset = { x: 0, y: 0 };
 
+        // WebSocket-канал состояния (при недоступности - опрос /game/state)
+        this.socket = null;
+        this.updatesActive = false;
+        this.updateInterval = null;
+        this.pendingActions = new Map();
+        this.nextRequestId = 1;
+
+        // Двоичные кадры /game/state (до загрузки схемы - JSON)
+        this.frameDecoder = null;
+        // Линии баз из схемы: дальше них прогноз юниты не уводит
+        this.lanes = null;
+
+        // Прогноз позиций: момент получения кадра, его возраст на сервере и сглаживание поправок
+        this.stateClock = null;
+        this.displayedY = new Map();
+        this.corrections = new Map();
+        this.lastRenderAt = 0;
+
         // Фоновая картинка
         this.backgroundImage = new Image();
         this.backgroundImage.src = '/static/images/backgrounds/battlefield.jpg'; // или другая картинка
@@ -34,18 +144,13 @@ class GameClient {
 
         this.setupEventListeners();
         this.startGameLoop();
+        // Сокет подключается после схемы, чтобы сразу запросить двоичные кадры
+        this.frameSchemaLoading = this.loadFrameSchema();
         this.loadGameState();
         this.loadImages();
 
-        // Обновляем состояние каждую секунду
-        this.updateInterval = setInterval(() => {
-            if (this.isRunning) {
-                this.loadGameState();
-            }
-        }, 1000);
-
-        // Предварительная загрузка игрового состояния
-        this.preloadGameState();
+        // Подписываемся на обновления состояния
+        this.startUpdates();
 
         // Обработка изменения размера окна
         window.addEventListener('resize', () => this.handleResize());
@@ -94,10 +199,281 @@ class GameClient {
         this.render();
     }
 
-    preloadGameState() {
-        setTimeout(() => {
-            this.loadGameState();
-        }, 500);
+    startUpdates() {
+        this.updatesActive = true;
+        this.frameSchemaLoading.then(() => {
+            if (this.updatesActive && !this.socket) {
+                this.connectSocket();
+            }
+        });
+    }
+
+    stopUpdates() {
+        this.updatesActive = false;
+        this.stopPolling();
+        if (this.socket) {
+            const socket = this.socket;
+            this.socket = null;
+            socket.close();
+        }
+        this.rejectPendingActions();
+    }
+
+    startPolling() {
+        if (this.updateInterval) return;
+
+        // Обновляем состояние каждую секунду
+        this.updateInterval = setInterval(() => {
+            if (this.isRunning) {
+                this.loadGameState();
+            }
+        }, 1000);
+    }
+
+    stopPolling() {
+        clearInterval(this.updateInterval);
+        this.updateInterval = null;
+    }
+
+    isSocketOpen() {
+        return this.socket !== null && this.socket.readyState === WebSocket.OPEN;
+    }
+
+    connectSocket() {
+        const token = localStorage.getItem('token');
+        if (!token || !('WebSocket' in window)) {
+            this.startPolling();
+            return;
+        }
+
+        const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
+        // Со схемой состояние приходит двоичными кадрами, без нее - JSON-дельтами
+        const format = this.frameDecoder ? 'frame' : 'json';
+        const socket = new WebSocket(`${protocol}://${window.location.host}${API_BASE}/game/ws?token=${encodeURIComponent(token)}&format=${format}`);
+        socket.binaryType = 'arraybuffer';
+        this.socket = socket;
+
+        socket.onopen = () => {
+            // Состояние теперь приходит push-кадрами - опрос не нужен
+            this.stopPolling();
+        };
+
+        socket.onmessage = (event) => {
+            try {
+                if (event.data instanceof ArrayBuffer) {
+                    this.handleSocketFrame(event.data);
+                    return;
+                }
+                this.handleSocketMessage(JSON.parse(event.data));
+            } catch (error) {
+                console.error('Failed to handle socket message:', error);
+            }
+        };
+
+        socket.onclose = () => {
+            if (this.socket !== socket) return;
+            this.socket = null;
+            this.rejectPendingActions();
+
+            // Канал упал посреди игры - возвращаемся к опросу
+            if (this.updatesActive) {
+                console.warn('Game socket closed, falling back to polling');
+                this.startPolling();
+            }
+        };
+    }
+
+    handleSocketMessage(message) {
+        switch (message.type) {
+            case 'keyframe':
+                this.gameState = message.state;
+                this.syncStateClock();
+                this.updateUI();
+                break;
+
+            case 'delta':
+                if (!this.gameState) {
+                    // Дельту не к чему применить - просим полный кадр
+                    this.socket.send(JSON.stringify({ type: 'keyframe' }));
+                    return;
+                }
+                this.applyStateDelta(message);
+                this.syncStateClock();
+                // DOM перестраиваем только при изменении статистики или руки, позиции рисует канвас
+                if (this.hasStatsChange(message.player) || message.hand) {
+                    this.updateUI();
+                }
+                break;
+
+            case 'action_result': {
+                const pending = this.pendingActions.get(message.request_id);
+                if (pending) {
+                    this.pendingActions.delete(message.request_id);
+                    pending.resolve(message.error ? { error: message.error } : message.result);
+                }
+                return;
+            }
+
+            case 'error':
+                console.log('Game socket:', message.detail);
+                return;
+        }
+
+        if (this.gameState && this.gameState.game_over) {
+            this.showEndGameModal(this.gameState.victory);
+        }
+    }
+
+    // Двоичный кадр - полное состояние, как ответ /game/state
+    handleSocketFrame(buffer) {
+        const state = this.frameDecoder ? this.frameDecoder.decode(buffer) : null;
+        if (state === null) {
+            // Сервер обновил формат кадра: перезапрашиваем схему, кадры до нее пропускаем
+            if (!this.frameSchemaReload) {
+                this.frameSchemaReload = this.loadFrameSchema().finally(() => {
+                    this.frameSchemaReload = null;
+                });
+            }
+            return;
+        }
+
+        const previous = this.gameState;
+        this.gameState = state;
+        this.syncStateClock();
+        if (!previous || this.hasStatsChange(this.changedFields(previous, state))
+            || JSON.stringify(previous.hand) !== JSON.stringify(state.hand)) {
+            this.updateUI();
+        }
+
+        if (state.game_over) {
+            this.showEndGameModal(state.victory);
+        }
+    }
+
+    changedFields(previous, state) {
+        const changed = {};
+        Object.keys(state).forEach(key => {
+            if (!['hand', 'field', 'enemies'].includes(key) && previous[key] !== state[key]) {
+                changed[key] = state[key];
+            }
+        });
+        return changed;
+    }
+
+    hasStatsChange(player) {
+        return !!player && Object.keys(player).some(key => !STATE_CLOCK_FIELDS.includes(key));
+    }
+
+    // Новый кадр: запоминаем его возраст и расхождение прогноза, чтобы юниты не прыгали
+    syncStateClock() {
+        const state = this.gameState;
+        if (!state || state.time === undefined) {
+            this.stateClock = null;
+            return;
+        }
+        this.stateClock = {
+            receivedAt: performance.now(),
+            age: Math.max(0, state.server_time - state.time)
+        };
+
+        const corrections = new Map();
+        this.forEachUnit((key, unit, kind) => {
+            const displayed = this.displayedY.get(key);
+            if (displayed !== undefined) {
+                corrections.set(key, displayed - this.predictY(unit, kind, this.stateClock.receivedAt));
+            }
+        });
+        this.corrections = corrections;
+    }
+
+    forEachUnit(callback) {
+        ['field', 'enemies'].forEach(kind => {
+            (this.gameState[kind] || []).forEach(unit => callback(`${kind}:${unit.id}`, unit, kind));
+        });
+    }
+
+    // Позиция юнита в момент now по скорости из кадра: движение детерминировано до следующего шага боя
+    predictY(unit, kind, now) {
+        if (!this.stateClock || !unit.vy) {
+            return unit.y;
+        }
+        const elapsed = Math.min(MAX_EXTRAPOLATION, this.stateClock.age + (now - this.stateClock.receivedAt) / 1000);
+        const y = unit.y + unit.vy * elapsed;
+        if (!this.lanes) {
+            return y;
+        }
+        return kind === 'enemies' ? Math.min(y, this.lanes.player_base_y) : Math.max(y, this.lanes.enemy_base_y);
+    }
+
+    // Позиции для текущего кадра отрисовки: прогноз плюс затухающая поправка
+    updateDisplayedPositions(now) {
+        const elapsed = this.lastRenderAt ? (now - this.lastRenderAt) / 1000 : 0;
+        const decay = Math.exp(-elapsed / CORRECTION_TIME);
+        this.lastRenderAt = now;
+
+        const displayed = new Map();
+        this.forEachUnit((key, unit, kind) => {
+            let correction = (this.corrections.get(key) || 0) * decay;
+            if (Math.abs(correction) < 0.1) {
+                correction = 0;
+                this.corrections.delete(key);
+            } else {
+                this.corrections.set(key, correction);
+            }
+            displayed.set(key, this.predictY(unit, kind, now) + correction);
+        });
+        this.displayedY = displayed;
+    }
+
+    displayY(kind, unit) {
+        const y = this.displayedY.get(`${kind}:${unit.id}`);
+        return y === undefined ? unit.y : y;
+    }
+
+    applyStateDelta(delta) {
+        if (delta.player) {
+            Object.assign(this.gameState, delta.player);
+        }
+        if (delta.hand) {
+            this.gameState.hand = delta.hand;
+        }
+
+        ['field', 'enemies'].forEach(name => {
+            const change = delta[name];
+            if (!change) return;
+
+            let entities = this.gameState[name] || [];
+            if (change.remove) {
+                const removed = new Set(change.remove);
+                entities = entities.filter(entity => !removed.has(entity.id));
+            }
+            (change.upsert || []).forEach(update => {
+                const existing = entities.find(entity => entity.id === update.id);
+                if (existing) {
+                    Object.assign(existing, update);
+                } else {
+                    entities.push(update);
+                }
+            });
+            this.gameState[name] = entities;
+        });
+    }
+
+    sendAction(actionType, data) {
+        if (!this.isSocketOpen()) {
+            return ApiClient.post('/game/action', { action_type: actionType, data });
+        }
+
+        const requestId = this.nextRequestId++;
+        return new Promise((resolve, reject) => {
+            this.pendingActions.set(requestId, { resolve, reject });
+            this.socket.send(JSON.stringify({ action_type: actionType, data, request_id: requestId }));
+        });
+    }
+
+    rejectPendingActions() {
+        this.pendingActions.forEach(pending => pending.reject(new Error('Game socket closed')));
+        this.pendingActions.clear();
     }
 
     async loadImages() {
@@ -213,7 +589,7 @@ class GameClient {
 
         if (returnToLobbyBtn) {
             returnToLobbyBtn.addEventListener('click', () => {
-                clearInterval(this.updateInterval);
+                this.stopUpdates();
                 window.location.href = '/lobby';
             });
         }
@@ -351,11 +727,37 @@ class GameClient {
         this.render();
     }
 
+    async loadFrameSchema() {
+        try {
+            const schema = await ApiClient.get('/game/state/schema');
+            if (schema && schema.lanes) {
+                this.lanes = schema.lanes;
+            }
+            if (schema && 'TextDecoder' in window) {
+                this.frameDecoder = new StateFrameDecoder(schema);
+            }
+        } catch (error) {
+            // Без схемы остаемся на JSON
+            console.warn('Failed to load state frame schema:', error);
+        }
+    }
+
     async loadGameState() {
         try {
-            const state = await ApiClient.get('/game/state');
+            const decoder = this.frameDecoder;
+            let state = await ApiClient.get('/game/state', decoder ? decoder.mediaType : null);
+            if (state instanceof ArrayBuffer) {
+                state = decoder.decode(state);
+                if (state === null) {
+                    // Сервер обновил формат кадра: перезапрашиваем схему, пока читаем JSON
+                    this.frameDecoder = null;
+                    this.loadFrameSchema();
+                    return this.loadGameState();
+                }
+            }
             if (state) {
                 this.gameState = state;
+                this.syncStateClock();
                 this.updateUI();
 
                 if (state.game_over) {
@@ -371,6 +773,13 @@ class GameClient {
         }
     }
 
+    async refreshState() {
+        // По WebSocket изменения придут следующим кадром, без сокета - запрашиваем сами
+        if (!this.isSocketOpen()) {
+            await this.loadGameState();
+        }
+    }
+
     async openPokeball() {
         if (!this.gameState || this.gameState.pokeballs <= 0) {
             showNotification('No pokeballs left!', 'error');
@@ -378,13 +787,11 @@ class GameClient {
         }
 
         try {
-            const result = await ApiClient.post('/game/action', {
-                action_type: 'open_pokeball'
-            });
+            const result = await this.sendAction('open_pokeball');
 
             if (result.success) {
                 showNotification(`🎉 Got ${result.pokemon.name}!`, 'success');
-                await this.loadGameState();
+                await this.refreshState();
             } else {
                 showNotification(result.error || 'Failed to open pokeball', 'error');
             }
@@ -396,17 +803,14 @@ class GameClient {
 
     async playCard(cardId, x) {
         try {
-            const result = await ApiClient.post('/game/action', {
-                action_type: 'play_card',
-                data: {
-                    card_id: cardId,
-                    x: Math.round(x)
-                }
+            const result = await this.sendAction('play_card', {
+                card_id: cardId,
+                x: Math.round(x)
             });
 
             if (result.success) {
                 showNotification('✅ Pokemon placed on field!', 'success');
-                await this.loadGameState();
+                await this.refreshState();
 
                 if (this.selectedCard && this.selectedCard.element) {
                     this.selectedCard.element.classList.remove('selected');
@@ -454,7 +858,8 @@ class GameClient {
     async quitGame() {
         if (confirm('Are you sure you want to surrender? You will earn coins based on your progress.')) {
             try {
-                clearInterval(this.updateInterval);
+                this.stopUpdates();
+                // Результат уходит в очередь записи; лобби откроется через 2 с - очередь к тому времени уже записана
                 const result = await ApiClient.post('/game/end', {});
 
                 if (result && result.poke_coins_earned) {
@@ -480,6 +885,7 @@ class GameClient {
         ApiClient.post('/game/start', {})
             .then(() => {
                 this.loadGameState();
+                this.startUpdates();
                 this.isRunning = true;
                 this.startGameLoop();
                 this.selectedCard = null;
@@ -513,6 +919,7 @@ class GameClient {
         this.drawBackground();
 
         if (this.gameState) {
+            this.updateDisplayedPositions(performance.now());
             this.drawFieldElements();
             this.drawEnemies();
         }
@@ -542,7 +949,7 @@ class GameClient {
 
         this.gameState.field.forEach(pokemon => {
             const x = pokemon.x || 100;
-            const y = pokemon.y || (this.canvas.height - 150);
+            const y = this.displayY('field', pokemon) || (this.canvas.height - 150);
             const maxHealth = pokemon.max_health || pokemon.health;
             const currentHealth = pokemon.current_health || pokemon.health;
             const healthPercent = Math.max(0, currentHealth) / maxHealth;
@@ -637,7 +1044,7 @@ class GameClient {
                     this.ctx.setLineDash([3, 3]);
                     this.ctx.beginPath();
                     this.ctx.moveTo(x, y);
-                    this.ctx.lineTo(targetEnemy.x, targetEnemy.y);
+                    this.ctx.lineTo(targetEnemy.x, this.displayY('enemies', targetEnemy));
                     this.ctx.stroke();
                     this.ctx.setLineDash([]);
                 }
@@ -650,7 +1057,7 @@ class GameClient {
 
         this.gameState.enemies.forEach(enemy => {
             const x = enemy.x || Math.random() * 700 + 50;
-            const y = enemy.y || 100;
+            const y = this.displayY('enemies', enemy) || 100;
             const healthPercent = (enemy.current_health || enemy.health) / enemy.health;
             const enemyName = enemy.name.toLowerCase();
             const size = 35;
@@ -964,24 +1371,27 @@ class GameClient {
         if (this.animationId) {
             cancelAnimationFrame(this.animationId);
         }
-        clearInterval(this.updateInterval);
+        this.stopUpdates();
 
         title.textContent = victory ? '🎉 Victory! 🎉' : '💀 Game Over 💀';
         title.style.color = victory ? '#28a745' : '#dc3545';
 
         try {
+            // /game/end только ставит результат в очередь записи - итоговый баланс
+            // считается из баланса до игры и монет из ответа, не дожидаясь записи в БД
+            const balance = await ApiClient.get('/users/coins').catch(() => null);
             const result = await ApiClient.post('/game/end', {});
 
             if (result) {
-                document.getElementById('finalCoins').textContent = result.poke_coins_earned || 0;
+                const earned = result.poke_coins_earned || 0;
+                document.getElementById('finalCoins').textContent = earned;
                 document.getElementById('finalWaves').textContent = result.waves_completed || 0;
                 document.getElementById('finalEnemies').textContent = result.enemies_defeated || 0;
 
-                const userData = await ApiClient.get('/users/coins');
-                if (userData && userData.poke_coins !== undefined) {
-                    document.getElementById('totalCoins').textContent = userData.poke_coins;
+                if (balance && balance.poke_coins !== undefined) {
+                    document.getElementById('totalCoins').textContent = balance.poke_coins + earned;
                 } else {
-                    document.getElementById('totalCoins').textContent = (this.gameState.poke_coins || 0) + (result.poke_coins_earned || 0);
+                    document.getElementById('totalCoins').textContent = (this.gameState.poke_coins || 0) + earned;
                 }
 
                 showNotification(victory ?
@@ -32,6 +32,10 @@ class ApiClient {
                 throw new Error(error.detail || `HTTP error! status: ${response.status}`);
             }
 
+            // Двоичный ответ (options.binary - ожидаемый Content-Type), если сервер его поддерживает
+            if (options.binary && response.headers.get('Content-Type') === options.binary) {
+                return await response.arrayBuffer();
+            }
             return await response.json();
         } catch (error) {
             console.error('API request failed:', error);
@@ -46,9 +50,11 @@ class ApiClient {
         });
     }
 
-    static async get(endpoint) {
+    static async get(endpoint, binary = null) {
         return this.request(endpoint, {
             method: 'GET',
+            binary,
+            headers: binary ? { 'Accept': `${binary}, application/json` } : {},
         });
     }
 }
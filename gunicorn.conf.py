@@ -1,5 +1,21 @@
 import multiprocessing
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backend.app.config import settings  # noqa: E402
 
 bind = "0.0.0.0:10000"
-workers = multiprocessing.cpu_count() * 2 + 1
+# Без общего Redis игры живут в памяти воркера: второй воркер не нашел бы чужую игру
+workers = multiprocessing.cpu_count() * 2 + 1 if settings.sessions_shared else 1
 worker_class = "uvicorn.workers.UvicornWorker"
+
+
+def on_starting(server):
+    # --workers в командной строке переопределяет значение выше - проверяем итоговое
+    if server.cfg.workers > 1 and not settings.sessions_shared:
+        raise RuntimeError(
+            f"{server.cfg.workers} workers need shared game sessions: "
+            "set REDIS_URL (SESSION_BACKEND=redis) or run a single worker"
+        )
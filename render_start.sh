@@ -18,7 +18,7 @@ echo "✓ Database initialized"
 # Запуск приложения
 echo "Starting application..."
 exec gunicorn backend.app.main:app \
-    --workers 4 \
+    --config gunicorn.conf.py \
     --worker-class uvicorn.workers.UvicornWorker \
     --bind 0.0.0.0:10000 \
     --timeout 120 \